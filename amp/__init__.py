@@ -492,6 +492,8 @@ def importhelper(importname):
         from .descriptor.zernike import Zernike as Imported
     elif importname == '.descriptor.bispectrum.Bispectrum':
         from .descriptor.bispectrum import Bispectrum as Imported
+    elif importname == '.descriptor.chebyshev.Chebyshev':
+        from .descriptor.chebyshev import Chebyshev as Imported
     elif importname == '.model.neuralnetwork.NeuralNetwork':
         from .model.neuralnetwork import NeuralNetwork as Imported
     elif importname == '.model.neuralnetwork.tflow':
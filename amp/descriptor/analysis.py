@@ -1,5 +1,5 @@
 import numpy as np
-from ..utilities import hash_images, get_hash
+from ..utilities import hash_images, get_hash, Data, FileDatabase, Logger
 
 
 class FingerprintPlot:
@@ -108,3 +108,152 @@ class FingerprintPlot:
                 print(element, len(fingerprint))
         for element in data.keys():
             data[element] = np.array(data[element])
+
+
+def select_symmetry_functions(fingerprints, Gs, number=None, method='cur',
+                              tolerance=1e-3, maxcorrelation=0.995,
+                              log=None):
+    """Selects, for each element, a subset of the symmetry functions of a
+    Gaussian descriptor that describes the atoms of a fingerprint database
+    about as well as the full set, and returns the reduced Gs.
+
+    For each element, the symmetry functions are pruned in three stages:
+    those that are nearly constant over the atoms (standard deviation below
+    tolerance times the largest standard deviation of the element's
+    symmetry functions) are dropped; then those
+    correlated to one already kept by more than maxcorrelation (in absolute
+    value); then, if more than number remain, number of them are selected
+    by method from the standardized fingerprints:
+
+    'cur'
+        Column selection as in the CUR decomposition: the symmetry function
+        with the largest leverage score over the leading right singular
+        vectors is chosen, the fingerprints of the remaining ones are made
+        orthogonal to it, and so on; see Imbalzano et al., J. Chem. Phys.
+        148, 241730 (2018).
+    'farthest'
+        Farthest-point sampling of the symmetry functions, with the distance
+        sqrt(2 (1 - |r|)) for a correlation coefficient r, starting from the
+        one of the largest standard deviation.
+
+    The symmetry functions of a Gaussian descriptor are independent of each
+    other, so the fingerprints of the reduced Gs are the selected columns of
+    the present ones.
+
+    Parameters
+    ----------
+    fingerprints : Data, dict-like or str
+        Fingerprints of a set of images, keyed by image hash, as the
+        fingerprints attribute of a descriptor; or the filename of such a
+        database, e.g., 'amp-data-fingerprints.ampdb'.
+    Gs : dict
+        Symmetry functions of each element with which the fingerprints were
+        calculated, as the Gs parameter of the Gaussian descriptor.
+    number : int or dict
+        Maximum number of symmetry functions to keep for each element; can
+        be a dictionary with chemical elements as keys. If None, only the
+        first two stages are applied.
+    method : str
+        Either 'cur' or 'farthest'.
+    tolerance : float
+        Standard deviation, relative to the largest one of the element,
+        below which a symmetry function is considered constant.
+    maxcorrelation : float
+        Absolute correlation coefficient above which a symmetry function is
+        considered redundant with one already kept.
+    log : Logger object
+        Write function at which to log the selection.
+
+    Returns
+    -------
+    selected : dict
+        The reduced Gs; the symmetry functions kept for each element, in
+        their original order.
+    """
+    log = Logger(file=None) if log is None else log
+    if method not in ['cur', 'farthest']:
+        raise NotImplementedError('Unknown selection method: %s.' % method)
+
+    if isinstance(fingerprints, str):
+        fingerprints = FileDatabase.open(fingerprints, 'r')
+    elif isinstance(fingerprints, Data):
+        fingerprints.open()
+        fingerprints = fingerprints.d
+    data = {}
+    for key in fingerprints.keys():
+        for element, fingerprint in fingerprints[key]:
+            data.setdefault(element, []).append(fingerprint)
+
+    selected = {}
+    for element in sorted(data.keys()):
+        X = np.array(data[element], dtype=float)
+        if X.shape[1] != len(Gs[element]):
+            raise RuntimeError('Fingerprints of %s have %i entries, but '
+                               'there are %i symmetry functions.' %
+                               (element, X.shape[1], len(Gs[element])))
+        std = X.std(axis=0)
+        indices = np.where(std > tolerance * std.max())[0]
+        log('%s: %i of %i symmetry functions not constant.'
+            % (element, len(indices), X.shape[1]))
+
+        X = (X[:, indices] - X[:, indices].mean(axis=0)) / std[indices]
+        correlations = np.dot(X.T, X) / len(X)
+        kept = []
+        for count in range(len(indices)):
+            if all(abs(correlations[count, _]) <= maxcorrelation
+                   for _ in kept):
+                kept.append(count)
+        log('%s: %i of these not correlated by more than %s.'
+            % (element, len(kept), maxcorrelation))
+
+        _number = number.get(element) if isinstance(number, dict) else number
+        if _number is not None and len(kept) > _number:
+            if method == 'cur':
+                choice = select_columns_cur(X[:, kept], _number)
+            else:
+                choice = select_columns_farthest(
+                    correlations[np.ix_(kept, kept)],
+                    std[indices[kept]],
+                    _number)
+            kept = [kept[_] for _ in sorted(choice)]
+            log('%s: %i selected by %s.' % (element, len(kept), method))
+        selected[element] = [Gs[element][indices[_]] for _ in kept]
+    return selected
+
+
+def select_columns_cur(X, number):
+    """Selects number columns of X by leverage score, one at a time,
+    orthogonalizing the remaining columns to each selected one; used by
+    select_symmetry_functions. Returns the indices of the selected columns,
+    in the order selected."""
+    X = np.array(X, dtype=float)
+    chosen = []
+    for count in range(number):
+        u, s, vt = np.linalg.svd(X, full_matrices=False)
+        rank = max(1, min(number - count, (s > s[0] * 1e-12).sum()))
+        leverages = (vt[:rank] ** 2).sum(axis=0)
+        leverages[chosen] = -1.
+        column = int(np.argmax(leverages))
+        chosen.append(column)
+        c = X[:, column].copy()
+        norm = np.dot(c, c)
+        if norm > 0.:
+            X -= np.outer(c, np.dot(c, X) / norm)
+    return chosen
+
+
+def select_columns_farthest(correlations, spreads, number):
+    """Selects number features by farthest-point sampling, with the distance
+    sqrt(2 (1 - |r|)) between features of correlation coefficient r,
+    starting from the feature of largest spread; used by
+    select_symmetry_functions. Returns the indices of the selected features,
+    in the order selected."""
+    distances = np.sqrt(np.clip(2. * (1. - np.abs(correlations)), 0., None))
+    chosen = [int(np.argmax(spreads))]
+    nearest = distances[chosen[0]].copy()
+    for count in range(1, number):
+        nearest[chosen] = -1.
+        feature = int(np.argmax(nearest))
+        chosen.append(feature)
+        nearest = np.minimum(nearest, distances[feature])
+    return chosen
@@ -2,9 +2,10 @@ import numpy as np
 from numpy import sqrt, exp
 from ase.data import atomic_numbers
 from ase.calculators.calculator import Parameters
-from ..utilities import Data, Logger, importer
+from ..utilities import Data, Logger, summarize_fingerprints
 from .cutoffs import Cosine, dict2cutoff
-NeighborList = importer('NeighborList')
+from .neighborlist import (SharedNeighborlists, flatten_neighborlists,
+                           sum_over_neighbors, get_pair_weights)
 
 
 class Bispectrum(object):
@@ -33,11 +34,23 @@ class Bispectrum(object):
         location can be shared between calculator instances to avoid
         re-calculating redundant information. If not supplied, just uses the
         value from label.
+    nldblabel : str
+        Optional separate prefix/location for the neighborlist database only.
+        Neighborlists are stored by image and cutoff radius, so this location
+        can be shared between descriptors of any kind and cutoff; those of a
+        smaller cutoff are then filtered from those of a larger one. If not
+        supplied, just uses dblabel.
     elements : list
         List of allowed elements present in the system. If not provided, will
         be found automatically.
     version : str
         Version of fingerprints.
+    batchsize : int
+        Number of images whose fingerprints are evaluated together, as arrays
+        over the neighbors of all of their atoms. If None, images are
+        fingerprinted one at a time (still as arrays over all of their
+        atoms). Only affects speed and memory, and so is not stored with the
+        parameters.
 
     Raises:
     -------
@@ -45,7 +58,8 @@ class Bispectrum(object):
     """
 
     def __init__(self, cutoff=Cosine(6.5), Gs=None, jmax=5, dblabel=None,
-                 elements=None, version='2016.02', mode='atom-centered'):
+                 elements=None, version='2016.02', mode='atom-centered',
+                 batchsize=None, nldblabel=None):
 
         # Check of the version of descriptor, particularly if restarting.
         compatibleversions = ['2016.02', ]
@@ -86,6 +100,8 @@ class Bispectrum(object):
         p.elements = elements
 
         self.dblabel = dblabel
+        self.nldblabel = nldblabel
+        self.batchsize = batchsize
         self.parent = None  # Can hold a reference to main Amp instance.
 
     def tostring(self):
@@ -117,11 +133,6 @@ class Bispectrum(object):
         """
         if parallel is None:
             parallel = {'cores': 1}
-        if calculate_derivatives is True:
-            import warnings
-            warnings.warn('Zernike descriptor cannot train forces yet. '
-                          'Force training automatically turnned off. ')
-            calculate_derivatives = False
 
         log = Logger(file=None) if log is None else log
 
@@ -176,10 +187,9 @@ class Bispectrum(object):
 
         log('Calculating neighborlists...', tic='nl')
         if not hasattr(self, 'neighborlist'):
-            calc = NeighborlistCalculator(cutoff=p.cutoff['kwargs']['Rc'])
-            self.neighborlist = Data(filename='%s-neighborlists'
-                                     % self.dblabel,
-                                     calculator=calc)
+            self.neighborlist = SharedNeighborlists(
+                dblabel=self.nldblabel or self.dblabel,
+                cutoff=p.cutoff['kwargs']['Rc'])
         self.neighborlist.calculate_items(images, parallel=parallel, log=log)
         log('...neighborlists calculated.', toc='nl')
 
@@ -188,48 +198,50 @@ class Bispectrum(object):
             calc = FingerprintCalculator(neighborlist=self.neighborlist,
                                          Gs=p.Gs,
                                          jmax=p.jmax,
-                                         cutoff=p.cutoff,)
+                                         cutoff=p.cutoff,
+                                         batchsize=self.batchsize)
             self.fingerprints = Data(filename='%s-fingerprints'
                                      % self.dblabel,
-                                     calculator=calc)
+                                     calculator=calc,
+                                     summarize=summarize_fingerprints)
         self.fingerprints.calculate_items(images, parallel=parallel, log=log)
         log('...fingerprints calculated.', toc='fp')
 
+        if calculate_derivatives:
+            log('Calculating fingerprint derivatives of images...',
+                tic='derfp')
+            if not hasattr(self, 'fingerprintprimes'):
+                calc = FingerprintPrimeCalculator(
+                    neighborlist=self.neighborlist,
+                    Gs=p.Gs,
+                    jmax=p.jmax,
+                    cutoff=p.cutoff,)
+                self.fingerprintprimes = Data(filename='%s-fingerprint-primes'
+                                              % self.dblabel,
+                                              calculator=calc)
+            self.fingerprintprimes.calculate_items(images, parallel=parallel,
+                                                   log=log)
+            log('...fingerprint derivatives calculated.', toc='derfp')
 
-# Calculators #################################################################
-
-
-# Neighborlist Calculator
-class NeighborlistCalculator:
-    """For integration with .utilities.Data
-
-    For each image fed to calculate, a list of neighbors with offset
-    distances is returned.
-    """
-
-    def __init__(self, cutoff):
-        self.globals = Parameters({'cutoff': cutoff})
-        self.keyed = Parameters()
-        self.parallel_command = 'calculate_neighborlists'
 
-    def calculate(self, image, key):
-        cutoff = self.globals.cutoff
-        n = NeighborList(cutoffs=[cutoff / 2.] * len(image),
-                         self_interaction=False,
-                         bothways=True,
-                         skin=0.)
-        n.update(image)
-        return [n.get_neighbors(index) for index in range(len(image))]
+# Calculators #################################################################
 
 
 class FingerprintCalculator:
     """For integration with .utilities.Data
+
+    Parameters
+    ----------
+    batchsize : int
+        Maximum number of images fingerprinted together by calculate_batch;
+        if None, one image at a time.
     """
 
-    def __init__(self, neighborlist, Gs, jmax, cutoff,):
+    def __init__(self, neighborlist, Gs, jmax, cutoff, batchsize=None):
         self.globals = Parameters({'cutoff': cutoff,
                                    'Gs': Gs,
-                                   'jmax': jmax})
+                                   'jmax': jmax,
+                                   'batchsize': batchsize})
         self.keyed = Parameters({'neighborlist': neighborlist})
         self.parallel_command = 'calculate_fingerprints'
 
@@ -237,6 +249,7 @@ class FingerprintCalculator:
         for _ in range(int(3. * jmax) + 2):
             if _ > 0:
                 self.factorial += [_ * self.factorial[_ - 1]]
+        self.couplings = calculate_coupling_tensors(jmax, self.factorial)
 
     def calculate(self, image, key):
         """Makes a list of fingerprints, one per atom, for the fed image.
@@ -263,6 +276,83 @@ class FingerprintCalculator:
 
         return fingerprints
 
+    def calculate_batch(self, images):
+        """Makes the fingerprints of many images at once; used by
+        .utilities.Data in place of calculate. The neighbors of all atoms of
+        up to batchsize images are flattened into one set of pairs, so that
+        the hyperspherical harmonics are evaluated in a single pass, and the
+        bispectrum components of all atoms are contracted together.
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of images; the key is the hash of each image and each
+            value is an ASE atoms object.
+
+        Returns
+        -------
+        fingerprints : dict
+            The fingerprints of each image, in the form returned by
+            calculate, with the same keys as images.
+        """
+        keys = list(images.keys())
+        batchsize = self.globals.batchsize or 1
+        results = {}
+        for start in range(0, len(keys), batchsize):
+            batch = keys[start:start + batchsize]
+            results.update(zip(batch, self.get_fingerprints(
+                [images[key] for key in batch],
+                [self.keyed.neighborlist[key] for key in batch])))
+        return results
+
+    def get_fingerprints(self, images, neighborlists):
+        """Returns the fingerprints of all atoms of several images, as
+        arrays over all of their (center atom, neighbor) pairs.
+
+        Parameters
+        ----------
+        images : list of objects
+            ASE atoms objects.
+        neighborlists : list of lists
+            The neighborlist of each image.
+
+        Returns
+        -------
+        list of lists
+            The fingerprints of each image, in the form returned by
+            calculate.
+        """
+        cutoff = self.globals.cutoff
+        cutoff_fxn = dict2cutoff(cutoff)
+        pairs = flatten_neighborlists(images, neighborlists)
+        symbols = [symbol for image in images
+                   for symbol in image.get_chemical_symbols()]
+        inside = pairs['distances'] > 10.**(-10.)
+        centers = pairs['centers'][inside]
+        counts = np.bincount(centers, minlength=len(symbols))
+        weights = get_pair_weights(self.globals.Gs, symbols, centers,
+                                   pairs['neighbors'][inside])
+        weights *= cutoff_fxn(pairs['distances'][inside])
+
+        Us = calculate_hyperspherical_harmonics(pairs['vectors'][inside],
+                                                cutoff['kwargs']['Rc'],
+                                                self.globals.jmax)
+        cs = [sum_over_neighbors(weights[:, np.newaxis, np.newaxis] *
+                                 np.conjugate(_), counts) for _ in Us]
+        fingerprints = np.array([
+            contract_B(cs[2 * j], cs[_2j1], cs[_2j1], H, H).real
+            for _2j1, j, H in self.couplings]).T
+
+        results = []
+        start = 0
+        for image in images:
+            stop = start + len(image)
+            results.append([(symbol, list(fingerprint)) for symbol, fingerprint
+                            in zip(symbols[start:stop],
+                                   fingerprints[start:stop])])
+            start = stop
+        return results
+
     def get_fingerprint(self, index, symbol, n_symbols, Rs):
         """Returns the fingerprint of symmetry function values for atom
         specified by its index and symbol.
@@ -292,63 +382,171 @@ class FingerprintCalculator:
         Rc = cutoff['kwargs']['Rc']
         jmax = self.globals.jmax
 
-        if cutoff['name'] == 'Cosine':
-            cutoff_fxn = Cosine(Rc)
-        elif cutoff['name'] == 'Polynomial':
-            # cutoff_fxn = Polynomial(cutoff)
-            raise NotImplementedError()
-
-        rs = []
-        psis = []
-        thetas = []
-        phis = []
-        for neighbor in Rs:
-            x = neighbor[0] - home[0]
-            y = neighbor[1] - home[1]
-            z = neighbor[2] - home[2]
-            r = np.linalg.norm(neighbor - home)
-            if r > 10.**(-10.):
-
-                psi = np.arcsin(r / Rc)
-
-                theta = np.arccos(z / r)
-                if abs((z / r) - 1.0) < 10.**(-8.):
-                    theta = 0.0
-                elif abs((z / r) + 1.0) < 10.**(-8.):
-                    theta = np.pi
-
-                if x < 0.:
-                    phi = np.pi + np.arctan(y / x)
-                elif 0. < x and y < 0.:
-                    phi = 2 * np.pi + np.arctan(y / x)
-                elif 0. < x and 0. <= y:
-                    phi = np.arctan(y / x)
-                elif x == 0. and 0. < y:
-                    phi = 0.5 * np.pi
-                elif x == 0. and y < 0.:
-                    phi = 1.5 * np.pi
-                else:
-                    phi = 0.
-
-                rs += [r]
-                psis += [psi]
-                thetas += [theta]
-                phis += [phi]
+        cutoff_fxn = dict2cutoff(cutoff)
+
+        vectors = np.array(Rs, dtype=float).reshape(-1, 3) - home
+        rs = np.linalg.norm(vectors, axis=1)
+        inside = rs > 10.**(-10.)
+        vectors, rs = vectors[inside], rs[inside]
+        weights = np.array([self.globals.Gs[symbol][n_symbol]
+                            for n_symbol in n_symbols], dtype=float)[inside]
+        weights *= cutoff_fxn(rs)
+
+        # c^{j}_{m'm} for all j, m and m' as weighted sums over neighbors of
+        # the hyperspherical harmonics, which are evaluated only once.
+        Us = calculate_hyperspherical_harmonics(vectors, Rc, jmax)
+        cs = [np.tensordot(weights, np.conjugate(_), axes=(0, 0))
+              for _ in Us]
 
         fingerprint = []
-        for _2j1 in range(int(2 * jmax) + 1):
-            j1 = 0.5 * _2j1
-            j2 = 0.5 * _2j1
-            for j in range(int(min(_2j1, jmax)) + 1):
-                value = calculate_B(j1, j2, 1.0 * j, self.globals.Gs[symbol],
-                                    Rc, cutoff['name'],
-                                    self.factorial, n_symbols,
-                                    rs, psis, thetas, phis)
-                value = value.real
-                fingerprint.append(value)
+        for _2j1, j, H in self.couplings:
+            value = contract_B(cs[2 * j], cs[_2j1], cs[_2j1], H, H)
+            fingerprint.append(value.real)
 
         return symbol, fingerprint
 
+
+class FingerprintPrimeCalculator:
+    """For integration with .utilities.Data
+    """
+
+    def __init__(self, neighborlist, Gs, jmax, cutoff,):
+        self.globals = Parameters({'cutoff': cutoff,
+                                   'Gs': Gs,
+                                   'jmax': jmax})
+        self.keyed = Parameters({'neighborlist': neighborlist})
+        self.parallel_command = 'calculate_fingerprint_primes'
+
+        self.factorial = [1]
+        for _ in range(int(3. * jmax) + 2):
+            if _ > 0:
+                self.factorial += [_ * self.factorial[_ - 1]]
+        self.couplings = calculate_coupling_tensors(jmax, self.factorial)
+
+    def calculate(self, image, key):
+        """Makes a list of fingerprint derivatives, one per atom, for the fed
+        image.
+
+        Parameters
+        ----------
+        image : object
+            ASE atoms object.
+        key : str
+            key of the image after being hashed.
+        """
+        self.atoms = image
+        nl = self.keyed.neighborlist[key]
+        # Derivatives of the fingerprint of each atom with respect to the
+        # positions of itself and its neighbors, all in one pass per atom.
+        atomprimes = []
+        for atom in image:
+            neighborindices, neighboroffsets = nl[atom.index]
+            neighborsymbols = [image[_].symbol for _ in neighborindices]
+            Rs = [image.positions[neighbor] + np.dot(offset, image.cell)
+                  for (neighbor, offset) in zip(neighborindices,
+                                                neighboroffsets)]
+            atomprimes.append(self.get_fingerprintprimes(
+                atom.index, atom.symbol, neighborindices, neighborsymbols,
+                Rs))
+
+        fingerprintprimes = {}
+        for atom in image:
+            selfsymbol = atom.symbol
+            selfindex = atom.index
+            selfneighborindices, selfneighboroffsets = nl[selfindex]
+            for i in range(3):
+                # Derivative of self atom fingerprints w.r.t. coordinates of
+                # itself.
+                fingerprintprimes[
+                    (selfindex, selfsymbol, selfindex, selfsymbol, i)] = \
+                    list(atomprimes[selfindex][selfindex][i])
+                # Derivatives of neighbor atom fingerprints w.r.t.
+                # coordinates of self atom; for calculating forces,
+                # summation runs over neighbor atoms of type II (within the
+                # main cell only).
+                for nindex, noffset in zip(selfneighborindices,
+                                           selfneighboroffsets):
+                    if noffset.all() == 0:
+                        nsymbol = image[nindex].symbol
+                        fingerprintprimes[
+                            (selfindex, selfsymbol, nindex, nsymbol, i)] = \
+                            list(atomprimes[nindex][selfindex][i])
+
+        return fingerprintprimes
+
+    def get_fingerprintprimes(self, index, symbol, n_indices, n_symbols, Rs):
+        """Returns the derivatives of the fingerprint of the atom with index
+        and symbol with respect to the positions of itself and each of its
+        neighbors.
+
+        n_indices, n_symbols and Rs are lists of neighbors' indices, symbols
+        and Cartesian positions, respectively. The derivative with respect
+        to the position of atom p is the sum of the gradients of the
+        neighbors that are images of p, minus the sum of all gradients if p
+        is the center atom.
+
+        Parameters
+        ----------
+        index : int
+            Index of the center atom.
+        symbol : str
+            Symbol of the center atom.
+        n_indices : list of int
+            List of neighbors' indices.
+        n_symbols : list of str
+            List of neighbors' symbols.
+        Rs : list of list of float
+            List of Cartesian atomic positions of neighbors.
+
+        Returns
+        -------
+        fingerprintprimes : dict
+            Derivatives, as arrays of shape (3, number of fingerprints),
+            keyed by the index of the atom whose position is varied.
+        """
+        home = self.atoms[index].position
+        cutoff = self.globals.cutoff
+        Rc = cutoff['kwargs']['Rc']
+        cutoff_fxn = dict2cutoff(cutoff)
+
+        vectors = np.array(Rs, dtype=float).reshape(-1, 3) - home
+        rs = np.linalg.norm(vectors, axis=1)
+        inside = rs > 10.**(-10.)
+        vectors, rs = vectors[inside], rs[inside]
+        n_indices = np.asarray(n_indices, dtype=int)[inside]
+        G = np.array([self.globals.Gs[symbol][n_symbol]
+                      for n_symbol in n_symbols], dtype=float)[inside]
+        weights = G * cutoff_fxn(rs)
+        dweights = (G * cutoff_fxn.prime(rs) / rs)[:, np.newaxis] * vectors
+
+        Us, dUs = calculate_hyperspherical_harmonics(
+            vectors, Rc, self.globals.jmax, derivatives=True)
+        cs = [np.tensordot(weights, np.conjugate(_), axes=(0, 0))
+              for _ in Us]
+        # Gradients of each neighbor's term of c^{j}_{m'm}, of shape
+        # (neighbor, direction, m, m').
+        dcs = [dweights[:, :, np.newaxis, np.newaxis] *
+               np.conjugate(U)[:, np.newaxis] +
+               weights[:, np.newaxis, np.newaxis, np.newaxis] *
+               np.conjugate(dU) for U, dU in zip(Us, dUs)]
+
+        terms = np.zeros((len(rs), 3, len(self.couplings)))
+        for count, (_2j1, j, H) in enumerate(self.couplings):
+            Z, gradient1, gradient2 = contract_B_gradients(
+                cs[2 * j], cs[_2j1], cs[_2j1], H, H)
+            dB = (np.tensordot(np.conjugate(dcs[2 * j]), Z,
+                               axes=([2, 3], [0, 1])) +
+                  np.tensordot(dcs[_2j1], gradient1 + gradient2,
+                               axes=([2, 3], [0, 1])))
+            terms[:, :, count] = dB.real
+
+        atoms, inverse = np.unique(np.concatenate([[index], n_indices]),
+                                   return_inverse=True)
+        summed = np.zeros((len(atoms),) + terms.shape[1:])
+        np.add.at(summed, inverse[1:], terms)
+        summed[inverse[0]] -= terms.sum(axis=0)
+        return dict(zip(atoms, summed))
+
 # Auxiliary functions #########################################################
 
 
@@ -577,6 +775,158 @@ def CG(a, alpha, b, beta, c, gamma, factorial):
 ###############################################################################
 
 
+def calculate_coupling_tensors(jmax, factorial):
+    """Calculates the Clebsch-Gordan coefficients needed for the bispectrum
+    components of the fingerprint, once for a given jmax.
+
+    Returns
+    -------
+    couplings : list of tuples
+        One (2 * j1, j, H) tuple per bispectrum component, in the order of
+        the fingerprint vector (j2 = j1), where H is the array
+        H[m, m1, m2] = C_{j1 m1 j2 m2}^{j m}, with m values indexed in the
+        order of m_values.
+    """
+    couplings = []
+    for _2j1 in range(int(2 * jmax) + 1):
+        j1 = 0.5 * _2j1
+        for j in range(int(min(_2j1, jmax)) + 1):
+            H = np.array([[[CG(j1, m1, j1, m2, 1.0 * j, m, factorial)
+                            for m2 in m_values(j1)]
+                           for m1 in m_values(j1)]
+                          for m in m_values(j)])
+            couplings.append((_2j1, j, H))
+    return couplings
+
+###############################################################################
+
+
+def calculate_hyperspherical_harmonics(vectors, cutoff, jmax,
+                                       derivatives=False):
+    """Calculates the rotation matrices U^{j}_{MM'}, as in U, of all
+    neighbor vectors for all j up to jmax.
+
+    The rotation of each neighbor is by omega = arcsin(r / cutoff) about the
+    direction of the vector. Its j = 1/2 matrix is the SU(2) matrix
+    cos(omega / 2) - i sin(omega / 2) n.sigma, and higher j follow from the
+    recursion that adds one spin-1/2 factor at a time, so no Wigner-D sums
+    are needed. Gradients follow from the same recursion differentiated.
+
+    Parameters
+    ----------
+    vectors : numpy.ndarray
+        Cartesian vectors from the center atom to its neighbors, of shape
+        (number of neighbors, 3).
+    cutoff : float
+        Radius above which neighbor interactions are ignored.
+    jmax : integer or half-integer
+        Maximum degree.
+    derivatives : bool
+        If True, the gradients of the matrices with respect to the vectors
+        are also returned.
+
+    Returns
+    -------
+    Us : list of numpy.ndarray
+        Element 2 * j is the complex array of shape (number of neighbors,
+        2 * j + 1, 2 * j + 1) of U^{j}_{MM'}, with M and M' indexed in the
+        order of m_values.
+    dUs : list of numpy.ndarray
+        Only if derivatives is True; element 2 * j is the complex array of
+        shape (number of neighbors, 3, 2 * j + 1, 2 * j + 1) of the
+        gradients of U^{j}_{MM'}.
+    """
+    x, y, z = np.transpose(vectors)
+    r = np.linalg.norm(vectors, axis=1)
+    omega = np.arcsin(r / cutoff)
+    a = np.cos(0.5 * omega)
+    b = np.sin(0.5 * omega) / r
+    # The j = 1/2 matrix; first index is the number of spin-up factors of
+    # the result, second that of the rotated state.
+    M = np.array([[a - 1j * b * z, -1j * b * (x - 1j * y)],
+                  [-1j * b * (x + 1j * y), a + 1j * b * z]])
+    if derivatives:
+        # Gradients of a and b; omega' diverges at the cutoff, where the
+        # cutoff function and its derivative vanish.
+        domega = 1. / np.sqrt(np.maximum(cutoff ** 2. - r ** 2., 1e-300))
+        units = vectors / r[:, np.newaxis]
+        da = (-0.5 * np.sin(0.5 * omega) * domega)[:, np.newaxis] * units
+        db = ((0.5 * np.cos(0.5 * omega) * domega - b) / r)[:, np.newaxis] \
+            * units
+        ex, ey, ez = np.eye(3)
+        dM = np.array(
+            [[da - 1j * z[:, np.newaxis] * db - 1j * b[:, np.newaxis] * ez,
+              -1j * (x - 1j * y)[:, np.newaxis] * db -
+              1j * b[:, np.newaxis] * (ex - 1j * ey)],
+             [-1j * (x + 1j * y)[:, np.newaxis] * db -
+              1j * b[:, np.newaxis] * (ex + 1j * ey),
+              da + 1j * z[:, np.newaxis] * db + 1j * b[:, np.newaxis] * ez]])
+
+    def step(C, M):
+        """Adds one spin-1/2 factor to the unnormalized matrices C, of shape
+        (..., 2j + 1, 2j + 1), with the j = 1/2 matrix M."""
+        size = C.shape[-1] + 1
+        new = np.zeros(C.shape[:-2] + (size, size), dtype=complex)
+        new[..., 1:, 1:] += M[0, 0][..., np.newaxis, np.newaxis] * C
+        new[..., :-1, 1:] += M[1, 0][..., np.newaxis, np.newaxis] * C
+        new[..., 1:, 0] += M[0, 1][..., np.newaxis] * C[..., 0]
+        new[..., :-1, 0] += M[1, 1][..., np.newaxis] * C[..., 0]
+        return new
+
+    C = np.ones((len(r), 1, 1), dtype=complex)
+    Us = [C.copy()]
+    if derivatives:
+        dC = np.zeros((len(r), 3, 1, 1), dtype=complex)
+        dUs = [dC.copy()]
+    binomials = np.ones(1)
+    for _2j in range(1, int(2 * jmax) + 1):
+        if derivatives:
+            dC = step(np.repeat(C[:, np.newaxis], 3, axis=1), dM) + \
+                step(dC, M[:, :, :, np.newaxis])
+        C = step(C, M)
+        binomials = np.concatenate([[1.], binomials[:-1] + binomials[1:],
+                                    [1.]])
+        norm = np.sqrt(binomials[np.newaxis, :] / binomials[:, np.newaxis])
+        Us.append((C * norm)[:, ::-1, ::-1])
+        if derivatives:
+            dUs.append((dC * norm)[:, :, ::-1, ::-1])
+    if derivatives:
+        return Us, dUs
+    return Us
+
+###############################################################################
+
+
+def contract_B(c, c1, c2, H, Hp):
+    """Calculates the bispectrum component B_{j1, j2, j} of calculate_B from
+    the arrays c^{j}_{m'm}, c^{j1}_{m'm} and c^{j2}_{m'm} (indexed [m, m'])
+    and the Clebsch-Gordan tensors of calculate_coupling_tensors, by tensor
+    contractions. The c arrays may have leading axes (e.g., over atoms), in
+    which case an array of components is returned."""
+    T = np.einsum('xab,...aq->...xbq', H, c1)
+    T = np.einsum('...xbq,...br->...xqr', T, c2)
+    Z = np.einsum('...xqr,yqr->...xy', T, Hp)
+    return (np.conjugate(c) * Z).sum(axis=(-2, -1))
+
+###############################################################################
+
+
+def contract_B_gradients(c, c1, c2, H, Hp):
+    """Returns, for the bispectrum component of contract_B, the array Z such
+    that B = sum(conjugate(c) * Z), and the derivatives of B with respect
+    to the entries of c1 and of c2."""
+    T = np.tensordot(H, c1, axes=(1, 0))
+    T = np.tensordot(T, c2, axes=(1, 0))
+    Z = np.tensordot(T, Hp, axes=([1, 2], [1, 2]))
+    T = np.tensordot(np.conjugate(c), H, axes=(0, 0))
+    T = np.tensordot(T, Hp, axes=(0, 0))
+    gradient1 = np.einsum('ikjl,kl->ij', T, c2)
+    gradient2 = np.einsum('ikjl,ij->kl', T, c1)
+    return Z, gradient1, gradient2
+
+###############################################################################
+
+
 def generate_coefficients(elements):
     """Automatically generates coefficients if not given by the user.
 
@@ -633,27 +983,30 @@ if __name__ == "__main__":
     socket.send_pyobj(msg('<purpose>'))
     purpose = socket.recv_pyobj()
 
-    if purpose == 'calculate_neighborlists':
+    if purpose == 'calculate_fingerprints':
         # Request variables.
         socket.send_pyobj(msg('<request>', 'cutoff'))
         cutoff = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'Gs'))
+        Gs = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'jmax'))
+        jmax = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'batchsize'))
+        batchsize = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'neighborlist'))
+        neighborlist = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'images'))
         images = socket.recv_pyobj()
-        # sys.stderr.write(str(images)) # Just to see if they are there.
 
-        # Perform the calculations.
-        calc = NeighborlistCalculator(cutoff=cutoff)
-        neighborlist = {}
-        # for key in images.iterkeys():
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            neighborlist[key] = calc.calculate(image, key)
+        calc = FingerprintCalculator(neighborlist, Gs, jmax, cutoff,
+                                     batchsize)
+        result = calc.calculate_batch(images)
 
         # Send the results.
-        socket.send_pyobj(msg('<result>', neighborlist))
+        socket.send_pyobj(msg('<result>', result))
         socket.recv_string()  # Needed to complete REQ/REP.
 
-    elif purpose == 'calculate_fingerprints':
+    elif purpose == 'calculate_fingerprint_primes':
         # Request variables.
         socket.send_pyobj(msg('<request>', 'cutoff'))
         cutoff = socket.recv_pyobj()
@@ -666,7 +1019,7 @@ if __name__ == "__main__":
         socket.send_pyobj(msg('<request>', 'images'))
         images = socket.recv_pyobj()
 
-        calc = FingerprintCalculator(neighborlist, Gs, jmax, cutoff,)
+        calc = FingerprintPrimeCalculator(neighborlist, Gs, jmax, cutoff,)
         result = {}
         while len(images) > 0:
             key, image = images.popitem()  # Reduce memory.
@@ -0,0 +1,696 @@
+#!/usr/bin/env python
+"""
+Chebyshev descriptor, after Artrith, Urban and Ceder, Phys. Rev. B 96,
+014112 (2017).
+
+The radial and angular distribution functions of the neighbors of each atom
+are expanded in Chebyshev polynomials, once with all neighbors counted alike
+(the structure) and once with each neighbor weighted by a number assigned to
+its element (the composition). The length of the fingerprint is therefore
+the same whatever the number of elements.
+
+The radial coefficients are sums over neighbors. The angular coefficients
+would be sums over pairs of neighbors, but each Chebyshev polynomial of the
+cosine of the angle is a combination of Legendre polynomials, which by the
+addition theorem of the spherical harmonics turn into sums of squared
+moments over single neighbors; no triplets are enumerated, so the cost is
+linear in the number of neighbors.
+
+"""
+
+import numpy as np
+from numpy.polynomial import chebyshev, legendre
+
+from ase.calculators.calculator import Parameters
+
+from ..utilities import Data, Logger, summarize_fingerprints
+from .cutoffs import Cosine, dict2cutoff
+from .neighborlist import (SharedNeighborlists, flatten_neighborlists,
+                           sum_over_neighbors)
+from .zernike import calculate_solid_harmonics
+
+
+class Chebyshev(object):
+    """Class that calculates Chebyshev fingerprints.
+
+    For each atom i, the fingerprint holds, for the weights s_j = 1 and then
+    for s_j equal to the weight of the element of neighbor j,
+
+        radial: sum_j s_j T_a(2 R_ij / Rc - 1) fc(R_ij),  a = 0...nradial
+        angular: sum_(j<k) s_j s_k T_a(cos theta_ijk) fc'(R_ij) fc'(R_ik),
+                 a = 0...nangular
+
+    where T_a are Chebyshev polynomials, fc is the cutoff function and fc'
+    the angular cutoff function.
+
+    Parameters
+    ----------
+    cutoff : object or float
+        Cutoff function of the radial terms, typically from
+        amp.descriptor.cutoffs.  Can be also fed as a float representing the
+        radius above which neighbor interactions are ignored; in this case a
+        cosine cutoff function will be employed.  Default is a 6.5-Angstrom
+        cosine cutoff.
+    angularcutoff : object or float
+        Cutoff function of the angular terms, in the same forms as cutoff;
+        typically of a shorter radius, since the angular terms are more
+        local. If not supplied, cutoff is used.
+    weights : dict
+        Weight of each element in the composition terms, as in
+
+               >>> weights = {"Cu": -1., "Pd": 1.}
+
+        If not supplied, they are generated with generate_weights; for a
+        single element, there are no composition terms.
+    nradial : int
+        Maximum order of the Chebyshev polynomials of the radial terms.
+    nangular : int
+        Maximum order of the Chebyshev polynomials of the angular terms.
+    dblabel : str
+        Optional separate prefix/location for database files, including
+        fingerprints, fingerprint derivatives, and neighborlists. This file
+        location can be shared between calculator instances to avoid
+        re-calculating redundant information. If not supplied, just uses the
+        value from label.
+    nldblabel : str
+        Optional separate prefix/location for the neighborlist database only.
+        Neighborlists are stored by image and cutoff radius, so this location
+        can be shared between descriptors of any kind and cutoff; those of a
+        smaller cutoff are then filtered from those of a larger one. If not
+        supplied, just uses dblabel.
+    elements : list
+        List of allowed elements present in the system. If not provided, will
+        be found automatically.
+    version : str
+        Version of fingerprints.
+    mode : str
+        Can be either 'atom-centered' or 'image-centered'.
+    batchsize : int
+        Number of images whose fingerprints are evaluated together, as arrays
+        over the neighbors of all of their atoms. If None, images are
+        fingerprinted one at a time. Only affects speed and memory, and so is
+        not stored with the parameters.
+
+    Raises
+    ------
+        RuntimeError
+    """
+
+    def __init__(self, cutoff=Cosine(6.5), angularcutoff=None, weights=None,
+                 nradial=8, nangular=6, dblabel=None, elements=None,
+                 version='2026.10', mode='atom-centered', batchsize=None,
+                 nldblabel=None):
+
+        # Check of the version of descriptor, particularly if restarting.
+        compatibleversions = ['2026.10', ]
+        if (version is not None) and version not in compatibleversions:
+            raise RuntimeError('Error: Trying to use Chebyshev fingerprints'
+                               ' version %s, but this module only supports'
+                               ' versions %s. You may need an older or '
+                               ' newer version of Amp.' %
+                               (version, compatibleversions))
+        else:
+            version = compatibleversions[-1]
+
+        # Check that the mode is atom-centered.
+        if mode != 'atom-centered':
+            raise RuntimeError('Chebyshev scheme only works '
+                               'in atom-centered mode. %s '
+                               'specified.' % mode)
+
+        # If the cutoffs are provided as numbers, Cosine functions will be
+        # used by default. If provided as dictionaries, assume we need to
+        # load them with dict2cutoff.
+        if isinstance(cutoff, int) or isinstance(cutoff, float):
+            cutoff = Cosine(cutoff)
+        if type(cutoff) is dict:
+            cutoff = dict2cutoff(cutoff)
+        if angularcutoff is None:
+            angularcutoff = cutoff
+        if isinstance(angularcutoff, int) or isinstance(angularcutoff, float):
+            angularcutoff = Cosine(angularcutoff)
+        if type(angularcutoff) is dict:
+            angularcutoff = dict2cutoff(angularcutoff)
+
+        # The parameters dictionary contains the minimum information
+        # to produce a compatible descriptor; that is, one that gives
+        # an identical fingerprint when fed an ASE image.
+        p = self.parameters = Parameters(
+            {'importname': '.descriptor.chebyshev.Chebyshev',
+             'mode': 'atom-centered'})
+        p.version = version
+        p.cutoff = cutoff.todict()
+        p.angularcutoff = angularcutoff.todict()
+        p.weights = weights
+        p.nradial = nradial
+        p.nangular = nangular
+        p.elements = elements
+
+        self.dblabel = dblabel
+        self.nldblabel = nldblabel
+        self.batchsize = batchsize
+        self.parent = None  # Can hold a reference to main Amp instance.
+
+    def tostring(self):
+        """Returns an evaluatable representation of the calculator that can
+        be used to restart the calculator."""
+        return self.parameters.tostring()
+
+    def calculate_fingerprints(self, images, parallel=None, log=None,
+                               calculate_derivatives=False):
+        """Calculates the fingerpints of the images, for the ones not already
+        done.
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of images; the key is a unique ID assigned to each
+            image and each value is an ASE atoms object. Typically created
+            from amp.utilities.hash_images.
+        parallel : dict
+            Configuration for parallelization. Should be in same form as in
+            amp.Amp.
+        log : Logger object
+            Write function at which to log data. Note this must be a callable
+            function.
+        calculate_derivatives : bool
+            Decides whether or not fingerprintprimes should also be calculated.
+        """
+        if parallel is None:
+            parallel = {'cores': 1}
+        log = Logger(file=None) if log is None else log
+
+        if (self.dblabel is None) and hasattr(self.parent, 'dblabel'):
+            self.dblabel = self.parent.dblabel
+        self.dblabel = 'amp-data' if self.dblabel is None else self.dblabel
+
+        p = self.parameters
+
+        log('Cutoff function: %s' % repr(dict2cutoff(p.cutoff)))
+        log('Angular cutoff function: %s' %
+            repr(dict2cutoff(p.angularcutoff)))
+
+        if p.elements is None:
+            log('Finding unique set of elements in training data.')
+            p.elements = set([atom.symbol for atoms in images.values()
+                              for atom in atoms])
+        p.elements = sorted(p.elements)
+        log('%i unique elements included: ' % len(p.elements) +
+            ', '.join(p.elements))
+
+        if p.weights is None and len(p.elements) > 1:
+            log('No element weights supplied; creating defaults.')
+            p.weights = generate_weights(p.elements)
+        if p.weights is not None:
+            log('Element weights:')
+            for element in sorted(p.weights.keys()):
+                log(' %2s: %s' % (element, p.weights[element]))
+        log('Maximum order of Chebyshev polynomials: radial %i, angular %i.'
+            % (p.nradial, p.nangular))
+        log('Number of fingerprints of each atom: %i' %
+            ((p.nradial + p.nangular + 2) *
+             (1 if p.weights is None else 2)))
+
+        log('Calculating neighborlists...', tic='nl')
+        if not hasattr(self, 'neighborlist'):
+            self.neighborlist = SharedNeighborlists(
+                dblabel=self.nldblabel or self.dblabel,
+                cutoff=max(p.cutoff['kwargs']['Rc'],
+                           p.angularcutoff['kwargs']['Rc']))
+        self.neighborlist.calculate_items(images, parallel=parallel, log=log)
+        log('...neighborlists calculated.', toc='nl')
+
+        log('Fingerprinting images...', tic='fp')
+        if not hasattr(self, 'fingerprints'):
+            calc = FingerprintCalculator(neighborlist=self.neighborlist,
+                                         weights=p.weights,
+                                         nradial=p.nradial,
+                                         nangular=p.nangular,
+                                         cutoff=p.cutoff,
+                                         angularcutoff=p.angularcutoff,
+                                         batchsize=self.batchsize)
+            self.fingerprints = Data(filename='%s-fingerprints'
+                                     % self.dblabel,
+                                     calculator=calc,
+                                     summarize=summarize_fingerprints)
+        self.fingerprints.calculate_items(images, parallel=parallel, log=log)
+        log('...fingerprints calculated.', toc='fp')
+
+        if calculate_derivatives:
+            log('Calculating fingerprint derivatives...',
+                tic='derfp')
+            if not hasattr(self, 'fingerprintprimes'):
+                calc = FingerprintPrimeCalculator(
+                    neighborlist=self.neighborlist,
+                    weights=p.weights,
+                    nradial=p.nradial,
+                    nangular=p.nangular,
+                    cutoff=p.cutoff,
+                    angularcutoff=p.angularcutoff)
+                self.fingerprintprimes = \
+                    Data(filename='%s-fingerprint-primes'
+                         % self.dblabel,
+                         calculator=calc)
+            self.fingerprintprimes.calculate_items(
+                images, parallel=parallel, log=log)
+            log('...fingerprint derivatives calculated.', toc='derfp')
+
+
+# Calculators #################################################################
+
+
+class FingerprintCalculator:
+    """For integration with .utilities.Data
+
+    Parameters
+    ----------
+    neighborlist : dict-like
+        Neighborlists of the images, by image key.
+    weights : dict or None
+        Weight of each element in the composition terms; None for no
+        composition terms.
+    nradial, nangular : int
+        Maximum orders of the Chebyshev polynomials of the radial and angular
+        terms.
+    cutoff, angularcutoff : dict
+        Cutoff functions of the radial and angular terms, as dictionaries
+        made by the todict method of those of amp.descriptor.cutoffs.
+    batchsize : int
+        Maximum number of images fingerprinted together by calculate_batch;
+        if None, one image at a time.
+    """
+
+    def __init__(self, neighborlist, weights, nradial, nangular, cutoff,
+                 angularcutoff, batchsize=None):
+        self.globals = Parameters({'cutoff': cutoff,
+                                   'angularcutoff': angularcutoff,
+                                   'weights': weights,
+                                   'nradial': nradial,
+                                   'nangular': nangular,
+                                   'batchsize': batchsize})
+        self.keyed = Parameters({'neighborlist': neighborlist})
+        self.parallel_command = 'calculate_fingerprints'
+
+    def calculate(self, image, key):
+        """Makes a list of fingerprints, one per atom, for the fed image.
+
+        Parameters
+        ----------
+        image : object
+            ASE atoms object.
+        key : str
+            Key of the image after being hashed.
+        """
+        return self.get_fingerprints([image],
+                                     [self.keyed.neighborlist[key]])[0]
+
+    def calculate_batch(self, images):
+        """Makes the fingerprints of many images at once; used by
+        .utilities.Data in place of calculate. The neighbors of all atoms of
+        up to batchsize images are flattened into one set of pairs.
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of images; the key is the hash of each image and each
+            value is an ASE atoms object.
+
+        Returns
+        -------
+        fingerprints : dict
+            The fingerprints of each image, in the form returned by
+            calculate, with the same keys as images.
+        """
+        keys = list(images.keys())
+        batchsize = self.globals.batchsize or 1
+        results = {}
+        for start in range(0, len(keys), batchsize):
+            batch = keys[start:start + batchsize]
+            results.update(zip(batch, self.get_fingerprints(
+                [images[key] for key in batch],
+                [self.keyed.neighborlist[key] for key in batch])))
+        return results
+
+    def get_fingerprints(self, images, neighborlists):
+        """Returns the fingerprints of all atoms of several images.
+
+        Parameters
+        ----------
+        images : list of objects
+            ASE atoms objects.
+        neighborlists : list of lists
+            The neighborlist of each image.
+
+        Returns
+        -------
+        list of lists
+            The fingerprints of each image, in the form returned by
+            calculate.
+        """
+        pairs = flatten_neighborlists(images, neighborlists)
+        symbols = [symbol for image in images
+                   for symbol in image.get_chemical_symbols()]
+        fingerprints = calculate_fingerprints(pairs, symbols, self.globals)
+
+        results = []
+        start = 0
+        for image in images:
+            stop = start + len(image)
+            results.append([(symbol, list(fingerprint)) for symbol, fingerprint
+                            in zip(symbols[start:stop],
+                                   fingerprints[start:stop])])
+            start = stop
+        return results
+
+
+class FingerprintPrimeCalculator:
+    """For integration with .utilities.Data
+
+    Parameters are as for FingerprintCalculator.
+    """
+
+    def __init__(self, neighborlist, weights, nradial, nangular, cutoff,
+                 angularcutoff):
+        self.globals = Parameters({'cutoff': cutoff,
+                                   'angularcutoff': angularcutoff,
+                                   'weights': weights,
+                                   'nradial': nradial,
+                                   'nangular': nangular})
+        self.keyed = Parameters({'neighborlist': neighborlist})
+        self.parallel_command = 'calculate_fingerprint_primes'
+
+    def calculate(self, image, key):
+        """Makes a list of fingerprint derivatives, one per atom, for the fed
+        image.
+
+        The gradient of each pair term with respect to the vector from the
+        center atom to the neighbor is evaluated for all pairs at once; the
+        derivative of the fingerprint of an atom with respect to the position
+        of atom p is then the sum of the gradients of its pairs with
+        neighbors that are images of p, minus the sum of the gradients of all
+        of its pairs if p is the atom itself.
+
+        Parameters
+        ----------
+        image : object
+            ASE atoms object.
+        key : str
+            Key of the image after being hashed.
+        """
+        nl = self.keyed.neighborlist[key]
+        natoms = len(image)
+        symbols = image.get_chemical_symbols()
+        pairs = flatten_neighborlists([image], [nl])
+        fingerprints, gradients = calculate_fingerprints(
+            pairs, symbols, self.globals, derivatives=True)
+
+        # Derivatives of the fingerprint of atom c w.r.t. the position of
+        # atom p, keyed by c * natoms + p.
+        selfcodes = np.arange(natoms) * (natoms + 1)
+        paircodes = pairs['centers'] * natoms + pairs['neighbors']
+        codes, inverse = np.unique(np.concatenate([selfcodes, paircodes]),
+                                   return_inverse=True)
+        derivatives = np.zeros((len(codes),) + gradients.shape[1:])
+        np.add.at(derivatives, inverse[natoms:], gradients)
+        derivatives[inverse[:natoms]] -= sum_over_neighbors(gradients,
+                                                            pairs['counts'])
+
+        fingerprintprimes = {}
+        for selfindex, selfsymbol in enumerate(symbols):
+            values = derivatives[inverse[selfindex]]
+            for i in range(3):
+                fingerprintprimes[
+                    (selfindex, selfsymbol, selfindex, selfsymbol, i)] = \
+                    list(values[i])
+        # Derivatives of neighbor atom fingerprints w.r.t. coordinates of
+        # self atom; for calculating forces, summation runs over neighbor
+        # atoms of type II (within the main cell only).
+        keep = ~pairs['offsets'].all(axis=1)
+        for selfindex, nindex in zip(pairs['centers'][keep],
+                                     pairs['neighbors'][keep]):
+            values = derivatives[np.searchsorted(codes,
+                                                 nindex * natoms + selfindex)]
+            for i in range(3):
+                fingerprintprimes[(selfindex, symbols[selfindex], nindex,
+                                   symbols[nindex], i)] = list(values[i])
+        return fingerprintprimes
+
+
+# Auxiliary functions #########################################################
+
+
+def generate_weights(elements):
+    """Generates weights of the elements for the composition terms, as in
+    aenet: integers spaced symmetrically about zero (..., -1, 0, 1, ...),
+    with zero skipped for an even number of elements. Returns None for a
+    single element, for which the composition terms would repeat the
+    structure terms.
+
+    Parameters
+    ----------
+    elements : list of str
+        List of symbols of all elements.
+
+    Returns
+    -------
+    weights : dict or None
+        Weight of each element.
+    """
+    elements = sorted(elements)
+    if len(elements) < 2:
+        return None
+    values = [_ for _ in range(-(len(elements) // 2),
+                               len(elements) // 2 + 1)
+              if _ != 0 or len(elements) % 2 == 1]
+    return {element: float(value)
+            for element, value in zip(elements, values)}
+
+
+def calculate_chebyshev(x, order, derivatives=False):
+    """Calculates the Chebyshev polynomials T_0 to T_order, by recurrence.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Values in [-1, 1].
+    order : int
+        Maximum order.
+    derivatives : bool
+        If True, the derivatives with respect to x are also returned.
+
+    Returns
+    -------
+    polynomials : numpy.ndarray
+        Array of shape (order + 1,) + x.shape.
+    derivatives : numpy.ndarray
+        Only if derivatives is True; same shape as polynomials.
+    """
+    T = np.zeros((order + 1,) + np.shape(x))
+    dT = np.zeros(T.shape)
+    T[0] = 1.
+    if order > 0:
+        T[1] = x
+        dT[1] = 1.
+    for n in range(1, order):
+        T[n + 1] = 2. * x * T[n] - T[n - 1]
+        dT[n + 1] = 2. * T[n] + 2. * x * dT[n] - dT[n - 1]
+    if derivatives:
+        return T, dT
+    return T
+
+
+def get_legendre_coefficients(order):
+    """Returns the coefficients, times 4 pi / (2l + 1), of the Legendre
+    polynomials P_l in the Chebyshev polynomials T_a, as an array of shape
+    (order + 1, order + 1) indexed by a and l. By the addition theorem,
+    4 pi / (2l + 1) sum_m Y_lm(u) Y*_lm(v) = P_l(u . v).
+    """
+    coefficients = np.zeros((order + 1, order + 1))
+    for a in range(order + 1):
+        basis = np.zeros(a + 1)
+        basis[a] = 1.
+        coefficients[a, :a + 1] = legendre.poly2leg(chebyshev.cheb2poly(basis))
+    return coefficients * 4. * np.pi / (2. * np.arange(order + 1) + 1.)
+
+
+def calculate_fingerprints(pairs, symbols, parameters, derivatives=False):
+    """Calculates the fingerprints of atoms from their pairs with their
+    neighbors; these are the structure terms, followed by the composition
+    terms if there are element weights.
+
+    Parameters
+    ----------
+    pairs : dict
+        Pairs of flattened neighborlists, as from flatten_neighborlists.
+    symbols : list of str
+        Chemical symbols of the consecutively numbered atoms.
+    parameters : dict
+        With 'cutoff', 'angularcutoff', 'weights', 'nradial' and 'nangular',
+        as the globals of FingerprintCalculator.
+    derivatives : bool
+        If True, the gradients of the terms of each pair with respect to the
+        vector from the center atom to the neighbor are also returned.
+
+    Returns
+    -------
+    fingerprints : numpy.ndarray
+        Array of shape (number of atoms, number of fingerprints).
+    gradients : numpy.ndarray
+        Only if derivatives is True; array of shape (number of pairs, 3,
+        number of fingerprints).
+    """
+    pairweights = [np.ones(len(pairs['distances']))]
+    if parameters['weights'] is not None:
+        weights = np.array([parameters['weights'][symbol]
+                            for symbol in symbols])
+        pairweights.append(weights[pairs['neighbors']])
+    results = [calculate_expansions(pairs, _, parameters, derivatives)
+               for _ in pairweights]
+    if derivatives:
+        return (np.concatenate([_[0] for _ in results], axis=1),
+                np.concatenate([_[1] for _ in results], axis=2))
+    return np.concatenate(results, axis=1)
+
+
+def calculate_expansions(pairs, pairweights, parameters, derivatives=False):
+    """Calculates the radial and angular Chebyshev expansions of atoms, with
+    each neighbor weighted by pairweights, as described in Chebyshev. See
+    calculate_fingerprints for the parameters and returned values.
+
+    The angular terms of atom i are, with a_j = s_j fc'(R_ij) and u_j the
+    unit vector from atom i to neighbor j,
+
+        sum_(j<k) a_j a_k T_a(u_j . u_k)
+            = 1/2 sum_l C_al sum_m |A_lm|^2 - 1/2 sum_j a_j^2,
+
+    where A_lm = sum_j a_j Y_lm(u_j) and C_al are the coefficients of
+    get_legendre_coefficients; the second sum removes the terms j = k.
+    """
+    counts = pairs['counts']
+    cutoff = dict2cutoff(parameters['cutoff'])
+    angularcutoff = dict2cutoff(parameters['angularcutoff'])
+    Rc = parameters['cutoff']['kwargs']['Rc']
+    nangular = parameters['nangular']
+    R = pairs['distances']
+    units = pairs['vectors'] / R[:, np.newaxis]
+
+    # Radial terms.
+    fc = cutoff(R)
+    T, dT = calculate_chebyshev(2. * R / Rc - 1., parameters['nradial'],
+                                derivatives=True)
+    radial = sum_over_neighbors((pairweights * fc * T).T, counts)
+
+    # Angular terms.
+    a = pairweights * angularcutoff(R)
+    C = get_legendre_coefficients(nangular)
+    mweights = np.full(nangular + 1, 2.)
+    mweights[0] = 1.
+    if derivatives:
+        Y, dS = calculate_solid_harmonics(units, nangular, derivatives=True)
+    else:
+        Y = calculate_solid_harmonics(units, nangular)
+    A = sum_over_neighbors((a * Y).transpose(2, 0, 1), counts)
+    norms = np.einsum('m,ilm->il', mweights, np.abs(A) ** 2.)
+    angular = 0.5 * (np.dot(norms, C.T) -
+                     sum_over_neighbors(a ** 2., counts)[:, np.newaxis])
+    fingerprints = np.concatenate([radial, angular], axis=1)
+    if not derivatives:
+        return fingerprints
+
+    # Gradients w.r.t. the pair vectors.
+    dradial = (pairweights * (dT * 2. / Rc * fc + T * cutoff.prime(R)))
+    dradial = units[:, :, np.newaxis] * dradial.T[:, np.newaxis, :]
+    da = (pairweights * angularcutoff.prime(R))[:, np.newaxis] * units
+    # Gradient of Y_lm(u) w.r.t. the vector, from that of the solid
+    # harmonic r^l Y_lm, which is homogeneous of degree l.
+    ls = np.arange(nangular + 1)[:, np.newaxis, np.newaxis, np.newaxis]
+    dY = (dS - ls * Y[..., np.newaxis] * units) / R[:, np.newaxis]
+    dA = Y[..., np.newaxis] * da + a[:, np.newaxis] * dY
+    dnorms = np.einsum('m,plm,lmpq->plq', mweights,
+                       np.conjugate(A[pairs['centers']]), dA).real
+    dangular = (np.einsum('al,plq->pqa', C, dnorms) -
+                (a[:, np.newaxis] * da)[:, :, np.newaxis])
+    return fingerprints, np.concatenate([dradial, dangular], axis=2)
+
+
+if __name__ == "__main__":
+    """Directly calling this module; apparently from another node.
+    Calls should come as
+
+    python -m amp.descriptor.chebyshev id hostname:port
+
+    This session will then start a zmq session with that socket, labeling
+    itself with id. Instructions on what to do will come from the socket.
+    """
+    import sys
+    import tempfile
+    import zmq
+    from ..utilities import MessageDictionary
+
+    hostsocket = sys.argv[-1]
+    proc_id = sys.argv[-2]
+    msg = MessageDictionary(proc_id)
+
+    # Send standard lines to stdout signaling process started and where
+    # error is directed. This should be caught by pxssh. (This could
+    # alternatively be done by zmq, but this works.)
+    print('<amp-connect>')  # Signal that program started.
+    sys.stderr = tempfile.NamedTemporaryFile(
+        mode='w', delete=False, suffix='.stderr')
+    print('Log and error written to %s<stderr>' % sys.stderr.name)
+
+    def w(text):
+        """Writes to stderr and flushes."""
+        sys.stderr.write(text + '\n')
+        sys.stderr.flush()
+
+    # Establish client session via zmq; find purpose.
+    context = zmq.Context()
+    w('Context started.')
+    socket = context.socket(zmq.REQ)
+    w('Socket started.')
+    socket.connect('tcp://%s' % hostsocket)
+    w('Connection made.')
+    socket.send_pyobj(msg('<purpose>'))
+    w('Message sent.')
+    purpose = socket.recv_pyobj()
+    w('Purpose received: {}.'.format(purpose))
+
+    if purpose in ['calculate_fingerprints', 'calculate_fingerprint_primes']:
+        # Request variables.
+        variables = {}
+        for name in ['cutoff', 'angularcutoff', 'weights', 'nradial',
+                     'nangular', 'neighborlist']:
+            socket.send_pyobj(msg('<request>', name))
+            variables[name] = socket.recv_pyobj()
+        if purpose == 'calculate_fingerprints':
+            socket.send_pyobj(msg('<request>', 'batchsize'))
+            variables['batchsize'] = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'images'))
+        images = socket.recv_pyobj()
+        w('Received images and parameters.')
+
+        if purpose == 'calculate_fingerprints':
+            calc = FingerprintCalculator(**variables)
+            w('Established calculator. Calculating.')
+            result = calc.calculate_batch(images)
+        else:
+            calc = FingerprintPrimeCalculator(**variables)
+            w('Established calculator. Calculating.')
+            result = {}
+            while len(images) > 0:
+                key, image = images.popitem()  # Reduce memory.
+                result[key] = calc.calculate(image, key)
+                if len(images) % 100 == 0:
+                    socket.send_pyobj(msg('<info>', len(images)))
+                    socket.recv_string()  # Needed to complete REQ/REP.
+
+        # Send the results.
+        w('Sending results.')
+        socket.send_pyobj(msg('<result>', result))
+        socket.recv_string()  # Needed to complete REQ/REP.
+
+    else:
+        socket.close()  # May be needed in python3 / ZMQ.
+        raise NotImplementedError('purpose %s unknown.' % purpose)
+    socket.close()  # May be needed in python3 / ZMQ.
@@ -9,6 +9,12 @@ All cutoff functions also need to have an `Rc` attribute which
 is the maximum distance at which properties are calculated; this
 will be used in calculating neighborlists.
 
+The cutoff functions and their derivatives accept either a single distance
+or a numpy array of distances, so that descriptors can evaluate them for all
+pairs of an atomic environment in one call. Each can optionally be
+tabulated on a uniform grid and then evaluated by cubic Hermite
+interpolation; see `CutoffTable`.
+
 """
 
 import numpy as np
@@ -25,6 +31,86 @@ def dict2cutoff(dct):
     return globals()[dct['name']](**dct['kwargs'])
 
 
+class CutoffTable(object):
+    """Cubic Hermite interpolation table of a cutoff function.
+
+    The analytic function and its derivative are tabulated on a uniform grid
+    of `npoints` points between 0 and Rc. Between grid points, values and
+    derivatives are interpolated with the cubic Hermite polynomial that
+    matches both at the ends of each interval, so the interpolant is
+    continuously differentiable and exact at the grid points.
+
+    Parameters
+    ----------
+    function : callable
+        Analytic cutoff function; must accept numpy arrays.
+    prime : callable
+        Analytic derivative of the cutoff function; must accept numpy arrays.
+    Rc : float
+        Radius above which the cutoff function is zero.
+    npoints : int
+        Number of grid points.
+
+    Attributes
+    ----------
+    errors : dict
+        Upper bounds of the absolute interpolation error versus the analytic
+        form, with keys 'value' and 'prime'. They follow from the standard
+        cubic Hermite error bounds, h**4 / 384 * max|f''''| for the value
+        and sqrt(3) / 216 * h**3 * max|f''''| for the derivative, where h is
+        the grid spacing; max|f''''| is estimated from third differences of
+        the analytic derivative on a grid sixteen times finer.
+    """
+
+    def __init__(self, function, prime, Rc, npoints=1000):
+        if npoints < 2:
+            raise RuntimeError('At least two grid points are needed to '
+                               'tabulate a cutoff function.')
+        self.Rc = Rc
+        self.npoints = npoints
+        self.spacing = Rc / (npoints - 1.)
+        grid = np.linspace(0., Rc, npoints)
+        self.values = function(grid)
+        self.primes = prime(grid) * self.spacing
+
+        fine = np.linspace(0., Rc, 16 * (npoints - 1) + 1)
+        finespacing = fine[1] - fine[0]
+        fourth = np.abs(np.diff(prime(fine), 3)).max() / finespacing ** 3
+        self.errors = {'value': self.spacing ** 4 / 384. * fourth,
+                       'prime': (np.sqrt(3.) / 216. * self.spacing ** 3 *
+                                 fourth)}
+
+    def _locate(self, Rij):
+        """Returns the interval indices and the fractional positions of
+        Rij inside them."""
+        position = np.asarray(Rij, dtype=float) / self.spacing
+        index = np.clip(np.floor(position).astype(int), 0, self.npoints - 2)
+        return index, position - index
+
+    def __call__(self, Rij):
+        """Interpolated value of the cutoff function at Rij (float or
+        array)."""
+        index, t = self._locate(Rij)
+        t2 = t * t
+        t3 = t2 * t
+        value = ((2. * t3 - 3. * t2 + 1.) * self.values[index] +
+                 (t3 - 2. * t2 + t) * self.primes[index] +
+                 (-2. * t3 + 3. * t2) * self.values[index + 1] +
+                 (t3 - t2) * self.primes[index + 1])
+        return np.where(np.asarray(Rij) > self.Rc, 0., value)[()]
+
+    def prime(self, Rij):
+        """Interpolated derivative of the cutoff function at Rij (float or
+        array)."""
+        index, t = self._locate(Rij)
+        t2 = t * t
+        value = ((6. * t2 - 6. * t) * self.values[index] +
+                 (3. * t2 - 4. * t + 1.) * self.primes[index] +
+                 (-6. * t2 + 6. * t) * self.values[index + 1] +
+                 (3. * t2 - 2. * t) * self.primes[index + 1]) / self.spacing
+        return np.where(np.asarray(Rij) > self.Rc, 0., value)[()]
+
+
 class Cosine(object):
     """Cosine functional form suggested by Behler.
 
@@ -32,52 +118,80 @@ class Cosine(object):
     ---------
     Rc : float
         Radius above which neighbor interactions are ignored.
+    tabulate : int
+        If given, the function and its derivative are evaluated by
+        interpolation from a table with this many grid points instead of
+        analytically; the bounds of the resulting error are in
+        `self.table.errors`. The Gaussian descriptor does not use its
+        fortran routines, which only know the analytic form, with a
+        tabulated cutoff.
     """
 
-    def __init__(self, Rc):
+    def __init__(self, Rc, tabulate=None):
 
         self.Rc = Rc
+        self.tabulate = tabulate
+        self.table = None
+        if tabulate:
+            self.table = CutoffTable(self.analytic, self.analytic_prime,
+                                     Rc, tabulate)
 
     def __call__(self, Rij):
         """
         Parameters
         ----------
-        Rij : float
-            Distance between pair atoms.
+        Rij : float or numpy.ndarray
+            Distance(s) between pair atoms.
 
         Returns
         -------
-        float
+        float or numpy.ndarray
             The value of the cutoff function.
         """
-        if Rij > self.Rc:
-            return 0.
-        else:
-            return 0.5 * (np.cos(np.pi * Rij / self.Rc) + 1.)
+        if self.table is not None:
+            return self.table(Rij)
+        return self.analytic(Rij)
 
     def prime(self, Rij):
         """Derivative (dfc_dRij) of the Cosine cutoff function with respect to Rij.
 
         Parameters
         ----------
-        Rij : float
-            Distance between pair atoms.
+        Rij : float or numpy.ndarray
+            Distance(s) between pair atoms.
 
         Returns
         -------
-        float
+        float or numpy.ndarray
             The value of derivative of the cutoff function.
         """
-        if Rij > self.Rc:
-            return 0.
-        else:
-            return -0.5 * np.pi / self.Rc * np.sin(np.pi * Rij / self.Rc)
+        if self.table is not None:
+            return self.table.prime(Rij)
+        return self.analytic_prime(Rij)
+
+    def analytic(self, Rij):
+        """Analytic value of the cutoff function at Rij (float or array)."""
+        value = 0.5 * (np.cos(np.pi * np.asarray(Rij) / self.Rc) + 1.)
+        return np.where(np.asarray(Rij) > self.Rc, 0., value)[()]
+
+    def analytic_prime(self, Rij):
+        """Analytic derivative of the cutoff function at Rij (float or
+        array)."""
+        value = -0.5 * np.pi / self.Rc * np.sin(np.pi * np.asarray(Rij) /
+                                                self.Rc)
+        return np.where(np.asarray(Rij) > self.Rc, 0., value)[()]
 
     def todict(self):
+        kwargs = {'Rc': self.Rc}
+        if self.tabulate:
+            kwargs['tabulate'] = self.tabulate
         return {'name': 'Cosine',
-                'kwargs': {'Rc': self.Rc}}
+                'kwargs': kwargs}
 
     def __repr__(self):
+        if self.tabulate:
+            return ('<Cosine cutoff with Rc=%.3f tabulated on %i points '
+                    'from amp.descriptor.cutoffs>' % (self.Rc, self.tabulate))
         return ('<Cosine cutoff with Rc=%.3f from amp.descriptor.cutoffs>'
                 % self.Rc)
 
@@ -91,60 +205,86 @@ class Polynomial(object):
         The power of polynomial.
     Rc : float
         Radius above which neighbor interactions are ignored.
+    tabulate : int
+        If given, the function and its derivative are evaluated by
+        interpolation from a table with this many grid points instead of
+        analytically; the bounds of the resulting error are in
+        `self.table.errors`. The Gaussian descriptor does not use its
+        fortran routines, which only know the analytic form, with a
+        tabulated cutoff.
     """
 
-    def __init__(self, Rc, gamma=4):
+    def __init__(self, Rc, gamma=4, tabulate=None):
         self.gamma = gamma
         self.Rc = Rc
+        self.tabulate = tabulate
+        self.table = None
+        if tabulate:
+            self.table = CutoffTable(self.analytic, self.analytic_prime,
+                                     Rc, tabulate)
 
     def __call__(self, Rij):
         """
         Parameters
         ----------
-        Rij : float
-            Distance between pair atoms.
+        Rij : float or numpy.ndarray
+            Distance(s) between pair atoms.
 
         Returns
         -------
-        value : float
+        value : float or numpy.ndarray
             The value of the cutoff function.
         """
-        if Rij > self.Rc:
-            return 0.
-        else:
-            value = 1. + self.gamma * (Rij / self.Rc) ** (self.gamma + 1) - \
-                (self.gamma + 1) * (Rij / self.Rc) ** self.gamma
-            return value
+        if self.table is not None:
+            return self.table(Rij)
+        return self.analytic(Rij)
 
     def prime(self, Rij):
         """Derivative (dfc_dRij) of the Polynomial cutoff function with respect to Rij.
 
         Parameters
         ----------
-        Rij : float
-            Distance between pair atoms.
+        Rij : float or numpy.ndarray
+            Distance(s) between pair atoms.
 
         Returns
         -------
-        float
+        float or numpy.ndarray
             The value of derivative of the cutoff function.
         """
-        if Rij > self.Rc:
-            return 0.
-        else:
-            value = (self.gamma * (self.gamma + 1) / self.Rc) * \
-                ((Rij / self.Rc) ** self.gamma -
-                 (Rij / self.Rc) ** (self.gamma - 1))
-            return value
+        if self.table is not None:
+            return self.table.prime(Rij)
+        return self.analytic_prime(Rij)
+
+    def analytic(self, Rij):
+        """Analytic value of the cutoff function at Rij (float or array)."""
+        ratio = np.asarray(Rij) / self.Rc
+        value = 1. + self.gamma * ratio ** (self.gamma + 1) - \
+            (self.gamma + 1) * ratio ** self.gamma
+        return np.where(ratio > 1., 0., value)[()]
+
+    def analytic_prime(self, Rij):
+        """Analytic derivative of the cutoff function at Rij (float or
+        array)."""
+        ratio = np.asarray(Rij) / self.Rc
+        value = (self.gamma * (self.gamma + 1) / self.Rc) * \
+            (ratio ** self.gamma - ratio ** (self.gamma - 1))
+        return np.where(ratio > 1., 0., value)[()]
 
     def todict(self):
+        kwargs = {'Rc': self.Rc,
+                  'gamma': self.gamma}
+        if self.tabulate:
+            kwargs['tabulate'] = self.tabulate
         return {'name': 'Polynomial',
-                'kwargs': {'Rc': self.Rc,
-                           'gamma': self.gamma
-                           }
+                'kwargs': kwargs
                 }
 
     def __repr__(self):
+        if self.tabulate:
+            return ('<Polynomial cutoff with Rc=%.3f and gamma=%i tabulated '
+                    'on %i points from amp.descriptor.cutoffs>'
+                    % (self.Rc, self.gamma, self.tabulate))
         return ('<Polynomial cutoff with Rc=%.3f and gamma=%i '
                 'from amp.descriptor.cutoffs>'
                 % (self.Rc, self.gamma))
@@ -2,9 +2,9 @@ import time
 import numpy as np
 
 from ase.calculators.calculator import Parameters
-from ..utilities import Data, Logger, importer
+from ..utilities import Data, Logger, summarize_fingerprints
 from .cutoffs import Cosine
-NeighborList = importer('NeighborList')
+from .neighborlist import SharedNeighborlists
 
 
 class AtomCenteredExample(object):
@@ -28,6 +28,12 @@ class AtomCenteredExample(object):
         location can be shared between calculator instances to avoid
         re-calculating redundant information. If not supplied, just uses the
         value from label.
+    nldblabel : str
+        Optional separate prefix/location for the neighborlist database only.
+        Neighborlists are stored by image and cutoff radius, so this location
+        can be shared between descriptors of any kind and cutoff; those of a
+        smaller cutoff are then filtered from those of a larger one. If not
+        supplied, just uses dblabel.
     elements : list
         List of allowed elements present in the system. If not provided, will
         be found automatically.
@@ -40,7 +46,8 @@ class AtomCenteredExample(object):
     """
 
     def __init__(self, cutoff=Cosine(6.5), anotherparameter=12.2, dblabel=None,
-                 elements=None, version=None, mode='atom-centered'):
+                 elements=None, version=None, mode='atom-centered',
+                 nldblabel=None):
 
         # Check of the version of descriptor, particularly if restarting.
         compatibleversions = ['2016.02', ]
@@ -77,6 +84,7 @@ class AtomCenteredExample(object):
         p.elements = elements
 
         self.dblabel = dblabel
+        self.nldblabel = nldblabel
         self.parent = None  # Can hold a reference to main Amp instance.
 
     def tostring(self):
@@ -131,10 +139,8 @@ class AtomCenteredExample(object):
 
         log('Calculating neighborlists...', tic='nl')
         if not hasattr(self, 'neighborlist'):
-            calc = NeighborlistCalculator(cutoff=p.cutoff)
-            self.neighborlist = Data(filename='%s-neighborlists'
-                                     % self.dblabel,
-                                     calculator=calc)
+            self.neighborlist = SharedNeighborlists(
+                dblabel=self.nldblabel or self.dblabel, cutoff=p.cutoff)
         self.neighborlist.calculate_items(images, parallel=parallel, log=log)
         log('...neighborlists calculated.', toc='nl')
 
@@ -146,7 +152,8 @@ class AtomCenteredExample(object):
                                          cutofffn=p.cutofffn)
             self.fingerprints = Data(filename='%s-fingerprints'
                                      % self.dblabel,
-                                     calculator=calc)
+                                     calculator=calc,
+                                     summarize=summarize_fingerprints)
         self.fingerprints.calculate_items(images, parallel=parallel, log=log)
         log('...fingerprints calculated.', toc='fp')
 
@@ -154,45 +161,6 @@ class AtomCenteredExample(object):
 # Calculators #################################################################
 
 
-# Neighborlist Calculator
-class NeighborlistCalculator:
-    """For integration with .utilities.Data
-
-    For each image fed to calculate, a list of neighbors with offset distances
-    is returned.
-
-    Parameters
-    ----------
-    cutoff : float
-        Radius above which neighbor interactions are ignored.
-    """
-    def __init__(self, cutoff):
-        self.globals = Parameters({'cutoff': cutoff})
-        self.keyed = Parameters()
-        self.parallel_command = 'calculate_neighborlists'
-
-    def calculate(self, image, key):
-        """For integration with .utilities.Data
-
-        For each image fed to calculate, a list of neighbors with offset
-        distances is returned.
-
-        Parameters
-        ----------
-        image : object
-            ASE atoms object.
-        key : str
-            key of the image after being hashed.
-        """
-        cutoff = self.globals.cutoff
-        n = NeighborList(cutoffs=[cutoff / 2.] * len(image),
-                         self_interaction=False,
-                         bothways=True,
-                         skin=0.)
-        n.update(image)
-        return [n.get_neighbors(index) for index in range(len(image))]
-
-
 class FingerprintCalculator:
     """For integration with .utilities.Data"""
 
@@ -285,27 +253,7 @@ if __name__ == "__main__":
     socket.send_pyobj(msg('<purpose>'))
     purpose = socket.recv_pyobj()
 
-    if purpose == 'calculate_neighborlists':
-        # Request variables.
-        socket.send_pyobj(msg('<request>', 'cutoff'))
-        cutoff = socket.recv_pyobj()
-        socket.send_pyobj(msg('<request>', 'images'))
-        images = socket.recv_pyobj()
-        # sys.stderr.write(str(images)) # Just to see if they are there.
-
-        # Perform the calculations.
-        calc = NeighborlistCalculator(cutoff=cutoff)
-        neighborlist = {}
-        # for key in images.iterkeys():
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            neighborlist[key] = calc.calculate(image, key)
-
-        # Send the results.
-        socket.send_pyobj(msg('<result>', neighborlist))
-        socket.recv_string()  # Needed to complete REQ/REP.
-
-    elif purpose == 'calculate_fingerprints':
+    if purpose == 'calculate_fingerprints':
         # Request variables.
         socket.send_pyobj(msg('<request>', 'cutoff'))
         cutoff = socket.recv_pyobj()
@@ -1,11 +1,11 @@
 import numpy as np
 from copy import deepcopy
 
-from ase.data import atomic_numbers
+from ase.data import atomic_numbers, chemical_symbols
 from ase.calculators.calculator import Parameters
-from ..utilities import Data, Logger, importer
+from ..utilities import Data, Logger, summarize_fingerprints
 from .cutoffs import Cosine, dict2cutoff
-NeighborList = importer('NeighborList')
+from .neighborlist import SharedNeighborlists
 try:
     from .. import fmodules
 except ImportError:
@@ -38,21 +38,61 @@ class Gaussian(object):
         these lists of dictionaries.  If you supply a list instead of a
         dictionary, it will assume you want identical symmetry functions for
         each element.
+
+        In place of "element" or "elements", a symmetry function can have
+        "weights", a dictionary of a weight per element, as in
+
+               >>> {"type":"G4", "weights":{"O": 8., "Au": 79.},
+               ...  "eta":5., "gamma":1., "zeta":1.0}
+
+        Such a weighted symmetry function sums over all neighbors (or pairs
+        of neighbors), each term being multiplied by the weight of the
+        neighbor (or the product of the weights of both neighbors), so the
+        number of symmetry functions does not grow with the number of
+        elements. Neighbors of elements without a weight are ignored.
     dblabel : str
         Optional separate prefix/location for database files, including
         fingerprints, fingerprint derivatives, and neighborlists. This file
         location can be shared between calculator instances to avoid
         re-calculating redundant information. If not supplied, just uses the
         value from label.
+    nldblabel : str
+        Optional separate prefix/location for the neighborlist database only.
+        Neighborlists are stored by image and cutoff radius, so this location
+        can be shared between descriptors of any kind and cutoff; those of a
+        smaller cutoff are then filtered from those of a larger one. If not
+        supplied, just uses dblabel.
     elements : list
         List of allowed elements present in the system. If not provided, will
         be found automatically.
     version : str
         Version of fingerprints.
     fortran : bool
-        If True, will use fortran modules, if False, will not.
+        If True, will use fortran modules, if False, will not. Ignored with a
+        tabulated cutoff function, which the fortran modules do not support.
     mode : str
         Can be either 'atom-centered' or 'image-centered'.
+    skin : float
+        If non-zero, a single neighborlist is built with its radius padded by
+        skin and is re-used from one image to the next (e.g., the steps of a
+        molecular dynamics run), being rebuilt only once some atom has moved
+        by more than skin / 2. Neighbors are still filtered to the cutoff
+        radius, so the fingerprints are unaffected. Like fortran, this only
+        affects speed and so is not stored with the parameters.
+    incremental : bool
+        If True, each new image is compared with the image previously
+        fingerprinted; if they differ only in the positions of some atoms
+        (e.g., in Monte Carlo moves or relaxations of an adsorbate), only the
+        atoms that moved or have a moved atom within their cutoff sphere are
+        re-fingerprinted, and the results of the others are re-used. Also not
+        stored with the parameters.
+    batchsize : int
+        If given, the images still to be fingerprinted (by each process) are
+        grouped by their atomic numbers, and up to batchsize images of each
+        group at a time are fingerprinted together as stacked arrays, as in
+        AIMD trajectories; the same goes for fingerprint derivatives. Radial
+        terms are then evaluated once per pair, from a half neighborlist.
+        Also not stored with the parameters.
 
     Raises
     ------
@@ -61,7 +101,8 @@ class Gaussian(object):
 
     def __init__(self, cutoff=Cosine(6.5), Gs=None, dblabel=None,
                  elements=None, version=None, fortran=True,
-                 mode='atom-centered'):
+                 mode='atom-centered', skin=0., incremental=False,
+                 batchsize=None, nldblabel=None):
 
         # Check of the version of descriptor, particularly if restarting.
         compatibleversions = ['2015.12', ]
@@ -101,7 +142,11 @@ class Gaussian(object):
         p.elements = elements
 
         self.dblabel = dblabel
+        self.nldblabel = nldblabel
         self.fortran = fortran
+        self.skin = skin
+        self.incremental = incremental
+        self.batchsize = batchsize
         self.parent = None  # Can hold a reference to main Amp instance.
 
     def tostring(self):
@@ -163,7 +208,14 @@ class Gaussian(object):
         for element, fingerprints in p.Gs.items():
             log('{} feature vector functions:'.format(element))
             for index, fp in enumerate(fingerprints):
-                if fp['type'] == 'G2':
+                if 'weights' in fp:
+                    log(' {}: weighted {}, {}'
+                        .format(index, fp['type'],
+                                ', '.join('{}={}'.format(key, fp[key])
+                                          for key in ['eta', 'gamma', 'zeta',
+                                                      'weights']
+                                          if key in fp)))
+                elif fp['type'] == 'G2':
                     log(' {}: {}, {}, eta = {}'
                         .format(index, fp['type'], fp['element'], fp['eta']))
                 elif fp['type'] == 'G4':
@@ -181,10 +233,10 @@ class Gaussian(object):
 
         log('Calculating neighborlists...', tic='nl')
         if not hasattr(self, 'neighborlist'):
-            calc = NeighborlistCalculator(cutoff=p.cutoff['kwargs']['Rc'])
             self.neighborlist = \
-                Data(filename='%s-neighborlists' % self.dblabel,
-                     calculator=calc)
+                SharedNeighborlists(dblabel=self.nldblabel or self.dblabel,
+                                    cutoff=p.cutoff['kwargs']['Rc'],
+                                    skin=self.skin)
         self.neighborlist.calculate_items(images, parallel=parallel, log=log)
         log('...neighborlists calculated.', toc='nl')
 
@@ -193,10 +245,13 @@ class Gaussian(object):
             calc = FingerprintCalculator(neighborlist=self.neighborlist,
                                          Gs=p.Gs,
                                          cutoff=p.cutoff,
-                                         fortran=self.fortran)
+                                         fortran=self.fortran,
+                                         incremental=self.incremental,
+                                         batchsize=self.batchsize)
             self.fingerprints = Data(filename='%s-fingerprints'
                                      % self.dblabel,
-                                     calculator=calc)
+                                     calculator=calc,
+                                     summarize=summarize_fingerprints)
         self.fingerprints.calculate_items(images, parallel=parallel, log=log)
         log('...fingerprints calculated.', toc='fp')
 
@@ -208,7 +263,9 @@ class Gaussian(object):
                     FingerprintPrimeCalculator(neighborlist=self.neighborlist,
                                                Gs=p.Gs,
                                                cutoff=p.cutoff,
-                                               fortran=self.fortran)
+                                               fortran=self.fortran,
+                                               incremental=self.incremental,
+                                               batchsize=self.batchsize)
                 self.fingerprintprimes = \
                     Data(filename='%s-fingerprint-primes'
                          % self.dblabel,
@@ -221,45 +278,6 @@ class Gaussian(object):
 # Calculators #################################################################
 
 
-# Neighborlist Calculator
-class NeighborlistCalculator:
-    """For integration with .utilities.Data
-
-    For each image fed to calculate, a list of neighbors with offset distances
-    is returned.
-
-    Parameters
-    ----------
-    cutoff : float
-        Radius above which neighbor interactions are ignored.
-    """
-    def __init__(self, cutoff):
-        self.globals = Parameters({'cutoff': cutoff})
-        self.keyed = Parameters()
-        self.parallel_command = 'calculate_neighborlists'
-
-    def calculate(self, image, key):
-        """For integration with .utilities.Data
-
-        For each image fed to calculate, a list of neighbors with offset
-        distances is returned.
-
-        Parameters
-        ----------
-        image : object
-            ASE atoms object.
-        key : str
-            key of the image after being hashed.
-        """
-        cutoff = self.globals.cutoff
-        n = NeighborList(cutoffs=[cutoff / 2.] * len(image),
-                         self_interaction=False,
-                         bothways=True,
-                         skin=0.)
-        n.update(image)
-        return [n.get_neighbors(index) for index in range(len(image))]
-
-
 class FingerprintCalculator:
     """For integration with .utilities.Data
 
@@ -283,13 +301,26 @@ class FingerprintCalculator:
         Radius above which neighbor interactions are ignored.
     fortran : bool
         If True, will use fortran modules, if False, will not.
+    incremental : bool
+        If True, the last image calculated is remembered, and only the atoms
+        affected by the differences from it are re-calculated in the next
+        image; see get_affected_atoms.
+    batchsize : int
+        Maximum number of images stacked together by calculate_batch. If None,
+        calculate_batch calculates the images one at a time with calculate.
     """
-    def __init__(self, neighborlist, Gs, cutoff, fortran):
+    def __init__(self, neighborlist, Gs, cutoff, fortran, incremental=False,
+                 batchsize=None):
         self.globals = Parameters({'cutoff': cutoff,
-                                   'Gs': Gs})
+                                   'Gs': Gs,
+                                   'batchsize': batchsize})
         self.keyed = Parameters({'neighborlist': neighborlist})
         self.parallel_command = 'calculate_fingerprints'
-        self.fortran = fortran
+        # The fortran routines evaluate the analytic cutoff function, so a
+        # tabulated cutoff is only honored by the python routines.
+        self.fortran = fortran and not cutoff['kwargs'].get('tabulate')
+        self.incremental = incremental
+        self.previous = None  # (image, neighborlist, fingerprints)
 
     def calculate(self, image, key):
         """Makes a list of fingerprints, one per atom, for the fed image.
@@ -303,10 +334,17 @@ class FingerprintCalculator:
         """
         self.atoms = image
         nl = self.keyed.neighborlist[key]
+        affected = None
+        if self.incremental and self.previous is not None:
+            affected = get_affected_atoms(self.previous[0], image,
+                                          self.previous[1], nl)
         fingerprints = []
         for atom in image:
             symbol = atom.symbol
             index = atom.index
+            if affected is not None and not affected[index]:
+                fingerprints.append(self.previous[2][index])
+                continue
             neighborindices, neighboroffsets = nl[index]
             neighborsymbols = [image[_].symbol for _ in neighborindices]
             neighborpositions = \
@@ -317,8 +355,32 @@ class FingerprintCalculator:
                 index, symbol, neighborsymbols, neighborpositions)
             fingerprints.append(indexfp)
 
+        if self.incremental:
+            self.previous = (image.copy(), nl, fingerprints)
         return fingerprints
 
+    def calculate_batch(self, images):
+        """Makes the fingerprints of many images at once; used by
+        .utilities.Data in place of calculate. Images with identical atomic
+        numbers are stacked, up to batchsize at a time, and each symmetry
+        function is evaluated with array operations over the whole stack by
+        calculate_fingerprints_batch. Without a batchsize, the images are
+        calculated one at a time.
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of images; the key is the hash of each image and each
+            value is an ASE atoms object.
+
+        Returns
+        -------
+        fingerprints : dict
+            The fingerprints of each image, in the form returned by
+            calculate, with the same keys as images.
+        """
+        return _calculate_stacks(self, images, calculate_fingerprints_batch)
+
     def get_fingerprint(self, index, symbol,
                         neighborsymbols, neighborpositions):
         """Returns the fingerprint of symmetry function values for atom
@@ -349,24 +411,29 @@ class FingerprintCalculator:
         fingerprint = [None] * num_symmetries
 
         for count in range(num_symmetries):
-            G = self.globals.Gs[symbol][count]
-
-            if G['type'] == 'G2':
-                ridge = calculate_G2(neighborsymbols, neighborpositions,
-                                     G['element'], G['eta'],
-                                     self.globals.cutoff, Ri, self.fortran)
-            elif G['type'] == 'G4':
-                ridge = calculate_G4(neighborsymbols, neighborpositions,
-                                     G['elements'], G['gamma'],
-                                     G['zeta'], G['eta'], self.globals.cutoff,
-                                     Ri, self.fortran)
-            elif G['type'] == 'G5':
-                ridge = calculate_G5(neighborsymbols, neighborpositions,
-                                     G['elements'], G['gamma'],
-                                     G['zeta'], G['eta'], self.globals.cutoff,
-                                     Ri, self.fortran)
-            else:
-                raise NotImplementedError('Unknown G type: %s' % G['type'])
+            ridge = 0.
+            for weight, G in expand_weighted_symmetry_function(
+                    self.globals.Gs[symbol][count], neighborsymbols):
+                if G['type'] == 'G2':
+                    ridge += weight * calculate_G2(
+                        neighborsymbols, neighborpositions,
+                        G['element'], G['eta'],
+                        self.globals.cutoff, Ri, self.fortran)
+                elif G['type'] == 'G4':
+                    ridge += weight * calculate_G4(
+                        neighborsymbols, neighborpositions,
+                        G['elements'], G['gamma'],
+                        G['zeta'], G['eta'], self.globals.cutoff,
+                        Ri, self.fortran)
+                elif G['type'] == 'G5':
+                    ridge += weight * calculate_G5(
+                        neighborsymbols, neighborpositions,
+                        G['elements'], G['gamma'],
+                        G['zeta'], G['eta'], self.globals.cutoff,
+                        Ri, self.fortran)
+                else:
+                    raise NotImplementedError('Unknown G type: %s' %
+                                              G['type'])
             fingerprint[count] = ridge
 
         return symbol, fingerprint
@@ -395,14 +462,27 @@ class FingerprintPrimeCalculator:
         Radius above which neighbor interactions are ignored.
     fortran : bool
         If True, will use fortran modules, if False, will not.
+    incremental : bool
+        If True, the last image calculated is remembered, and only the atoms
+        affected by the differences from it are re-calculated in the next
+        image; see get_affected_atoms.
+    batchsize : int
+        Maximum number of images stacked together by calculate_batch. If None,
+        calculate_batch calculates the images one at a time with calculate.
     """
 
-    def __init__(self, neighborlist, Gs, cutoff, fortran):
+    def __init__(self, neighborlist, Gs, cutoff, fortran, incremental=False,
+                 batchsize=None):
         self.globals = Parameters({'cutoff': cutoff,
-                                   'Gs': Gs})
+                                   'Gs': Gs,
+                                   'batchsize': batchsize})
         self.keyed = Parameters({'neighborlist': neighborlist})
         self.parallel_command = 'calculate_fingerprint_primes'
-        self.fortran = fortran
+        # The fortran routines evaluate the analytic cutoff function, so a
+        # tabulated cutoff is only honored by the python routines.
+        self.fortran = fortran and not cutoff['kwargs'].get('tabulate')
+        self.incremental = incremental
+        self.previous = None  # (image, neighborlist, fingerprintprimes)
 
     def calculate(self, image, key):
         """Makes a list of fingerprint derivatives, one per atom,
@@ -417,6 +497,11 @@ class FingerprintPrimeCalculator:
         """
         self.atoms = image
         nl = self.keyed.neighborlist[key]
+        affected = None
+        if self.incremental and self.previous is not None:
+            affected = get_affected_atoms(self.previous[0], image,
+                                          self.previous[1], nl)
+            previousprimes = self.previous[2]
         fingerprintprimes = {}
         for atom in image:
             selfsymbol = atom.symbol
@@ -434,15 +519,15 @@ class FingerprintPrimeCalculator:
             for i in range(3):
                 # Calculating derivative of fingerprints of self atom w.r.t.
                 # coordinates of itself.
-                fpprime = self.get_fingerprintprime(
-                    selfindex, selfsymbol,
-                    selfneighborindices,
-                    selfneighborsymbols,
-                    selfneighborpositions, selfindex, i)
-
-                fingerprintprimes[
-                    (selfindex, selfsymbol, selfindex, selfsymbol, i)] = \
-                    fpprime
+                selfkey = (selfindex, selfsymbol, selfindex, selfsymbol, i)
+                if affected is not None and not affected[selfindex]:
+                    fingerprintprimes[selfkey] = previousprimes[selfkey]
+                else:
+                    fingerprintprimes[selfkey] = self.get_fingerprintprime(
+                        selfindex, selfsymbol,
+                        selfneighborindices,
+                        selfneighborsymbols,
+                        selfneighborpositions, selfindex, i)
                 # Calculating derivative of fingerprints of neighbor atom
                 # w.r.t. coordinates of self atom.
                 for nindex, nsymbol, noffset in \
@@ -452,6 +537,13 @@ class FingerprintPrimeCalculator:
                     # for calculating forces, summation runs over neighbor
                     # atoms of type II (within the main cell only)
                     if noffset.all() == 0:
+                        nkey = (selfindex, selfsymbol, nindex, nsymbol, i)
+                        # The fingerprint of an unaffected neighbor, and so
+                        # its derivatives, are unchanged.
+                        if (affected is not None and not affected[nindex] and
+                                nkey in previousprimes):
+                            fingerprintprimes[nkey] = previousprimes[nkey]
+                            continue
                         nneighborindices, nneighboroffsets = nl[nindex]
                         nneighborsymbols = \
                             [image[_].symbol for _ in nneighborindices]
@@ -471,12 +563,32 @@ class FingerprintPrimeCalculator:
                             nneighborsymbols,
                             neighborpositions, selfindex, i)
 
-                        fingerprintprimes[
-                            (selfindex, selfsymbol, nindex, nsymbol, i)] = \
-                            fpprime
+                        fingerprintprimes[nkey] = fpprime
 
+        if self.incremental:
+            self.previous = (image.copy(), nl, fingerprintprimes)
         return fingerprintprimes
 
+    def calculate_batch(self, images):
+        """Makes the fingerprint derivatives of many images at once, by
+        stacks of images with identical atomic numbers as in
+        FingerprintCalculator.calculate_batch.
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of images; the key is the hash of each image and each
+            value is an ASE atoms object.
+
+        Returns
+        -------
+        fingerprintprimes : dict
+            The fingerprint derivatives of each image, in the form returned
+            by calculate, with the same keys as images.
+        """
+        return _calculate_stacks(self, images,
+                                 calculate_fingerprintprimes_batch)
+
     def get_fingerprintprime(self, index, symbol,
                              neighborindices,
                              neighborsymbols,
@@ -517,60 +629,622 @@ class FingerprintPrimeCalculator:
         fingerprintprime = [None] * num_symmetries
 
         for count in range(num_symmetries):
-            G = self.globals.Gs[symbol][count]
-            if G['type'] == 'G2':
-                ridge = calculate_G2_prime(
-                    neighborindices,
-                    neighborsymbols,
-                    neighborpositions,
-                    G['element'],
-                    G['eta'],
-                    self.globals.cutoff,
-                    index,
-                    Rindex,
-                    m,
-                    l,
-                    self.fortran)
-            elif G['type'] == 'G4':
-                ridge = calculate_G4_prime(
-                    neighborindices,
-                    neighborsymbols,
-                    neighborpositions,
-                    G['elements'],
-                    G['gamma'],
-                    G['zeta'],
-                    G['eta'],
-                    self.globals.cutoff,
-                    index,
-                    Rindex,
-                    m,
-                    l,
-                    self.fortran)
-            elif G['type'] == 'G5':
-                ridge = calculate_G5_prime(
-                    neighborindices,
-                    neighborsymbols,
-                    neighborpositions,
-                    G['elements'],
-                    G['gamma'],
-                    G['zeta'],
-                    G['eta'],
-                    self.globals.cutoff,
-                    index,
-                    Rindex,
-                    m,
-                    l,
-                    self.fortran)
-            else:
-                raise NotImplementedError('Unknown G type: %s' % G['type'])
+            ridge = 0.
+            for weight, G in expand_weighted_symmetry_function(
+                    self.globals.Gs[symbol][count], neighborsymbols):
+                if G['type'] == 'G2':
+                    ridge += weight * calculate_G2_prime(
+                        neighborindices,
+                        neighborsymbols,
+                        neighborpositions,
+                        G['element'],
+                        G['eta'],
+                        self.globals.cutoff,
+                        index,
+                        Rindex,
+                        m,
+                        l,
+                        self.fortran)
+                elif G['type'] == 'G4':
+                    ridge += weight * calculate_G4_prime(
+                        neighborindices,
+                        neighborsymbols,
+                        neighborpositions,
+                        G['elements'],
+                        G['gamma'],
+                        G['zeta'],
+                        G['eta'],
+                        self.globals.cutoff,
+                        index,
+                        Rindex,
+                        m,
+                        l,
+                        self.fortran)
+                elif G['type'] == 'G5':
+                    ridge += weight * calculate_G5_prime(
+                        neighborindices,
+                        neighborsymbols,
+                        neighborpositions,
+                        G['elements'],
+                        G['gamma'],
+                        G['zeta'],
+                        G['eta'],
+                        self.globals.cutoff,
+                        index,
+                        Rindex,
+                        m,
+                        l,
+                        self.fortran)
+                else:
+                    raise NotImplementedError('Unknown G type: %s' %
+                                              G['type'])
 
             fingerprintprime[count] = ridge
 
         return fingerprintprime
 
+
+def _calculate_stacks(calc, images, function):
+    """Groups images by their atomic numbers and feeds them, up to
+    calc.globals.batchsize at a time, to function
+    (calculate_fingerprints_batch or calculate_fingerprintprimes_batch); if
+    calc.globals.batchsize is None, calc.calculate is used on each image
+    instead. Returns the results by image key."""
+    if not calc.globals.batchsize:
+        return {key: calc.calculate(image, key)
+                for key, image in images.items()}
+    groups = {}
+    for key, image in images.items():
+        groups.setdefault(tuple(image.numbers), []).append(key)
+    results = {}
+    for keys in groups.values():
+        for start in range(0, len(keys), calc.globals.batchsize):
+            batch = keys[start:start + calc.globals.batchsize]
+            results.update(zip(batch, function(
+                images=[images[key] for key in batch],
+                neighborlists=[calc.keyed.neighborlist[key] for key in batch],
+                Gs=calc.globals.Gs,
+                cutoff=calc.globals.cutoff)))
+    return results
+
+
 # Auxiliary functions #########################################################
 
 
+def get_affected_atoms(previousimage, image, previousneighborlist,
+                       neighborlist):
+    """Finds the atoms whose local environments may differ between two
+    configurations of the same system; that is, the atoms that moved plus the
+    atoms that have a moved atom within their cutoff sphere either before or
+    after the move.
+
+    Parameters
+    ----------
+    previousimage : object
+        ASE atoms object of the earlier configuration.
+    image : object
+        ASE atoms object of the new configuration.
+    previousneighborlist : list
+        Neighborlist of previousimage, as from NeighborlistCalculator.
+    neighborlist : list
+        Neighborlist of image, as from NeighborlistCalculator.
+
+    Returns
+    -------
+    affected : numpy array of bool or None
+        True for each atom whose fingerprint must be re-calculated. None if
+        the two images differ in more than positions (e.g., in the atoms,
+        cell or periodicity), so that they cannot be compared.
+    """
+    if ((len(previousimage) != len(image)) or
+            (previousimage.numbers != image.numbers).any() or
+            (previousimage.pbc != image.pbc).any() or
+            (previousimage.cell != image.cell).any()):
+        return None
+    moved = (previousimage.positions != image.positions).any(axis=1)
+    affected = moved.copy()
+    for index in range(len(image)):
+        if affected[index]:
+            continue
+        affected[index] = (moved[previousneighborlist[index][0]].any() or
+                           moved[neighborlist[index][0]].any())
+    return affected
+
+
+# Stacked-array versions ######################################################
+
+
+def stack_neighborlists(images, neighborlists):
+    """Flattens the neighborlists of a stack of images with the same atoms
+    into arrays with one entry per (center atom, neighbor) pair.
+
+    Parameters
+    ----------
+    images : list of objects
+        ASE atoms objects, all with the same atomic numbers.
+    neighborlists : list of lists
+        The neighborlist of each image, as from NeighborlistCalculator.
+
+    Returns
+    -------
+    pairs : dict
+        'frames', 'centers' and 'neighbors' are the indices of the image in
+        the stack, of the center atom and of the neighbor atom of each pair;
+        'offsets' are the cell offsets of the neighbors; 'vectors' and
+        'distances' are from the center to the (periodic image of the)
+        neighbor; 'counts' is the number of neighbors of each atom of each
+        image. Pairs are ordered by image, then by center atom, then as in the
+        neighborlist.
+    """
+    natoms = len(images[0])
+    positions = np.array([image.positions for image in images])
+    cells = np.array([np.array(image.get_cell()) for image in images])
+    entries = [nl[index] for nl in neighborlists for index in range(natoms)]
+    counts = np.array([len(indices) for indices, offsets in entries],
+                      dtype=int)
+    frames, centers = np.divmod(
+        np.repeat(np.arange(len(images) * natoms), counts), natoms)
+    neighbors = np.concatenate(
+        [np.zeros(0, dtype=int)] +
+        [np.asarray(indices, dtype=int) for indices, offsets in entries])
+    offsets = np.concatenate(
+        [np.zeros((0, 3), dtype=int)] +
+        [np.asarray(offsets, dtype=int).reshape(-1, 3)
+         for indices, offsets in entries])
+    vectors = (positions[frames, neighbors] -
+               positions[frames, centers] +
+               np.einsum('pi,pij->pj', offsets, cells[frames]))
+    distances = np.sqrt((vectors ** 2).sum(axis=1))
+    return {'frames': frames,
+            'centers': centers,
+            'neighbors': neighbors,
+            'offsets': offsets,
+            'vectors': vectors,
+            'distances': distances,
+            'counts': counts}
+
+
+def get_half_pairs(pairs):
+    """Selects one of the two entries of each pair of flattened (both-ways)
+    neighborlists, as from stack_neighborlists; that is, the pairs of a half
+    neighborlist. An atom paired with its own periodic image is kept with the
+    offset whose first non-zero component is positive.
+
+    Parameters
+    ----------
+    pairs : dict
+        Flattened neighborlists, as from stack_neighborlists.
+
+    Returns
+    -------
+    numpy array of bool
+        True for the pairs in the half neighborlist.
+    """
+    centers, neighbors = pairs['centers'], pairs['neighbors']
+    offsets = pairs['offsets']
+    first = np.argmax(offsets != 0, axis=1)
+    positive = offsets[np.arange(len(offsets)), first] > 0
+    return (centers < neighbors) | ((centers == neighbors) & positive)
+
+
+def get_triplets(counts):
+    """Enumerates the pairs of neighbors (j, k), j < k, of each center atom
+    of flattened neighborlists, as from stack_neighborlists.
+
+    Parameters
+    ----------
+    counts : numpy array of int
+        Number of neighbors of each center atom; the neighbors of each center
+        are assumed to be contiguous.
+
+    Returns
+    -------
+    j, k : numpy arrays of int
+        Indices into the flattened pair arrays of the two neighbors of each
+        triplet.
+    """
+    starts = np.cumsum(counts) - counts
+    js, ks = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+    for count in np.unique(counts):
+        if count < 2:
+            continue
+        _starts = starts[counts == count][:, np.newaxis]
+        j, k = np.triu_indices(count, 1)
+        js.append((_starts + j).ravel())
+        ks.append((_starts + k).ravel())
+    return np.concatenate(js), np.concatenate(ks)
+
+
+def calculate_fingerprints_batch(images, neighborlists, Gs, cutoff):
+    """Calculates the fingerprints of a stack of images that share the same
+    atomic numbers, such as the frames of a trajectory. Each symmetry function
+    is evaluated at once for all the pairs (G2) or triplets (G4, G5) of the
+    whole stack, so the per-atom overhead of the loops in calculate_G2, etc.,
+    is only paid once per stack. Radial terms are evaluated once per pair of
+    a half neighborlist and added to the fingerprints of both atoms.
+
+    Parameters
+    ----------
+    images : list of objects
+        ASE atoms objects, all with the same atomic numbers.
+    neighborlists : list of lists
+        The neighborlist of each image, as from NeighborlistCalculator.
+    Gs : dict
+        Dictionary of symbols and lists of dictionaries for making symmetry
+        functions, as in Gaussian.
+    cutoff : dict
+        Cutoff function, typically from amp.descriptor.cutoffs. Should be also
+        formatted as a dictionary by todict method, e.g.
+        cutoff=Cosine(6.5).todict()
+
+    Returns
+    -------
+    fingerprints : list of lists
+        For each image, the (symbol, fingerprint) of each atom, as returned by
+        FingerprintCalculator.calculate.
+    """
+    symbols = images[0].get_chemical_symbols()
+    natoms = len(images[0])
+    Rc = cutoff['kwargs']['Rc']
+    geometry = _StackGeometry(images, neighborlists, cutoff)
+
+    values = {}
+    for symbol in set(symbols):
+        values[symbol] = np.zeros((geometry.nentries, len(Gs[symbol])))
+        for count, G in enumerate(Gs[symbol]):
+            if G['type'] == 'G2':
+                p = geometry.get_pairs(symbol, G.get('element'))
+                terms = np.exp(-G['eta'] * p['R2'] / (Rc ** 2.)) * p['fc']
+                # For a weighted G2, the weight of the other atom.
+                centerterms = (terms * _get_weights(G.get('weights'),
+                                                    p['neighbornumbers']))
+                neighborterms = (terms * _get_weights(G.get('weights'),
+                                                      p['centernumbers']))
+                values[symbol][:, count] = np.bincount(
+                    np.concatenate([p['centers'][p['tocenter']],
+                                    p['neighbors'][p['toneighbor']]]),
+                    weights=np.concatenate([centerterms[p['tocenter']],
+                                            neighborterms[p['toneighbor']]]),
+                    minlength=geometry.nentries)
+            elif G['type'] in ['G4', 'G5']:
+                t = geometry.get_triplets(symbol, G.get('elements'),
+                                          G['type'])
+                terms = ((1. + G['gamma'] * t['cos']) ** G['zeta'] *
+                         np.exp(-G['eta'] * t['R2'] / (Rc ** 2.)) * t['fc'] *
+                         _get_weights(G.get('weights'), t['lownumbers'],
+                                      t['highnumbers']))
+                values[symbol][:, count] = np.bincount(
+                    t['centers'], weights=terms,
+                    minlength=geometry.nentries) * 2. ** (1. - G['zeta'])
+            else:
+                raise NotImplementedError('Unknown G type: %s' % G['type'])
+
+    fingerprints = []
+    for frame in range(len(images)):
+        fingerprints.append([(symbol,
+                              values[symbol][frame * natoms + index].tolist())
+                             for index, symbol in enumerate(symbols)])
+    return fingerprints
+
+
+def calculate_fingerprintprimes_batch(images, neighborlists, Gs, cutoff):
+    """Calculates the fingerprint derivatives of a stack of images that share
+    the same atomic numbers, in the same manner as
+    calculate_fingerprints_batch. The derivative of each pair or triplet term
+    with respect to the position of each of its atoms is scattered into the
+    derivatives of the fingerprint of its center atom(s).
+
+    Parameters
+    ----------
+    images : list of objects
+        ASE atoms objects, all with the same atomic numbers.
+    neighborlists : list of lists
+        The neighborlist of each image, as from NeighborlistCalculator.
+    Gs : dict
+        Dictionary of symbols and lists of dictionaries for making symmetry
+        functions, as in Gaussian.
+    cutoff : dict
+        Cutoff function, typically from amp.descriptor.cutoffs. Should be also
+        formatted as a dictionary by todict method, e.g.
+        cutoff=Cosine(6.5).todict()
+
+    Returns
+    -------
+    fingerprintprimes : list of dicts
+        For each image, the fingerprint derivatives as returned by
+        FingerprintPrimeCalculator.calculate.
+    """
+    symbols = images[0].get_chemical_symbols()
+    natoms = len(images[0])
+    Rc = cutoff['kwargs']['Rc']
+    geometry = _StackGeometry(images, neighborlists, cutoff, derivatives=True)
+    nslots = len(geometry.slotcodes)
+
+    # Derivative of the fingerprint of each atom (of a slot) w.r.t. the
+    # position of the atom itself or one of its neighbors.
+    derivatives = np.zeros((nslots, 3, max([len(Gs[symbol])
+                                            for symbol in set(symbols)])))
+
+    def accumulate(count, slots, gradients):
+        for direction in range(3):
+            derivatives[:, direction, count] += np.bincount(
+                slots, weights=gradients[:, direction], minlength=nslots)
+
+    for symbol in set(symbols):
+        for count, G in enumerate(Gs[symbol]):
+            if G['type'] == 'G2':
+                p = geometry.get_pairs(symbol, G.get('element'))
+                dterms = (np.exp(-G['eta'] * p['R2'] / (Rc ** 2.)) *
+                          (-2. * G['eta'] * p['Rij'] * p['fc'] / (Rc ** 2.) +
+                           p['fcprime']))
+                # Gradient of each term w.r.t. the position of the neighbor;
+                # that w.r.t. the center is opposite. For a weighted G2,
+                # each is multiplied by the weight of the other atom.
+                gradient = p['units'] * dterms[:, np.newaxis]
+                centergradient = gradient * _get_weights(
+                    G.get('weights'), p['neighbornumbers'][:, np.newaxis])
+                neighborgradient = gradient * _get_weights(
+                    G.get('weights'), p['centernumbers'][:, np.newaxis])
+                tocenter, toneighbor = p['tocenter'], p['toneighbor']
+                accumulate(count,
+                           np.concatenate([p['selfslots'][tocenter],
+                                           p['pairslots'][tocenter],
+                                           p['neighborselfslots'][toneighbor],
+                                           p['reverseslots'][toneighbor]]),
+                           np.concatenate([-centergradient[tocenter],
+                                           centergradient[tocenter],
+                                           neighborgradient[toneighbor],
+                                           -neighborgradient[toneighbor]]))
+            elif G['type'] in ['G4', 'G5']:
+                t = geometry.get_triplets(symbol, G.get('elements'),
+                                          G['type'])
+                gamma, zeta, eta = G['gamma'], G['zeta'], G['eta']
+                c1 = 1. + gamma * t['cos']
+                exponential = (np.exp(-eta * t['R2'] / (Rc ** 2.)) *
+                               _get_weights(G.get('weights'),
+                                            t['lownumbers'],
+                                            t['highnumbers']))
+                term = c1 ** zeta * exponential
+                dterm_dcos = gamma * zeta * c1 ** (zeta - 1.) * exponential
+                # Gradients w.r.t. the vectors Rij, Rik (and Rjk).
+                dcos = (dterm_dcos * t['fc'])[:, np.newaxis]
+                fc = t['fc'][:, np.newaxis]
+                dRij = (dcos * t['dcos_dRij'] + term[:, np.newaxis] *
+                        (fc * -2. * eta * t['Rij_vector'] / (Rc ** 2.) +
+                         t['dfc_dRij']))
+                dRik = (dcos * t['dcos_dRik'] + term[:, np.newaxis] *
+                        (fc * -2. * eta * t['Rik_vector'] / (Rc ** 2.) +
+                         t['dfc_dRik']))
+                scale = 2. ** (1. - zeta)
+                if G['type'] == 'G4':
+                    dRjk = term[:, np.newaxis] * (
+                        fc * -2. * eta * t['Rjk_vector'] / (Rc ** 2.) +
+                        t['dfc_dRjk'])
+                    gradients = [-dRij - dRik, dRij - dRjk, dRik + dRjk]
+                else:
+                    gradients = [-dRij - dRik, dRij, dRik]
+                accumulate(count,
+                           np.concatenate([t['selfslots'], t['jslots'],
+                                           t['kslots']]),
+                           scale * np.concatenate(gradients))
+            else:
+                raise NotImplementedError('Unknown G type: %s' % G['type'])
+
+    nGs = {symbol: len(Gs[symbol]) for symbol in set(symbols)}
+    fingerprintprimes = [{} for image in images]
+    keyed = np.where(geometry.slotkeyed)[0]
+    flatatoms, selfindices = np.divmod(geometry.slotcodes[keyed], natoms)
+    frames, nindices = np.divmod(flatatoms, natoms)
+    for frame, nindex, selfindex, values in zip(
+            frames.tolist(), nindices.tolist(), selfindices.tolist(),
+            derivatives[keyed].tolist()):
+        nsymbol = symbols[nindex]
+        selfsymbol = symbols[selfindex]
+        for i in range(3):
+            fingerprintprimes[frame][(selfindex, selfsymbol, nindex,
+                                      nsymbol, i)] = values[i][:nGs[nsymbol]]
+    return fingerprintprimes
+
+
+def _get_weights(weights, *numbers):
+    """Returns the product of the weights of the elements of the atomic
+    numbers in each of the arrays numbers, for a weighted symmetry function
+    with the dictionary weights; or one if weights is None (the symmetry
+    function is not weighted). Elements without a weight get zero."""
+    if weights is None:
+        return 1.
+    table = np.zeros(len(chemical_symbols))
+    for element, weight in weights.items():
+        table[atomic_numbers[element]] = weight
+    product = 1.
+    for _ in numbers:
+        product = product * table[_]
+    return product
+
+
+class _StackGeometry:
+    """Pair and triplet quantities of a stack of images, shared by the
+    symmetry functions in calculate_fingerprints_batch and
+    calculate_fingerprintprimes_batch. Subsets of pairs and triplets are
+    selected once per combination of elements and re-used by all symmetry
+    functions of that combination.
+
+    Entries of the stack (atom index in the image plus the image index times
+    the number of atoms) are referred to as 'flat' indices. With derivatives,
+    each combination of an atom and itself or one of its neighbors is given
+    a 'slot', under which the derivative of the fingerprint of the atom with
+    respect to the position of the other is accumulated.
+    """
+
+    def __init__(self, images, neighborlists, cutoff, derivatives=False):
+        self.numbers = images[0].numbers
+        self.natoms = natoms = len(images[0])
+        self.nentries = nentries = len(images) * natoms
+        self.cutoff = dict2cutoff(cutoff)
+        self.derivatives = derivatives
+        self.pairs = pairs = stack_neighborlists(images, neighborlists)
+        self.flatcenters = pairs['frames'] * natoms + pairs['centers']
+        self.flatneighbors = pairs['frames'] * natoms + pairs['neighbors']
+        self._triplets = None
+        self._selections = {}
+
+        if derivatives:
+            selfcodes = (np.arange(nentries) * natoms +
+                         np.arange(nentries) % natoms)
+            paircodes = self.flatcenters * natoms + pairs['neighbors']
+            self.slotcodes, inverse = np.unique(
+                np.concatenate([selfcodes, paircodes]), return_inverse=True)
+            self.selfslots = inverse[:nentries]
+            self.pairslots = inverse[nentries:]
+            # As in FingerprintPrimeCalculator.calculate, only derivatives
+            # w.r.t. neighbors not offset in all three directions are kept.
+            self.slotkeyed = np.zeros(len(self.slotcodes), dtype=bool)
+            self.slotkeyed[self.selfslots] = True
+            self.slotkeyed[
+                self.pairslots[~pairs['offsets'].all(axis=1)]] = True
+
+        # Radial terms are evaluated over a half neighborlist.
+        half = get_half_pairs(pairs)
+        Rij = pairs['distances'][half]
+        self.half = {'centers': self.flatcenters[half],
+                     'neighbors': self.flatneighbors[half],
+                     'centernumbers': self.numbers[pairs['centers'][half]],
+                     'neighbornumbers': self.numbers[pairs['neighbors'][half]],
+                     'R2': Rij ** 2.,
+                     'fc': self.cutoff(Rij)}
+        if derivatives:
+            self.half.update(
+                {'Rij': Rij,
+                 'units': pairs['vectors'][half] / Rij[:, np.newaxis],
+                 'fcprime': self.cutoff.prime(Rij),
+                 'selfslots': self.selfslots[self.flatcenters[half]],
+                 'pairslots': self.pairslots[half],
+                 'neighborselfslots':
+                 self.selfslots[self.flatneighbors[half]],
+                 'reverseslots': np.searchsorted(
+                     self.slotcodes,
+                     self.flatneighbors[half] * natoms +
+                     pairs['centers'][half])})
+
+    def get_pairs(self, symbol, G_element):
+        """Returns the pairs of the half neighborlist between an atom of
+        element symbol and one of element G_element (of any element if
+        G_element is None), with masks 'tocenter' and 'toneighbor' marking
+        whether the center or the neighbor of the pair is of element symbol
+        (both may be)."""
+        selection = ('G2', symbol, G_element)
+        if selection not in self._selections:
+            h = self.half
+            number = atomic_numbers[symbol]
+            if G_element is None:
+                tocenter = h['centernumbers'] == number
+                toneighbor = h['neighbornumbers'] == number
+            else:
+                G_number = atomic_numbers[G_element]
+                tocenter = ((h['centernumbers'] == number) &
+                            (h['neighbornumbers'] == G_number))
+                toneighbor = ((h['neighbornumbers'] == number) &
+                              (h['centernumbers'] == G_number))
+            select = tocenter | toneighbor
+            subset = {key: value[select] for key, value in h.items()}
+            subset['tocenter'] = tocenter[select]
+            subset['toneighbor'] = toneighbor[select]
+            self._selections[selection] = subset
+        return self._selections[selection]
+
+    def get_triplets(self, symbol, G_elements, type):
+        """Returns the triplets centered on atoms of element symbol whose two
+        neighbors are of elements G_elements (of any elements if G_elements
+        is None), for symmetry functions of type G4 or G5."""
+        if G_elements is None:
+            selection = (type, symbol, None)
+        else:
+            selection = (type, symbol) + tuple(sorted([atomic_numbers[el]
+                                                       for el in G_elements]))
+        if selection in self._selections:
+            return self._selections[selection]
+        if self._triplets is None:
+            self._make_triplets()
+        t = self._triplets
+        select = (self.numbers[t['centers'] % self.natoms] ==
+                  atomic_numbers[symbol])
+        if G_elements is not None:
+            select &= ((t['lownumbers'] == selection[2]) &
+                       (t['highnumbers'] == selection[3]))
+        subset = {'centers': t['centers'][select],
+                  'lownumbers': t['lownumbers'][select],
+                  'highnumbers': t['highnumbers'][select],
+                  'cos': t['cos'][select]}
+        if type == 'G4':
+            subset['R2'] = (t['Rij2'] + t['Rik2'] + t['Rjk2'])[select]
+            subset['fc'] = (t['fcRij'] * t['fcRik'] * t['fcRjk'])[select]
+        else:
+            subset['R2'] = (t['Rij2'] + t['Rik2'])[select]
+            subset['fc'] = (t['fcRij'] * t['fcRik'])[select]
+        if self.derivatives:
+            for key in ['Rij_vector', 'Rik_vector', 'Rjk_vector',
+                        'dcos_dRij', 'dcos_dRik', 'selfslots', 'jslots',
+                        'kslots']:
+                subset[key] = t[key][select]
+            # Gradients of the product of cutoff functions w.r.t. the
+            # vectors Rij, Rik and Rjk.
+            fcRij = t['fcRij'][select, np.newaxis]
+            fcRik = t['fcRik'][select, np.newaxis]
+            fcRjk = (t['fcRjk'][select, np.newaxis] if type == 'G4' else
+                     np.ones((select.sum(), 1)))
+            subset['dfc_dRij'] = t['dfc_dRij'][select] * fcRik * fcRjk
+            subset['dfc_dRik'] = t['dfc_dRik'][select] * fcRij * fcRjk
+            if type == 'G4':
+                subset['dfc_dRjk'] = (t['dfc_dRjk'][select] * fcRij *
+                                      fcRik)
+        self._selections[selection] = subset
+        return subset
+
+    def _make_triplets(self):
+        """Makes the quantities of all triplets of the stack."""
+        pairs = self.pairs
+        j, k = get_triplets(pairs['counts'])
+        Rij_vector = pairs['vectors'][j]
+        Rik_vector = pairs['vectors'][k]
+        Rjk_vector = Rik_vector - Rij_vector
+        Rij = pairs['distances'][j]
+        Rik = pairs['distances'][k]
+        Rjk = np.sqrt((Rjk_vector ** 2).sum(axis=1))
+        jnumbers = self.numbers[pairs['neighbors'][j]]
+        knumbers = self.numbers[pairs['neighbors'][k]]
+        cos = (Rij_vector * Rik_vector).sum(axis=1) / Rij / Rik
+        t = self._triplets = {
+            'centers': self.flatcenters[j],
+            'lownumbers': np.minimum(jnumbers, knumbers),
+            'highnumbers': np.maximum(jnumbers, knumbers),
+            'cos': cos,
+            'Rij2': Rij ** 2.,
+            'Rik2': Rik ** 2.,
+            'Rjk2': Rjk ** 2.,
+            'fcRij': self.cutoff(Rij),
+            'fcRik': self.cutoff(Rik),
+            'fcRjk': self.cutoff(Rjk)}
+        if self.derivatives:
+            Rij, Rik, Rjk = [_[:, np.newaxis] for _ in [Rij, Rik, Rjk]]
+            t.update(
+                {'Rij_vector': Rij_vector,
+                 'Rik_vector': Rik_vector,
+                 'Rjk_vector': Rjk_vector,
+                 'dcos_dRij': (Rik_vector / (Rij * Rik) -
+                               cos[:, np.newaxis] * Rij_vector / Rij ** 2.),
+                 'dcos_dRik': (Rij_vector / (Rij * Rik) -
+                               cos[:, np.newaxis] * Rik_vector / Rik ** 2.),
+                 'dfc_dRij': (self.cutoff.prime(Rij) *
+                              Rij_vector / Rij),
+                 'dfc_dRik': (self.cutoff.prime(Rik) *
+                              Rik_vector / Rik),
+                 'dfc_dRjk': (self.cutoff.prime(Rjk) *
+                              Rjk_vector / Rjk),
+                 'selfslots': self.selfslots[self.flatcenters[j]],
+                 'jslots': self.pairslots[j],
+                 'kslots': self.pairslots[k]})
+
+
 def calculate_G2(neighborsymbols,
                  neighborpositions, G_element, eta, cutoff, Ri, fortran):
     """Calculate G2 symmetry function.
@@ -637,18 +1311,14 @@ def calculate_G2(neighborsymbols,
     else:
         Rc = cutoff['kwargs']['Rc']
         cutoff_fxn = dict2cutoff(cutoff)
-        ridge = 0.  # One aspect of a fingerprint :)
-        num_neighbors = len(neighborpositions)   # number of neighboring atoms
-        for count in range(num_neighbors):
-            symbol = neighborsymbols[count]
-            Rj = neighborpositions[count]
-            if symbol == G_element:
-                Rij = np.linalg.norm(Rj - Ri)
-                args_cutoff_fxn = dict(Rij=Rij)
-                if cutoff['name'] == 'Polynomial':
-                    args_cutoff_fxn['gamma'] = cutoff['kwargs']['gamma']
-                ridge += (np.exp(-eta * (Rij ** 2.) / (Rc ** 2.)) *
-                          cutoff_fxn(**args_cutoff_fxn))
+        if len(neighborpositions) == 0:
+            return 0.
+        neighborpositions = np.array(neighborpositions, dtype=float)
+        symbols = np.array(neighborsymbols)
+        Rij = np.linalg.norm(neighborpositions[symbols == G_element] - Ri,
+                             axis=1)
+        ridge = np.sum(np.exp(-eta * (Rij ** 2.) / (Rc ** 2.)) *
+                       cutoff_fxn(Rij))  # One aspect of a fingerprint :)
     return ridge
 
 
@@ -726,35 +1396,18 @@ def calculate_G4(neighborsymbols, neighborpositions,
     else:
         Rc = cutoff['kwargs']['Rc']
         cutoff_fxn = dict2cutoff(cutoff)
-        ridge = 0.
-        counts = range(len(neighborpositions))
-        for j in counts:
-            for k in counts[(j + 1):]:
-                els = sorted([neighborsymbols[j], neighborsymbols[k]])
-                if els != G_elements:
-                    continue
-                Rij_vector = neighborpositions[j] - Ri
-                Rij = np.linalg.norm(Rij_vector)
-                Rik_vector = neighborpositions[k] - Ri
-                Rik = np.linalg.norm(Rik_vector)
-                Rjk_vector = neighborpositions[k] - neighborpositions[j]
-                Rjk = np.linalg.norm(Rjk_vector)
-                cos_theta_ijk = np.dot(Rij_vector, Rik_vector) / Rij / Rik
-                term = (1. + gamma * cos_theta_ijk) ** zeta
-                term *= np.exp(-eta * (Rij ** 2. + Rik ** 2. + Rjk ** 2.) /
-                               (Rc ** 2.))
-                _Rij = dict(Rij=Rij)
-                _Rik = dict(Rij=Rik)
-                _Rjk = dict(Rij=Rjk)
-                if cutoff['name'] == 'Polynomial':
-                    _Rij['gamma'] = cutoff['kwargs']['gamma']
-                    _Rik['gamma'] = cutoff['kwargs']['gamma']
-                    _Rjk['gamma'] = cutoff['kwargs']['gamma']
-                term *= cutoff_fxn(**_Rij)
-                term *= cutoff_fxn(**_Rik)
-                term *= cutoff_fxn(**_Rjk)
-                ridge += term
-        ridge *= 2. ** (1. - zeta)
+        Rij_vectors, Rik_vectors = _get_neighbor_triplets(
+            neighborsymbols, neighborpositions, G_elements, Ri)
+        Rjk_vectors = Rik_vectors - Rij_vectors
+        Rij = np.linalg.norm(Rij_vectors, axis=1)
+        Rik = np.linalg.norm(Rik_vectors, axis=1)
+        Rjk = np.linalg.norm(Rjk_vectors, axis=1)
+        cos_theta_ijk = (Rij_vectors * Rik_vectors).sum(axis=1) / Rij / Rik
+        terms = (1. + gamma * cos_theta_ijk) ** zeta
+        terms *= np.exp(-eta * (Rij ** 2. + Rik ** 2. + Rjk ** 2.) /
+                        (Rc ** 2.))
+        terms *= cutoff_fxn(Rij) * cutoff_fxn(Rik) * cutoff_fxn(Rjk)
+        ridge = np.sum(terms) * 2. ** (1. - zeta)
         return ridge
 
 
@@ -837,36 +1490,78 @@ def calculate_G5(neighborsymbols, neighborpositions,
     else:
         Rc = cutoff['kwargs']['Rc']
         cutoff_fxn = dict2cutoff(cutoff)
-        ridge = 0.
-        counts = range(len(neighborpositions))
-        for j in counts:
-            for k in counts[(j + 1):]:
-                els = sorted([neighborsymbols[j], neighborsymbols[k]])
-                if els != G_elements:
-                    continue
-                Rij_vector = neighborpositions[j] - Ri
-                Rij = np.linalg.norm(Rij_vector)
-                Rik_vector = neighborpositions[k] - Ri
-                Rik = np.linalg.norm(Rik_vector)
-                cos_theta_ijk = np.dot(Rij_vector, Rik_vector) / Rij / Rik
-                term = (1. + gamma * cos_theta_ijk) ** zeta
-                term *= np.exp(-eta * (Rij ** 2. + Rik ** 2.) /
-                               (Rc ** 2.))
-                _Rij = dict(Rij=Rij)
-                _Rik = dict(Rij=Rik)
+        Rij_vectors, Rik_vectors = _get_neighbor_triplets(
+            neighborsymbols, neighborpositions, G_elements, Ri)
+        Rij = np.linalg.norm(Rij_vectors, axis=1)
+        Rik = np.linalg.norm(Rik_vectors, axis=1)
+        cos_theta_ijk = (Rij_vectors * Rik_vectors).sum(axis=1) / Rij / Rik
+        terms = (1. + gamma * cos_theta_ijk) ** zeta
+        terms *= np.exp(-eta * (Rij ** 2. + Rik ** 2.) /
+                        (Rc ** 2.))
+        terms *= cutoff_fxn(Rij) * cutoff_fxn(Rik)
+        ridge = np.sum(terms) * 2. ** (1. - zeta)
+        return ridge
 
-                if cutoff['name'] == 'Polynomial':
-                    _Rij['gamma'] = cutoff['kwargs']['gamma']
-                    _Rik['gamma'] = cutoff['kwargs']['gamma']
 
-                term *= cutoff_fxn(**_Rij)
-                term *= cutoff_fxn(**_Rik)
-                ridge += term
-        ridge *= 2. ** (1. - zeta)
-        return ridge
+def _get_neighbor_triplets(neighborsymbols, neighborpositions, G_elements,
+                           Ri):
+    """Returns the vectors Rij and Rik from the central atom at Ri to all
+    pairs (j, k) of neighbors with j < k whose sorted symbols equal
+    G_elements."""
+    if len(neighborpositions) < 2:
+        return np.zeros((0, 3)), np.zeros((0, 3))
+    neighborpositions = np.array(neighborpositions, dtype=float)
+    symbols = np.array(neighborsymbols)
+    j, k = np.triu_indices(len(symbols), 1)
+    lows = np.where(symbols[j] <= symbols[k], symbols[j], symbols[k])
+    highs = np.where(symbols[j] <= symbols[k], symbols[k], symbols[j])
+    keep = (lows == G_elements[0]) & (highs == G_elements[1])
+    return (neighborpositions[j[keep]] - Ri,
+            neighborpositions[k[keep]] - Ri)
+
+
+def expand_weighted_symmetry_function(G, neighborsymbols):
+    """Expresses a symmetry function as a sum of element-resolved ones, for
+    the per-atom routines (calculate_G2, calculate_G2_prime, etc.). A
+    weighted G2 (with "weights" in place of "element") is the sum over the
+    elements of the neighbors of their weight times the G2 of that element;
+    a weighted G4 or G5 is the sum over pairs of elements of the product of
+    their weights times the G4 or G5 of that pair.
 
+    Parameters
+    ----------
+    G : dict
+        Symmetry function, as in Gaussian.
+    neighborsymbols : list of str
+        List of symbols of neighboring atoms.
+
+    Returns
+    -------
+    terms : list of tuples
+        (weight, G) of each element-resolved symmetry function; just
+        (1., G) if G is not weighted.
+    """
+    if 'weights' not in G:
+        return [(1., G)]
+    weights = G['weights']
+    elements = sorted(set(neighborsymbols) & set(weights))
+    _G = {key: value for key, value in G.items() if key != 'weights'}
+    terms = []
+    if G['type'] == 'G2':
+        for element in elements:
+            terms.append((weights[element], dict(_G, element=element)))
+    elif G['type'] in ['G4', 'G5']:
+        for i1, el1 in enumerate(elements):
+            for el2 in elements[i1:]:
+                terms.append((weights[el1] * weights[el2],
+                              dict(_G, elements=[el1, el2])))
+    else:
+        raise NotImplementedError('Unknown G type: %s' % G['type'])
+    return terms
 
-def make_symmetry_functions(elements, type, etas, zetas=None, gammas=None):
+
+def make_symmetry_functions(elements, type, etas, zetas=None, gammas=None,
+                            weights=None):
     """Helper function to create Gaussian symmetry functions.
     Returns a list of dictionaries with symmetry function parameters
     in the format expected by the Gaussian class.
@@ -884,6 +1579,11 @@ def make_symmetry_functions(elements, type, etas, zetas=None, gammas=None):
         zeta values to use in G4, and G5 fingerprints
     gammas : list of floats
         gamma values to use in G4, and G5 fingerprints
+    weights : dict
+        If given, weighted symmetry functions are made instead, with these
+        weights of elements; that is, one symmetry function per set of
+        parameters rather than one per element (G2) or pair of elements (G4,
+        G5).
 
     Returns
     -------
@@ -891,6 +1591,15 @@ def make_symmetry_functions(elements, type, etas, zetas=None, gammas=None):
         A list, each item in the list contains a dictionary of fingerprint
         parameters.
     """
+    if weights is not None:
+        G = [{'type': type, 'weights': dict(weights), 'eta': eta}
+             for eta in etas]
+        if type in ['G4', 'G5']:
+            G = [dict(_G, gamma=gamma, zeta=zeta)
+                 for _G in G for zeta in zetas for gamma in gammas]
+        elif type != 'G2':
+            raise NotImplementedError('Unknown type: {}.'.format(type))
+        return G
     if type == 'G2':
         G = [{'type': 'G2', 'element': element, 'eta': eta}
              for eta in etas
@@ -927,7 +1636,7 @@ def make_symmetry_functions(elements, type, etas, zetas=None, gammas=None):
     raise NotImplementedError('Unknown type: {}.'.format(type))
 
 
-def make_default_symmetry_functions(elements):
+def make_default_symmetry_functions(elements, weighted=False):
     """Makes default set of G2 and G4 symmetry functions.
 
 
@@ -935,21 +1644,30 @@ def make_default_symmetry_functions(elements):
     ----------
     elements : list of str
         List of the elements, as in: ["C", "O", "H", "Cu"].
+    weighted : bool
+        If True, makes weighted symmetry functions, with the atomic numbers
+        of the elements as weights; there are then as many as for a single
+        element, however many elements there are.
 
     Returns
     -------
     G : dict of lists
         The generated symmetry function parameters.
     """
+    weights = None
+    if weighted:
+        weights = {element: float(atomic_numbers[element])
+                   for element in elements}
     G = {}
     for element0 in elements:
         # Radial symmetry functions.
         etas = np.logspace(np.log10(0.05), np.log10(5.), num=4)
-        _G = make_symmetry_functions(type='G2', etas=etas, elements=elements)
+        _G = make_symmetry_functions(type='G2', etas=etas, elements=elements,
+                                     weights=weights)
         # Angular symmetry functions.
         _G += make_symmetry_functions(type='G4', etas=[0.005],
                                       zetas=[1., 4.], gammas=[+1., -1.],
-                                      elements=elements)
+                                      elements=elements, weights=weights)
         G[element0] = _G
     return G
 
@@ -1195,8 +1913,6 @@ def calculate_G2_prime(neighborindices, neighborsymbols, neighborpositions,
                 if dRijdRml != 0:
                     Rij = np.linalg.norm(Rj - Ri)
                     args_cutoff_fxn = dict(Rij=Rij)
-                    if cutoff['name'] == 'Polynomial':
-                        args_cutoff_fxn['gamma'] = cutoff['kwargs']['gamma']
                     term1 = (-2. * eta * Rij * cutoff_fxn(**args_cutoff_fxn) /
                              (Rc ** 2.) +
                              cutoff_fxn.prime(**args_cutoff_fxn))
@@ -1313,10 +2029,6 @@ def calculate_G4_prime(neighborindices, neighborsymbols, neighborpositions,
                 _Rij = dict(Rij=Rij)
                 _Rik = dict(Rij=Rik)
                 _Rjk = dict(Rij=Rjk)
-                if cutoff['name'] == 'Polynomial':
-                    _Rij['gamma'] = cutoff['kwargs']['gamma']
-                    _Rik['gamma'] = cutoff['kwargs']['gamma']
-                    _Rjk['gamma'] = cutoff['kwargs']['gamma']
 
                 fcRij = cutoff_fxn(**_Rij)
                 fcRik = cutoff_fxn(**_Rik)
@@ -1465,9 +2177,6 @@ def calculate_G5_prime(neighborindices, neighborsymbols, neighborpositions,
 
                 _Rij = dict(Rij=Rij)
                 _Rik = dict(Rij=Rik)
-                if cutoff['name'] == 'Polynomial':
-                    _Rij['gamma'] = cutoff['kwargs']['gamma']
-                    _Rik['gamma'] = cutoff['kwargs']['gamma']
 
                 fcRij = cutoff_fxn(**_Rij)
                 fcRik = cutoff_fxn(**_Rik)
@@ -1553,27 +2262,7 @@ if __name__ == "__main__":
     sys.stderr.write('purpose: %s \n' % purpose)
     sys.stderr.flush()
 
-    if purpose == 'calculate_neighborlists':
-        # Request variables.
-        socket.send_pyobj(msg('<request>', 'cutoff'))
-        cutoff = socket.recv_pyobj()
-        socket.send_pyobj(msg('<request>', 'images'))
-        images = socket.recv_pyobj()
-        # sys.stderr.write(str(images)) # Just to see if they are there.
-
-        # Perform the calculations.
-        calc = NeighborlistCalculator(cutoff=cutoff)
-        neighborlist = {}
-        # for key in images.iterkeys():
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            neighborlist[key] = calc.calculate(image, key)
-
-        # Send the results.
-        socket.send_pyobj(msg('<result>', neighborlist))
-        socket.recv_string()  # Needed to complete REQ/REP.
-
-    elif purpose == 'calculate_fingerprints':
+    if purpose == 'calculate_fingerprints':
         # Request variables.
         socket.send_pyobj(msg('<request>', 'cutoff'))
         cutoff = socket.recv_pyobj()
@@ -1581,18 +2270,14 @@ if __name__ == "__main__":
         Gs = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'neighborlist'))
         neighborlist = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'batchsize'))
+        batchsize = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'images'))
         images = socket.recv_pyobj()
 
         calc = FingerprintCalculator(neighborlist, Gs, cutoff,
-                                     fortran)
-        result = {}
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            result[key] = calc.calculate(image, key)
-            if len(images) % 100 == 0:
-                socket.send_pyobj(msg('<info>', len(images)))
-                socket.recv_string()  # Needed to complete REQ/REP.
+                                     fortran, batchsize=batchsize)
+        result = calc.calculate_batch(images)
 
         # Send the results.
         socket.send_pyobj(msg('<result>', result))
@@ -1606,18 +2291,14 @@ if __name__ == "__main__":
         Gs = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'neighborlist'))
         neighborlist = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'batchsize'))
+        batchsize = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'images'))
         images = socket.recv_pyobj()
 
         calc = FingerprintPrimeCalculator(neighborlist, Gs, cutoff,
-                                          fortran)
-        result = {}
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            result[key] = calc.calculate(image, key)
-            if len(images) % 100 == 0:
-                socket.send_pyobj(msg('<info>', len(images)))
-                socket.recv_string()  # Needed to complete REQ/REP.
+                                          fortran, batchsize=batchsize)
+        result = calc.calculate_batch(images)
 
         # Send the results.
         socket.send_pyobj(msg('<result>', result))
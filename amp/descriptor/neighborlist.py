@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+"""
+Neighborlists shared by all descriptors.
+
+Neighborlists depend only on the image and the cutoff radius, so they are
+calculated and stored here once, in a database keyed by the image hash and
+the cutoff radius, and consumed by any descriptor that uses the same
+neighborlist database (see the nldblabel keyword of the descriptors). A
+neighborlist requested for a given cutoff radius is served from one
+already stored for a larger radius of the same image when possible, by
+dropping the neighbors beyond the requested radius.
+
+"""
+
+import numpy as np
+
+from ase.calculators.calculator import Parameters
+from ..utilities import Data, FileDatabase, Logger, importer
+NeighborList = importer('NeighborList')
+
+
+def make_key(hash, cutoff):
+    """Database key of the neighborlist of the image with the given hash,
+    calculated for the given cutoff radius."""
+    return '%s-%r' % (hash, float(cutoff))
+
+
+def parse_key(key):
+    """Returns the image hash and cutoff radius of a database key made with
+    make_key, or None if key is not of this form (e.g., the neighborlists
+    stored by older versions, which were keyed by the hash alone)."""
+    hash, _, cutoff = key.rpartition('-')
+    try:
+        return hash, float(cutoff)
+    except ValueError:
+        return None
+
+
+def filter_neighborlist(image, neighborlist, cutoff):
+    """Restricts a neighborlist to the neighbors within a cutoff radius.
+
+    Parameters
+    ----------
+    image : object
+        ASE atoms object.
+    neighborlist : list of tuples
+        (indices, offsets) of the neighbors of each atom of image, as from
+        NeighborlistCalculator, calculated for a radius of at least cutoff.
+    cutoff : float
+        Radius above which neighbors are dropped.
+
+    Returns
+    -------
+    list of tuples
+        (indices, offsets) of the neighbors within cutoff of each atom.
+    """
+    positions = image.positions
+    cell = image.get_cell()
+    neighbors = []
+    for index, (indices, offsets) in enumerate(neighborlist):
+        displacements = (positions[indices] + np.dot(offsets, cell) -
+                         positions[index])
+        inside = (displacements ** 2).sum(axis=1) < cutoff ** 2
+        neighbors.append((indices[inside], offsets[inside]))
+    return neighbors
+
+
+def flatten_neighborlists(images, neighborlists):
+    """Flattens the neighborlists of several images, which may have
+    different atoms, into arrays with one entry per (center atom, neighbor)
+    pair. The atoms of all images are numbered consecutively, in the order
+    of images.
+
+    Parameters
+    ----------
+    images : list of objects
+        ASE atoms objects.
+    neighborlists : list of lists
+        The neighborlist of each image, as from NeighborlistCalculator.
+
+    Returns
+    -------
+    pairs : dict
+        'centers' and 'neighbors' are the consecutive numbers of the center
+        atom and of the neighbor atom of each pair; 'offsets' are the cell
+        offsets of the neighbors; 'vectors' and 'distances' are from the
+        center to the (periodic image of the) neighbor; 'counts' is the
+        number of neighbors of each atom. Pairs are ordered by center
+        atom, then as in the neighborlist.
+    """
+    starts = np.cumsum([0] + [len(image) for image in images])
+    positions = np.concatenate([np.zeros((0, 3))] +
+                               [image.positions for image in images])
+    counts = []
+    neighbors = [np.zeros(0, dtype=int)]
+    alloffsets = [np.zeros((0, 3), dtype=int)]
+    vectors = [np.zeros((0, 3))]
+    for image, nl, start in zip(images, neighborlists, starts):
+        cell = np.array(image.get_cell())
+        for index, (indices, offsets) in enumerate(nl):
+            indices = np.asarray(indices, dtype=int)
+            offsets = np.reshape(offsets, (-1, 3)).astype(int)
+            counts.append(len(indices))
+            neighbors.append(indices + start)
+            alloffsets.append(offsets)
+            vectors.append(np.dot(offsets, cell) +
+                           positions[indices + start] -
+                           positions[index + start])
+    counts = np.array(counts, dtype=int)
+    vectors = np.concatenate(vectors)
+    return {'centers': np.repeat(np.arange(len(counts)), counts),
+            'neighbors': np.concatenate(neighbors),
+            'offsets': np.concatenate(alloffsets),
+            'vectors': vectors,
+            'distances': np.sqrt((vectors ** 2).sum(axis=1)),
+            'counts': counts}
+
+
+def sum_over_neighbors(values, counts):
+    """Sums values, whose first axis runs over the pairs of
+    flatten_neighborlists, over the neighbors of each atom.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values of each pair, along the first axis.
+    counts : numpy.ndarray
+        Number of neighbors of each atom.
+
+    Returns
+    -------
+    numpy.ndarray
+        The sums for each atom, along the first axis; zero for atoms without
+        neighbors.
+    """
+    sums = np.zeros((len(counts),) + values.shape[1:], dtype=values.dtype)
+    present = counts > 0
+    if present.any():
+        starts = np.cumsum(counts) - counts
+        sums[present] = np.add.reduceat(values, starts[present], axis=0)
+    return sums
+
+
+def get_pair_weights(Gs, symbols, centers, neighbors):
+    """Looks up the weight of the neighbor of each pair of
+    flatten_neighborlists, as Gs[center symbol][neighbor symbol]; this is the
+    form of the element weights of the Zernike and Bispectrum descriptors.
+
+    Parameters
+    ----------
+    Gs : dict of dicts
+        Weight of each neighbor element, for each center element.
+    symbols : list of str
+        Chemical symbols of the consecutively numbered atoms.
+    centers, neighbors : numpy.ndarray
+        Numbers of the center atom and of the neighbor atom of each pair.
+
+    Returns
+    -------
+    numpy.ndarray
+        The weight of each pair.
+    """
+    elements, numbers = np.unique(symbols, return_inverse=True)
+    table = np.zeros((len(elements), len(elements)))
+    codes = numbers[centers] * len(elements) + numbers[neighbors]
+    for code in np.unique(codes):
+        center, neighbor = divmod(code, len(elements))
+        table[center, neighbor] = Gs[elements[center]][elements[neighbor]]
+    return table[numbers[centers], numbers[neighbors]]
+
+
+class NeighborlistCalculator:
+    """For integration with .utilities.Data
+
+    For each image fed to calculate, a list of neighbors with offset distances
+    is returned.
+
+    Parameters
+    ----------
+    cutoff : float
+        Radius above which neighbor interactions are ignored.
+    skin : float
+        If non-zero, the underlying ASE neighborlist is built out to
+        cutoff + skin and kept between calls; it is only rebuilt once an atom
+        has moved by more than skin / 2 since the last build (or the cell,
+        periodicity or number of atoms changes). The returned neighbors are
+        filtered to the cutoff, and are the same as with skin=0.
+    """
+    def __init__(self, cutoff, skin=0.):
+        self.globals = Parameters({'cutoff': cutoff})
+        self.keyed = Parameters()
+        self.parallel_command = 'calculate_neighborlists'
+        self.skin = skin
+        self.verletlist = None  # Persistent list used if skin is non-zero.
+
+    def calculate(self, image, key):
+        """For integration with .utilities.Data
+
+        For each image fed to calculate, a list of neighbors with offset
+        distances is returned.
+
+        Parameters
+        ----------
+        image : object
+            ASE atoms object.
+        key : str
+            key of the image after being hashed.
+        """
+        cutoff = self.globals.cutoff
+        if self.skin:
+            return self.get_skin_neighbors(image)
+        n = NeighborList(cutoffs=[cutoff / 2.] * len(image),
+                         self_interaction=False,
+                         bothways=True,
+                         skin=0.)
+        n.update(image)
+        return [n.get_neighbors(index) for index in range(len(image))]
+
+    def get_skin_neighbors(self, image):
+        """Returns the neighbors of each atom in image from the persistent
+        (Verlet) neighborlist, updating it only if necessary.
+
+        Parameters
+        ----------
+        image : object
+            ASE atoms object.
+
+        Returns
+        -------
+        list of tuples
+            (indices, offsets) of the neighbors within the cutoff of each
+            atom, in the same form as given by ASE's NeighborList.
+        """
+        cutoff = self.globals.cutoff
+        if (self.verletlist is None or
+                len(self.verletlist.nl.cutoffs) != len(image)):
+            # ASE pads each atom's radius by its skin, so each pair is
+            # padded by twice this value.
+            self.verletlist = NeighborList(cutoffs=[cutoff / 2.] * len(image),
+                                           self_interaction=False,
+                                           bothways=True,
+                                           skin=self.skin / 2.)
+        self.verletlist.update(image)
+        return filter_neighborlist(
+            image, [self.verletlist.get_neighbors(index)
+                    for index in range(len(image))], cutoff)
+
+
+class SharedNeighborlists(Data):
+    """Neighborlists of one cutoff radius, stored in the database shared by
+    all descriptors with the same dblabel.
+
+    Behaves like the .utilities.Data container of a NeighborlistCalculator,
+    keyed by image hash, so it can be handed to fingerprint calculators as
+    their neighborlist. The database itself is keyed by image hash and
+    cutoff radius (see make_key). When calculate_items meets an image with no
+    neighborlist stored for this cutoff, but one stored for a larger cutoff,
+    the larger one is filtered down and stored for this cutoff instead of
+    being recalculated.
+
+    Parameters
+    ----------
+    dblabel : str
+        Prefix of the database, which is '<dblabel>-neighborlists.ampdb'.
+    cutoff : float
+        Radius above which neighbor interactions are ignored.
+    skin : float
+        Verlet skin of the NeighborlistCalculator; see there.
+    db : object
+        Database class, as for .utilities.Data.
+    """
+
+    def __init__(self, dblabel, cutoff, skin=0., db=FileDatabase):
+        Data.__init__(self, filename='%s-neighborlists' % dblabel, db=db,
+                      calculator=NeighborlistCalculator(cutoff=cutoff,
+                                                        skin=skin))
+        self.cutoff = float(cutoff)
+
+    def calculate_items(self, images, parallel, log=None):
+        """Makes the neighborlists of the specified images available,
+        filtering them from those of larger cutoffs already in the database
+        when possible and calculating the others.
+
+        images is a dictionary keyed by image hash.
+        """
+        if log is None:
+            log = Logger(None)
+        self.close()
+        d = self.db.open(self.filename, 'c')
+        stored = {}
+        for key in d.keys():
+            parsed = parse_key(key)
+            if parsed is not None:
+                stored.setdefault(parsed[0], []).append(parsed[1])
+        needed = {}
+        filtered = {}
+        for hash, image in images.items():
+            larger = [cutoff for cutoff in stored.get(hash, [])
+                      if cutoff > self.cutoff]
+            if self.cutoff in stored.get(hash, []) or len(larger) == 0:
+                needed[make_key(hash, self.cutoff)] = image
+                continue
+            filtered[make_key(hash, self.cutoff)] = filter_neighborlist(
+                image, d[make_key(hash, min(larger))], self.cutoff)
+        d.update(filtered)
+        d.close()
+        if len(filtered) > 0:
+            log(' %i neighborlists filtered from larger cutoffs.' %
+                len(filtered))
+        Data.calculate_items(self, needed, parallel=parallel, log=log)
+
+    def __getitem__(self, key):
+        return Data.__getitem__(self, make_key(key, self.cutoff))
+
+
+if __name__ == "__main__":
+    """Directly calling this module; apparently from another node.
+    Calls should come as
+
+    python -m amp.descriptor.neighborlist id hostname:port
+
+    This session will then start a zmq session with that socket, labeling
+    itself with id. Instructions on what to do will come from the socket.
+    """
+    import sys
+    import tempfile
+    import zmq
+    from ..utilities import MessageDictionary
+
+    hostsocket = sys.argv[-1]
+    proc_id = sys.argv[-2]
+    msg = MessageDictionary(proc_id)
+
+    # Send standard lines to stdout signaling process started and where
+    # error is directed. This should be caught by pxssh. (This could
+    # alternatively be done by zmq, but this works.)
+    print('<amp-connect>')  # Signal that program started.
+    sys.stderr = tempfile.NamedTemporaryFile(mode='w', delete=False,
+                                             suffix='.stderr')
+    print('Log and error written to %s<stderr>' % sys.stderr.name)
+
+    # Establish client session via zmq; find purpose.
+    context = zmq.Context()
+    socket = context.socket(zmq.REQ)
+    socket.connect('tcp://%s' % hostsocket)
+    socket.send_pyobj(msg('<purpose>'))
+    purpose = socket.recv_pyobj()
+
+    if purpose == 'calculate_neighborlists':
+        # Request variables.
+        socket.send_pyobj(msg('<request>', 'cutoff'))
+        cutoff = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'images'))
+        images = socket.recv_pyobj()
+
+        # Perform the calculations.
+        calc = NeighborlistCalculator(cutoff=cutoff)
+        neighborlist = {}
+        while len(images) > 0:
+            key, image = images.popitem()  # Reduce memory.
+            neighborlist[key] = calc.calculate(image, key)
+
+        # Send the results.
+        socket.send_pyobj(msg('<result>', neighborlist))
+        socket.recv_string()  # Needed to complete REQ/REP.
+
+    else:
+        socket.close()  # May be needed in python3 / ZMQ.
+        raise NotImplementedError('purpose %s unknown.' % purpose)
+    socket.close()  # May be needed in python3 / ZMQ.
@@ -1,3 +1,4 @@
+import math
 import numpy as np
 from numpy import sqrt
 
@@ -5,11 +6,11 @@ from numba import jit
 
 from ase.data import atomic_numbers
 from ase.calculators.calculator import Parameters
-from scipy.special import sph_harm
 
-from ..utilities import Data, Logger, importer
-from .cutoffs import Cosine, Polynomial, dict2cutoff
-NeighborList = importer('NeighborList')
+from ..utilities import Data, Logger, summarize_fingerprints
+from .cutoffs import Cosine, dict2cutoff
+from .neighborlist import (SharedNeighborlists, flatten_neighborlists,
+                           sum_over_neighbors, get_pair_weights)
 try:
     from .. import fmodules
 except ImportError:
@@ -54,6 +55,12 @@ class Zernike(object):
         location can be shared between calculator instances to avoid
         re-calculating redundant information. If not supplied, just uses the
         value from label.
+    nldblabel : str
+        Optional separate prefix/location for the neighborlist database only.
+        Neighborlists are stored by image and cutoff radius, so this location
+        can be shared between descriptors of any kind and cutoff; those of a
+        smaller cutoff are then filtered from those of a larger one. If not
+        supplied, just uses dblabel.
     elements : list
         List of allowed elements present in the system. If not provided, will
         be found automatically.
@@ -62,7 +69,16 @@ class Zernike(object):
     mode : str
         Can be either 'atom-centered' or 'image-centered'.
     fortran : bool
-        If True, will use fortran modules, if False, will not.
+        Kept for compatibility. Fingerprints and their derivatives are
+        always evaluated with numpy arrays over all neighbors and all
+        (n, l, m), which is faster than the fortran routines called once per
+        neighbor.
+    batchsize : int
+        Number of images whose fingerprints are evaluated together, as arrays
+        over the neighbors of all of their atoms. If None, images are
+        fingerprinted one at a time (still as arrays over all of their
+        atoms). Only affects speed and memory, and so is not stored with the
+        parameters.
 
     Raises
     ------
@@ -77,7 +93,9 @@ class Zernike(object):
                  elements=None,
                  version='2016.02',
                  mode='atom-centered',
-                 fortran=True):
+                 fortran=True,
+                 batchsize=None,
+                 nldblabel=None):
 
         # Check of the version of descriptor, particularly if restarting.
         compatibleversions = [
@@ -123,7 +141,9 @@ class Zernike(object):
         p.elements = elements
 
         self.dblabel = dblabel
+        self.nldblabel = nldblabel
         self.fortran = fortran
+        self.batchsize = batchsize
         self.parent = None  # Can hold a reference to main Amp instance.
 
     def tostring(self):
@@ -218,9 +238,9 @@ class Zernike(object):
 
         log('Calculating neighborlists...', tic='nl')
         if not hasattr(self, 'neighborlist'):
-            calc = NeighborlistCalculator(cutoff=p.cutoff['kwargs']['Rc'])
-            self.neighborlist = Data(
-                filename='%s-neighborlists' % self.dblabel, calculator=calc)
+            self.neighborlist = SharedNeighborlists(
+                dblabel=self.nldblabel or self.dblabel,
+                cutoff=p.cutoff['kwargs']['Rc'])
         self.neighborlist.calculate_items(images, parallel=parallel, log=log)
         log('...neighborlists calculated.', toc='nl')
 
@@ -231,9 +251,11 @@ class Zernike(object):
                 Gs=p.Gs,
                 nmax=p.nmax,
                 cutoff=p.cutoff,
-                fortran=self.fortran)
+                fortran=self.fortran,
+                batchsize=self.batchsize)
             self.fingerprints = Data(
-                filename='%s-fingerprints' % self.dblabel, calculator=calc)
+                filename='%s-fingerprints' % self.dblabel, calculator=calc,
+                summarize=summarize_fingerprints)
         self.fingerprints.calculate_items(images, parallel=parallel, log=log)
         log('...fingerprints calculated.', toc='fp')
 
@@ -259,54 +281,20 @@ class Zernike(object):
 # Calculators #################################################################
 
 
-# Neighborlist Calculator
-class NeighborlistCalculator:
+class FingerprintCalculator:
     """For integration with .utilities.Data
 
-    For each image fed to calculate, a list of neighbors with offset
-    distances is returned.
-
     Parameters
     ----------
-    cutoff : object or float
-        Cutoff function, typically from amp.descriptor.cutoffs.  Can be also
-        fed as a float representing the radius above which neighbor
-        interactions are ignored; in this case a cosine cutoff function will be
-        employed.  Default is a 6.5-Angstrom cosine cutoff.
+    batchsize : int
+        Maximum number of images fingerprinted together by calculate_batch;
+        if None, one image at a time.
     """
 
-    def __init__(self, cutoff):
-        self.globals = Parameters({'cutoff': cutoff})
-        self.keyed = Parameters()
-        self.parallel_command = 'calculate_neighborlists'
-
-    def calculate(self, image, key):
-        """For integration with .utilities.Data
-        For each image fed to calculate, a list of neighbors with offset
-        distances is returned.
-
-        Parameters
-        ----------
-        image : object
-            ASE atoms object.
-        key : str
-            Key of the image after being hashed.
-        """
-        cutoff = self.globals.cutoff
-        n = NeighborList(
-            cutoffs=[cutoff / 2.] * len(image),
-            self_interaction=False,
-            bothways=True,
-            skin=0.)
-        n.update(image)
-        return [n.get_neighbors(index) for index in range(len(image))]
-
-
-class FingerprintCalculator:
-    """For integration with .utilities.Data"""
-
-    def __init__(self, neighborlist, Gs, nmax, cutoff, fortran):
-        self.globals = Parameters({'cutoff': cutoff, 'Gs': Gs, 'nmax': nmax})
+    def __init__(self, neighborlist, Gs, nmax, cutoff, fortran,
+                 batchsize=None):
+        self.globals = Parameters({'cutoff': cutoff, 'Gs': Gs, 'nmax': nmax,
+                                   'batchsize': batchsize})
         self.keyed = Parameters({'neighborlist': neighborlist})
         self.parallel_command = 'calculate_fingerprints'
         self.fortran = fortran
@@ -321,6 +309,8 @@ class FingerprintCalculator:
                 from scipy.special import factorial as fac
 
         self.factorial = [fac(0.5 * _) for _ in range(4 * nmax + 3)]
+        self.nls, self.radialcoefficients = \
+            get_radial_coefficients(nmax, self.factorial)
 
     def calculate(self, image, key):
         """Makes a list of fingerprints, one per atom, for the fed image.
@@ -349,6 +339,84 @@ class FingerprintCalculator:
 
         return fingerprints
 
+    def calculate_batch(self, images):
+        """Makes the fingerprints of many images at once; used by
+        .utilities.Data in place of calculate. The neighbors of all atoms of
+        up to batchsize images are flattened into one set of pairs, so that
+        the basis functions are evaluated in a single pass, and summed over
+        the neighbors of each atom.
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of images; the key is the hash of each image and each
+            value is an ASE atoms object.
+
+        Returns
+        -------
+        fingerprints : dict
+            The fingerprints of each image, in the form returned by
+            calculate, with the same keys as images.
+        """
+        keys = list(images.keys())
+        batchsize = self.globals.batchsize or 1
+        results = {}
+        for start in range(0, len(keys), batchsize):
+            batch = keys[start:start + batchsize]
+            results.update(zip(batch, self.get_fingerprints(
+                [images[key] for key in batch],
+                [self.keyed.neighborlist[key] for key in batch])))
+        return results
+
+    def get_fingerprints(self, images, neighborlists):
+        """Returns the fingerprints of all atoms of several images, as
+        arrays over all of their (center atom, neighbor) pairs.
+
+        Parameters
+        ----------
+        images : list of objects
+            ASE atoms objects.
+        neighborlists : list of lists
+            The neighborlist of each image.
+
+        Returns
+        -------
+        list of lists
+            The fingerprints of each image, in the form returned by
+            calculate.
+        """
+        Rc = self.cutoff['kwargs']['Rc']
+        cutoff_fxn = dict2cutoff(self.cutoff)
+        pairs = flatten_neighborlists(images, neighborlists)
+        symbols = [symbol for image in images
+                   for symbol in image.get_chemical_symbols()]
+        weights = get_pair_weights(self.globals.Gs, symbols,
+                                   pairs['centers'], pairs['neighbors'])
+        weights *= cutoff_fxn(pairs['distances'])
+
+        vectors = pairs['vectors'] / Rc
+        rho2 = (pairs['distances'] / Rc) ** 2.
+        powers = rho2[np.newaxis, :] ** \
+            np.arange(self.radialcoefficients.shape[1])[:, np.newaxis]
+        Q = np.dot(self.radialcoefficients, powers) * weights
+        S = calculate_solid_harmonics(vectors, self.globals.nmax)
+        # c_nlm of each atom, from the terms of its pairs.
+        c_nlm = sum_over_neighbors(
+            np.einsum('ij,imj->jim', Q, S[self.nls[:, 1]]), pairs['counts'])
+        mweights = np.full(self.globals.nmax + 1, 2.)
+        mweights[0] = 1.
+        fingerprints = np.dot(np.abs(c_nlm) ** 2., mweights)
+
+        results = []
+        start = 0
+        for image in images:
+            stop = start + len(image)
+            results.append([(symbol, list(fingerprint)) for symbol, fingerprint
+                            in zip(symbols[start:stop],
+                                   fingerprints[start:stop])])
+            start = stop
+        return results
+
     def get_fingerprint(self, index, symbol, n_symbols, Rs):
         """Returns the fingerprint of symmetry function values for atom
         specified by its index and symbol.
@@ -376,90 +444,28 @@ class FingerprintCalculator:
         home = self.atoms[index].position
         cutoff = self.cutoff
         Rc = cutoff['kwargs']['Rc']
-
-        if cutoff['name'] == 'Cosine':
-            cutoff_fxn = Cosine(Rc)
-        elif cutoff['name'] == 'Polynomial':
-            p_gamma = cutoff['kwargs']['gamma']
-            cutoff_fxn = Polynomial(Rc, gamma=p_gamma)
-
-        fingerprint = []
-        for n in range(self.globals.nmax + 1):
-            for l in range(n + 1):
-                if (n - l) % 2 == 0:
-                    norm = 0.
-                    for m in range(l + 1):
-                        c_nlm = 0.
-                        for n_symbol, neighbor in zip(n_symbols, Rs):
-                            x = (neighbor[0] - home[0]) / Rc
-                            y = (neighbor[1] - home[1]) / Rc
-                            z = (neighbor[2] - home[2]) / Rc
-                            rho = np.linalg.norm([x, y, z])
-
-                            if self.fortran:
-                                c_args = [Rc * rho]
-                                if cutoff['name'] == 'Polynomial':
-                                    c_args.append(p_gamma)
-                                Z_nlm = fmodules.calculate_z(
-                                    n=n,
-                                    l=l,
-                                    m=m,
-                                    x=x,
-                                    y=y,
-                                    z=z,
-                                    factorial=self.factorial,
-                                    length=len(self.factorial))
-                                Z_nlm = self.globals.Gs[symbol][n_symbol] * \
-                                    Z_nlm * cutoff_fxn(*c_args)
-
-                            else:
-                                # Alternative ways to calculate Z_nlm
-                                #                                Z_nlm = self.globals.Gs[symbol][n_symbol] * \
-                                #                                    calculate_Z(n, l, m, x, y, z,
-                                #                                                self.factorial) * \
-                                #                                    cutoff_fxn(rho * Rc)
-                                #                                Z_nlm = self.globals.Gs[symbol][n_symbol] * \
-                                #                                    calculate_Z2(n, l, m, x, y, z) * \
-                                #                                    cutoff_fxn(rho * Rc)
-
-                                if rho > 0.:
-                                    theta = np.arccos(z / rho)
-                                else:
-                                    theta = 0.
-
-                                if x < 0.:
-                                    phi = np.pi + np.arctan(y / x)
-                                elif 0. < x and y < 0.:
-                                    phi = 2 * np.pi + np.arctan(y / x)
-                                elif 0. < x and 0. <= y:
-                                    phi = np.arctan(y / x)
-                                elif x == 0. and 0. < y:
-                                    phi = 0.5 * np.pi
-                                elif x == 0. and y < 0.:
-                                    phi = 1.5 * np.pi
-                                else:
-                                    phi = 0.
-
-                                c_args = [Rc * rho]
-                                if cutoff['name'] == 'Polynomial':
-                                    c_args.append(p_gamma)
-
-                                Z_nlm = self.globals.Gs[symbol][n_symbol] * \
-                                    calculate_R(n, l, rho, self.factorial) * \
-                                    sph_harm(m, l, phi, theta) * \
-                                    cutoff_fxn(*c_args)
-
-                            # sum over neighbors
-                            c_nlm += np.conjugate(Z_nlm)
-                        # sum over m values
-                        if m == 0:
-                            norm += c_nlm * np.conjugate(c_nlm)
-                        else:
-                            norm += 2. * c_nlm * np.conjugate(c_nlm)
-
-                    fingerprint.append(norm.real)
-
-        return symbol, fingerprint
+        cutoff_fxn = dict2cutoff(cutoff)
+
+        # The geometry and the basis functions of each neighbor are
+        # evaluated once, as arrays over all neighbors and all (n, l, m).
+        vectors = (np.array(Rs, dtype=float).reshape(-1, 3) - home) / Rc
+        rho2 = (vectors ** 2.).sum(axis=1)
+        weights = np.array([self.globals.Gs[symbol][n_symbol]
+                            for n_symbol in n_symbols], dtype=float)
+        weights *= cutoff_fxn(Rc * np.sqrt(rho2))
+        # Z_nlm = Q_nl(rho^2) * rho^l * Y_lm, with Q_nl a polynomial.
+        powers = rho2[np.newaxis, :] ** \
+            np.arange(self.radialcoefficients.shape[1])[:, np.newaxis]
+        Q = np.dot(self.radialcoefficients, powers) * weights
+        S = calculate_solid_harmonics(vectors, self.globals.nmax)
+        # Sum over neighbors: c_nlm for each (n, l) and 0 <= m <= l.
+        c_nlm = np.einsum('ij,imj->im', Q, S[self.nls[:, 1]])
+        # Sum over m values; m < 0 are the complex conjugates of m > 0.
+        mweights = np.full(self.globals.nmax + 1, 2.)
+        mweights[0] = 1.
+        fingerprint = np.dot(np.abs(c_nlm) ** 2., mweights)
+
+        return symbol, list(fingerprint)
 
 
 class FingerprintPrimeCalculator:
@@ -480,8 +486,9 @@ class FingerprintPrimeCalculator:
                 from scipy.special import factorial as fac
 
         self.factorial = [fac(0.5 * _) for _ in range(4 * nmax + 3)]
+        self.nls, self.radialcoefficients = \
+            get_radial_coefficients(nmax, self.factorial)
 
-    @jit
     def calculate(self, image, key):
         """Makes a list of fingerprint derivatives, one per atom, for the fed
         image.
@@ -495,72 +502,56 @@ class FingerprintPrimeCalculator:
         """
         self.atoms = image
         nl = self.keyed.neighborlist[key]
+        # Derivatives of the fingerprint of each atom with respect to the
+        # positions of itself and its neighbors, all in one pass per atom.
+        atomprimes = []
+        for atom in image:
+            neighborindices, neighboroffsets = nl[atom.index]
+            neighborsymbols = [image[_].symbol for _ in neighborindices]
+            Rs = [image.positions[_index] + np.dot(_offset, image.cell)
+                  for _index, _offset in zip(neighborindices,
+                                             neighboroffsets)]
+            atomprimes.append(self.get_fingerprintprimes(
+                atom.index, atom.symbol, neighborindices, neighborsymbols,
+                Rs))
+
         fingerprintprimes = {}
         for atom in image:
             selfsymbol = atom.symbol
             selfindex = atom.index
             selfneighborindices, selfneighboroffsets = nl[selfindex]
-            selfneighborsymbols = [
-                image[_].symbol for _ in selfneighborindices
-            ]
             for i in range(3):
-                # Calculating derivative of self atom fingerprints w.r.t.
-                # coordinates of itself.
-                nneighborindices, nneighboroffsets = nl[selfindex]
-                nneighborsymbols = [image[_].symbol for _ in nneighborindices]
-
-                Rs = [
-                    image.positions[_index] + np.dot(_offset, image.get_cell())
-                    for _index, _offset in zip(nneighborindices,
-                                               nneighboroffsets)
-                ]
-
-                der_indexfp = self.get_fingerprintprime(
-                    selfindex, selfsymbol, nneighborindices, nneighborsymbols,
-                    Rs, selfindex, i)
-
+                # Derivative of self atom fingerprints w.r.t. coordinates of
+                # itself.
                 fingerprintprimes[
                     (selfindex, selfsymbol, selfindex, selfsymbol, i)] = \
-                    der_indexfp
-                # Calculating derivative of neighbor atom fingerprints w.r.t.
-                # coordinates of self atom.
-                for nindex, nsymbol, noffset in \
-                        zip(selfneighborindices,
-                            selfneighborsymbols,
-                            selfneighboroffsets):
-                    # for calculating forces, summation runs over neighbor
-                    # atoms of type II (within the main cell only)
+                    list(atomprimes[selfindex][selfindex][i])
+                # Derivatives of neighbor atom fingerprints w.r.t.
+                # coordinates of self atom; for calculating forces,
+                # summation runs over neighbor atoms of type II (within the
+                # main cell only).
+                for nindex, noffset in zip(selfneighborindices,
+                                           selfneighboroffsets):
                     if noffset.all() == 0:
-                        nneighborindices, nneighboroffsets = nl[nindex]
-                        nneighborsymbols = \
-                            [image[_].symbol for _ in nneighborindices]
-
-                        Rs = [
-                            image.positions[_index] + np.dot(
-                                _offset, image.get_cell()) for _index, _offset
-                            in zip(nneighborindices, nneighboroffsets)
-                        ]
-
-                        # for calculating derivatives of fingerprints,
-                        # summation runs over neighboring atoms of type
-                        # I (either inside or outside the main cell)
-                        der_indexfp = self.get_fingerprintprime(
-                            nindex, nsymbol, nneighborindices,
-                            nneighborsymbols, Rs, selfindex, i)
-
+                        nsymbol = image[nindex].symbol
                         fingerprintprimes[
                             (selfindex, selfsymbol, nindex, nsymbol, i)] = \
-                            der_indexfp
+                            list(atomprimes[nindex][selfindex][i])
 
         return fingerprintprimes
 
-    @jit
-    def get_fingerprintprime(self, index, symbol, n_indices, n_symbols, Rs, p,
-                             q):
-        """Returns the value of the derivative of G for atom with index and
-        symbol with respect to coordinate x_{i} of atom index m. n_indices,
-        n_symbols and Rs are lists of neighbors' indices, symbols and Cartesian
-        positions, respectively.
+    def get_fingerprintprimes(self, index, symbol, n_indices, n_symbols, Rs):
+        """Returns the derivatives of the fingerprint of the atom with index
+        and symbol with respect to the positions of itself and each of its
+        neighbors. n_indices, n_symbols and Rs are lists of neighbors'
+        indices, symbols and Cartesian positions, respectively.
+
+        The Zernike moments of all neighbors and their analytic gradients
+        are evaluated once, as arrays over all (n, l, m); the derivative
+        with respect to the position of atom p is then the sum of the
+        gradients of the neighbors that are images of p, minus the sum of
+        all gradients if p is the center atom. Periodic images of the center
+        atom itself therefore do not contribute.
 
         Parameters
         ----------
@@ -574,128 +565,63 @@ class FingerprintPrimeCalculator:
             List of neighbors' symbols.
         Rs : list of list of float
             List of Cartesian atomic positions.
-        p : int
-            Index of the pair atom.
-        q : int
-            Direction of the derivative; is an integer from 0 to 2.
 
         Returns
         -------
-        fingerprint_prime : list of float
-            The value of the derivative of the fingerprints for atom with index
-            and symbol with respect to coordinate x_{i} of atom index m.
+        fingerprintprimes : dict
+            Derivatives, as arrays of shape (3, number of fingerprints),
+            keyed by the index of the atom whose position is varied.
         """
         home = self.atoms[index].position
         cutoff = self.globals.cutoff
         Rc = cutoff['kwargs']['Rc']
-
-        if cutoff['name'] is 'Cosine':
-            cutoff_fxn = Cosine(Rc)
-        elif cutoff['name'] is 'Polynomial':
-            p_gamma = cutoff['kwargs']['gamma']
-            cutoff_fxn = Polynomial(Rc, gamma=p_gamma)
-
-        fingerprint_prime = []
-        for n in range(self.globals.nmax + 1):
-            for l in range(n + 1):
-                if (n - l) % 2 == 0:
-                    if self.fortran:  # fortran version; faster
-                        G_numbers = [
-                            self.globals.Gs[symbol][elm] for elm in n_symbols
-                        ]
-                        numbers = [atomic_numbers[elm] for elm in n_symbols]
-                        if len(Rs) == 0:
-                            norm_prime = 0.
-                        else:
-                            if cutoff['name'] == 'Cosine':
-                                cutofffn_code = 1
-                            elif cutoff['name'] == 'Polynomial':
-                                cutofffn_code = 2
-                            else:
-                                print("Unknown cutoff function specified! \
-                                    Only supports 'Cosine' and 'Polynomial'.")
-                            args_calculate_zernike_prime = dict(
-                                n=n,
-                                l=l,
-                                n_length=len(n_indices),
-                                n_indices=list(n_indices),
-                                numbers=numbers,
-                                rs=Rs,
-                                g_numbers=G_numbers,
-                                cutoff=Rc,
-                                cutofffn_code=cutofffn_code,
-                                indexx=index,
-                                home=home,
-                                p=p,
-                                q=q,
-                                fac_length=len(self.factorial),
-                                factorial=self.factorial)
-
-                            if cutoff['name'] == 'Polynomial':
-                                args_calculate_zernike_prime['p_gamma'] =\
-                                        cutoff['kwargs']['gamma']
-
-                            norm_prime = \
-                                fmodules.calculate_zernike_prime(
-                                    **args_calculate_zernike_prime)
-                    else:
-                        norm_prime = 0.
-                        for m in range(l + 1):
-                            c_nlm = 0.
-                            c_nlm_prime = 0.
-                            for n_index, n_symbol, neighbor in zip(
-                                    n_indices, n_symbols, Rs):
-                                x = (neighbor[0] - home[0]) / Rc
-                                y = (neighbor[1] - home[1]) / Rc
-                                z = (neighbor[2] - home[2]) / Rc
-                                rho = np.linalg.norm([x, y, z])
-                                c_args = [rho * Rc]
-                                if cutoff['name'] == 'Polynomial':
-                                    c_args.append(p_gamma)
-
-                                _Z_nlm = calculate_Z(n, l, m, x, y, z,
-                                                     self.factorial)
-                                # Calculates Z_nlm
-                                Z_nlm = _Z_nlm * \
-                                    cutoff_fxn(*c_args)
-
-                                # Calculates Z_nlm_prime
-                                Z_nlm_prime = _Z_nlm * \
-                                    cutoff_fxn.prime(*c_args) * \
-                                    der_position(
-                                        index, n_index, home, neighbor, p, q)
-
-                                _Z_nlm_prime = calculate_Z_prime(
-                                    n, l, m, x, y, z, q, self.factorial)
-
-                                if (Kronecker(n_index, p) - Kronecker(
-                                        index, p)) == 1:
-                                    Z_nlm_prime += \
-                                        cutoff_fxn(*c_args) * \
-                                        _Z_nlm_prime / Rc
-                                elif (Kronecker(n_index, p) - Kronecker(
-                                        index, p)) == -1:
-                                    Z_nlm_prime -= \
-                                        cutoff_fxn(*c_args) * \
-                                        _Z_nlm_prime / Rc
-
-                                # sum over neighbors
-                                c_nlm += self.globals.Gs[symbol][
-                                    n_symbol] * np.conjugate(Z_nlm)
-                                c_nlm_prime += self.globals.Gs[symbol][
-                                    n_symbol] * np.conjugate(Z_nlm_prime)
-
-                            # sum over m values
-                            if m == 0:
-                                norm_prime += 2. * c_nlm * \
-                                    np.conjugate(c_nlm_prime)
-                            else:
-                                norm_prime += 4. * c_nlm * \
-                                    np.conjugate(c_nlm_prime)
-
-                    fingerprint_prime.append(norm_prime.real)
-
-        return fingerprint_prime
+        cutoff_fxn = dict2cutoff(cutoff)
+        nmax = self.globals.nmax
+
+        vectors = (np.array(Rs, dtype=float).reshape(-1, 3) - home) / Rc
+        rho2 = (vectors ** 2.).sum(axis=1)
+        rho = np.sqrt(rho2)
+        G = np.array([self.globals.Gs[symbol][n_symbol]
+                      for n_symbol in n_symbols], dtype=float)
+        fc = cutoff_fxn(Rc * rho)
+        # d(fc)/d(vectors), in the same units as the vectors.
+        dfc = (cutoff_fxn.prime(Rc * rho) * Rc / np.where(rho > 0., rho, 1.)
+               )[:, np.newaxis] * vectors
+
+        # Radial polynomials Q_nl(rho^2) and their derivatives with respect
+        # to rho^2.
+        orders = np.arange(self.radialcoefficients.shape[1])
+        powers = rho2[np.newaxis, :] ** orders[:, np.newaxis]
+        Q = np.dot(self.radialcoefficients, powers)
+        dQ = np.dot(self.radialcoefficients[:, 1:] * orders[1:],
+                    powers[:-1])
+        S, dS = calculate_solid_harmonics(vectors, nmax, derivatives=True)
+        S = S[self.nls[:, 1]]
+        dS = dS[self.nls[:, 1]]
+
+        # Moments c_nlm, as in FingerprintCalculator.get_fingerprint.
+        c_nlm = np.einsum('j,ij,imj->im', G * fc, Q, S)
+        # Gradients of each neighbor's term of c_nlm w.r.t. its position
+        # (times Rc), of shape (n, l), m, neighbor, direction.
+        gradients = (
+            (G * Q)[:, np.newaxis, :, np.newaxis] *
+            (S[..., np.newaxis] * dfc +
+             fc[:, np.newaxis] * dS) +
+            (G * fc * dQ)[:, np.newaxis, :, np.newaxis] *
+            S[..., np.newaxis] * 2. * vectors)
+        mweights = np.full(nmax + 1, 4.)
+        mweights[0] = 2.
+        # Derivative of the norm of (n, l) w.r.t. each neighbor position.
+        terms = np.einsum('m,im,imjq->jqi', mweights, np.conjugate(c_nlm),
+                          gradients).real / Rc
+
+        n_indices = np.asarray(n_indices, dtype=int)
+        atoms, inverse = np.unique(np.concatenate([[index], n_indices]),
+                                   return_inverse=True)
+        summed = np.zeros((len(atoms),) + terms.shape[1:])
+        np.add.at(summed, inverse[1:], terms)
+        summed[inverse[0]] -= terms.sum(axis=0)
+        return dict(zip(atoms, summed))
 
 
 # Auxiliary functions #########################################################
@@ -732,6 +658,103 @@ def calculate_R(n, l, rho, factorial):
         return value
 
 
+def get_radial_coefficients(nmax, factorial):
+    """Returns the (n, l) pairs of the fingerprint, in the order of the
+    fingerprint vector, and the coefficients of the polynomials
+    Q_nl(rho^2) = R_nl(rho) / rho^l, one row per (n, l) pair; column k is
+    the coefficient of rho^(2k).
+    """
+    nls = [(n, l) for n in range(nmax + 1) for l in range(n + 1)
+           if (n - l) % 2 == 0]
+    coefficients = np.zeros((len(nls), nmax // 2 + 1))
+    for row, (n, l) in enumerate(nls):
+        k = (n - l) // 2
+        for s in range(k + 1):
+            coefficients[row, k - s] = \
+                np.sqrt(2. * n + 3.) * ((-1) ** s) * \
+                binomial(k, s, factorial) * \
+                binomial(n - s - 1 + 1.5, k, factorial)
+    return np.array(nls, dtype=int), coefficients
+
+
+def calculate_solid_harmonics(vectors, lmax, derivatives=False):
+    """Calculates the solid harmonics r^l Y_l^m(theta, phi) of an array of
+    vectors for 0 <= m <= l <= lmax, with Y_l^m as in
+    scipy.special.sph_harm.
+
+    Writing r^l Y_l^m = N_lm (-1)^m (x + iy)^m T_l^m(z, r^2), the
+    polynomials T_l^m follow from the recurrence of the associated Legendre
+    functions,
+
+        (l - m) T_l^m = (2l - 1) z T_{l-1}^m - (l + m - 1) r^2 T_{l-2}^m,
+
+    starting from T_m^m = (2m - 1)!!, so no angles are needed. Gradients
+    follow from the same recurrence differentiated with respect to z and
+    r^2.
+
+    Parameters
+    ----------
+    vectors : numpy.ndarray
+        Cartesian vectors, of shape (number of vectors, 3).
+    lmax : int
+        Maximum degree of the spherical harmonics.
+    derivatives : bool
+        If True, the gradients of the solid harmonics with respect to the
+        vectors are also returned.
+
+    Returns
+    -------
+    harmonics : numpy.ndarray
+        Complex array of shape (lmax + 1, lmax + 1, number of vectors),
+        indexed by l and m; entries with m > l are zero.
+    gradients : numpy.ndarray
+        Only if derivatives is True; complex array of shape (lmax + 1,
+        lmax + 1, number of vectors, 3).
+    """
+    x, y, z = np.transpose(vectors)
+    r2 = x ** 2. + y ** 2. + z ** 2.
+    harmonics = np.zeros((lmax + 1, lmax + 1, len(r2)), dtype=complex)
+    if derivatives:
+        gradients = np.zeros(harmonics.shape + (3,), dtype=complex)
+    xy_m = np.ones(len(r2), dtype=complex)  # (x + iy)^m
+    xy_m1 = np.zeros(len(r2), dtype=complex)  # (x + iy)^(m - 1)
+    T_mm = 1.  # (2m - 1)!!
+    for m in range(lmax + 1):
+        if m > 0:
+            xy_m1 = xy_m
+            xy_m = xy_m * (x + 1j * y)
+            T_mm *= 2. * m - 1.
+        T_previous, T_l = 0., T_mm * np.ones(len(r2))
+        # Partial derivatives of T_l^m w.r.t. z and r^2.
+        Tz_previous, Tz_l = 0., 0.
+        Tr_previous, Tr_l = 0., 0.
+        for l in range(m, lmax + 1):
+            if l > m:
+                Tz_previous, Tz_l = Tz_l, ((2. * l - 1.) * (T_l + z * Tz_l) -
+                                           (l + m - 1.) * r2 * Tz_previous) \
+                    / (l - m)
+                Tr_previous, Tr_l = Tr_l, ((2. * l - 1.) * z * Tr_l -
+                                           (l + m - 1.) * (T_previous +
+                                                           r2 * Tr_previous)) \
+                    / (l - m)
+                T_previous, T_l = T_l, ((2. * l - 1.) * z * T_l -
+                                        (l + m - 1.) * r2 * T_previous) / \
+                    (l - m)
+            norm = np.sqrt((2. * l + 1.) / (4. * np.pi) *
+                           math.factorial(l - m) / math.factorial(l + m))
+            norm *= (-1.) ** m
+            harmonics[l, m] = norm * xy_m * T_l
+            if derivatives:
+                gradients[l, m, :, 0] = norm * (m * xy_m1 * T_l +
+                                                xy_m * Tr_l * 2. * x)
+                gradients[l, m, :, 1] = norm * (1j * m * xy_m1 * T_l +
+                                                xy_m * Tr_l * 2. * y)
+                gradients[l, m, :, 2] = norm * xy_m * (Tz_l + Tr_l * 2. * z)
+    if derivatives:
+        return harmonics, gradients
+    return harmonics
+
+
 def generate_coefficients(elements):
     """Automatically generates coefficients if not given by the user.
 
@@ -956,27 +979,7 @@ if __name__ == "__main__":
     purpose = socket.recv_pyobj()
     w('Purpose received: {}.'.format(purpose))
 
-    if purpose == 'calculate_neighborlists':
-        # Request variables.
-        socket.send_pyobj(msg('<request>', 'cutoff'))
-        cutoff = socket.recv_pyobj()
-        socket.send_pyobj(msg('<request>', 'images'))
-        images = socket.recv_pyobj()
-        # sys.stderr.write(str(images)) # Just to see if they are there.
-
-        # Perform the calculations.
-        calc = NeighborlistCalculator(cutoff=cutoff)
-        neighborlist = {}
-        # for key in images.iterkeys():
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            neighborlist[key] = calc.calculate(image, key)
-
-        # Send the results.
-        socket.send_pyobj(msg('<result>', neighborlist))
-        socket.recv_string()  # Needed to complete REQ/REP.
-
-    elif purpose == 'calculate_fingerprints':
+    if purpose == 'calculate_fingerprints':
         # Request variables.
         socket.send_pyobj(msg('<request>', 'cutoff'))
         cutoff = socket.recv_pyobj()
@@ -984,21 +987,18 @@ if __name__ == "__main__":
         Gs = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'nmax'))
         nmax = socket.recv_pyobj()
+        socket.send_pyobj(msg('<request>', 'batchsize'))
+        batchsize = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'neighborlist'))
         neighborlist = socket.recv_pyobj()
         socket.send_pyobj(msg('<request>', 'images'))
         images = socket.recv_pyobj()
         w('Received images and parameters.')
 
-        calc = FingerprintCalculator(neighborlist, Gs, nmax, cutoff, fortran)
+        calc = FingerprintCalculator(neighborlist, Gs, nmax, cutoff, fortran,
+                                     batchsize)
         w('Established calculator. Calculating.')
-        result = {}
-        while len(images) > 0:
-            key, image = images.popitem()  # Reduce memory.
-            result[key] = calc.calculate(image, key)
-            if len(images) % 100 == 0:
-                socket.send_pyobj(msg('<info>', len(images)))
-                socket.recv_string()  # Needed to complete REQ/REP.
+        result = calc.calculate_batch(images)
 
         # Send the results.
         w('Sending results.')
@@ -1,10 +1,14 @@
+import os
 import sys
+import hashlib
 import numpy as np
 import threading
 import time
+from collections import OrderedDict
 from ase.calculators.calculator import Parameters
 from ..utilities import (Logger, ConvergenceOccurred, make_sublists, now,
-                         setup_parallel)
+                         setup_parallel, summarize_fingerprints,
+                         combine_fingerprint_summaries, make_filename)
 try:
     from .. import fmodules
 except ImportError:
@@ -275,6 +279,19 @@ class LossFunction:
         If d is None, both loss function and its gradient are calculated
         analytically. If d is a float, then gradient of the loss function is
         calculated by perturbing each parameter plus/minus d.
+    raveled_dblabel : str
+        If given, the training data raveled for the fortran loss function
+        are kept in files '<raveled_dblabel>-raveled-<digest>.npz', one per
+        set of images (and so per parallel worker), and loaded from them by
+        later training runs on the same images. Using the dblabel of the
+        calculator keeps them next to its fingerprint database.
+
+    Attributes
+    ----------
+    batch : list or None
+        Hashes of the images to take the loss over, for mini-batch
+        optimizers; None (the default) takes it over all training images.
+        The losses of a batch are not checked for convergence, nor logged.
     """
 
     default_parameters = {'convergence': {'energy_rmse': 0.001,
@@ -285,7 +302,8 @@ class LossFunction:
 
     def __init__(self, energy_coefficient=1.0, force_coefficient=0.04,
                  convergence=None, parallel=None, overfit=0.,
-                 raise_ConvergenceOccurred=True, log_losses=True, d=None):
+                 raise_ConvergenceOccurred=True, log_losses=True, d=None,
+                 raveled_dblabel=None):
         p = self.parameters = Parameters(
             {'importname': '.model.LossFunction'})
         # 'dict' creates a copy; otherwise mutable in class.
@@ -296,6 +314,7 @@ class LossFunction:
         p['energy_coefficient'] = energy_coefficient
         p['force_coefficient'] = force_coefficient
         p['overfit'] = overfit
+        p['raveled_dblabel'] = raveled_dblabel
         self.raise_ConvergenceOccurred = raise_ConvergenceOccurred
         self.log_losses = log_losses
         self.d = d
@@ -303,12 +322,15 @@ class LossFunction:
         self._initialized = False
         self._data_sent = False
         self._parallel = parallel
+        self.batch = None
 
     def attach_model(self, model, images=None, fingerprints=None,
                      fingerprintprimes=None, log=None):
         """Attach the model to be used to the loss function.
         hashed images, fingerprints and fingerprintprimes can optionally be
-        specified; this is typically for use in parallelization.
+        specified; this is typically for use in parallelization. The
+        reference energies of images are then cached (see
+        cache_references).
 
         Parameters
         ----------
@@ -328,6 +350,7 @@ class LossFunction:
             self._model.trainingparameters.descriptor = Parameters()
         if images is not None:
             self._model.trainingparameters.images = images
+            self.cache_references(images)
         descriptor = self._model.trainingparameters.descriptor
         if fingerprints is not None:
             descriptor.fingerprints = fingerprints
@@ -500,11 +523,19 @@ class LossFunction:
          num_images_atoms, atomic_numbers, raveled_fingerprints, num_neighbors,
          raveled_neighborlists, raveled_fingerprintprimes) = (None,) * 10
 
+        filename = None
+        if p.get('raveled_dblabel') is not None:
+            digest = hashlib.md5(
+                '\n'.join(images.keys()).encode('utf-8')).hexdigest()
+            filename = make_filename(p.raveled_dblabel,
+                                     '-raveled-%s.npz' % digest)
+
         value = ravel_data(train_forces,
                            mode,
                            images,
                            fingerprints,
-                           fingerprintprimes,)
+                           fingerprintprimes,
+                           filename)
 
         if mode == 'image-centered':
             if not train_forces:
@@ -520,6 +551,12 @@ class LossFunction:
                  atomic_numbers, raveled_fingerprints, num_neighbors,
                  raveled_neighborlists, raveled_fingerprintprimes) = value
 
+        # Kept to send the data of batches of images in their place.
+        self._raveled = {'hashes': list(images.keys()),
+                         'train_forces': train_forces,
+                         'value': value}
+        self._batch_sent = None
+
         send_data_to_fortran(fmodules,
                              energy_coefficient,
                              force_coefficient,
@@ -540,6 +577,46 @@ class LossFunction:
                              self.d)
         self._data_sent = True
 
+    def _send_batch_to_fortran(self, hashes):
+        """Sends the raveled data of some of the training images in place of
+        those sent by _send_data_to_fortran, or, if hashes is None, those of
+        all images again. Nothing is sent if they are already there.
+
+        Parameters
+        ----------
+        hashes : list or None
+            Hashes of the images, in the order of the training images.
+        """
+        if hashes == self._batch_sent:
+            return
+        raveled = self._raveled
+        train_forces = raveled['train_forces']
+        value = raveled['value']
+        if hashes is not None:
+            value = select_raveled_data(train_forces, raveled['hashes'],
+                                        value, hashes)
+        if not train_forces:
+            (actual_energies, elements, num_images_atoms,
+             atomic_numbers, raveled_fingerprints) = value
+        else:
+            (actual_energies, actual_forces, elements, num_images_atoms,
+             atomic_numbers, raveled_fingerprints, num_neighbors,
+             raveled_neighborlists, raveled_fingerprintprimes) = value
+
+        fmodules.images_props.num_images = len(actual_energies)
+        fmodules.images_props.actual_energies = actual_energies
+        fmodules.images_props.num_images_atoms = num_images_atoms
+        fmodules.images_props.atomic_numbers = atomic_numbers
+        fmodules.fingerprint_props.raveled_fingerprints = raveled_fingerprints
+        if train_forces:
+            fmodules.images_props.actual_forces = actual_forces
+            fmodules.images_props.num_neighbors = num_neighbors
+            fmodules.images_props.raveled_neighborlists = \
+                raveled_neighborlists
+            fmodules.fingerprint_props.raveled_fingerprintprimes = \
+                raveled_fingerprintprimes
+        self._batch_sent = None if hashes is None else list(hashes)
+
     def _cleanup(self):
         """Closes SSH sessions."""
         self._initialized = False
@@ -574,9 +651,19 @@ class LossFunction:
         self._initialize(args={'lossprime': lossprime, 'd': self.d})
 
         if self._parallel['cores'] == 1:
-            if self._model.fortran:
+            hashes = self._batch_hashes()
+            if hashes is not None and len(hashes) == 0:
+                # None of the images of this worker are in the batch.
+                self._model.vector = parametervector
+                vector = np.asarray(parametervector, dtype=float)
+                loss = self.parameters.overfit * np.dot(vector, vector)
+                dloss_dparameters = 2. * self.parameters.overfit * vector
+                energy_loss = force_loss = 0.
+                energy_maxresid = force_maxresid = 0.
+            elif self._model.fortran:
                 self._model.vector = parametervector
                 self._send_data_to_fortran()
+                self._send_batch_to_fortran(hashes)
                 (loss, dloss_dparameters, energy_loss, force_loss,
                  energy_maxresid, force_maxresid) = \
                     fmodules.calculate_loss(parameters=parametervector,
@@ -609,7 +696,9 @@ class LossFunction:
         if lossprime:
             self.dloss_dparameters = dloss_dparameters
 
-        if self.raise_ConvergenceOccurred:
+        if self.batch is not None:
+            self._model.vector = parametervector
+        elif self.raise_ConvergenceOccurred:
             self._model.vector = parametervector
             converged = self.check_convergence(loss,
                                                energy_loss,
@@ -633,6 +722,12 @@ class LossFunction:
         """Method that calculates the loss, derivative of the loss with respect
         to parameters (if requested), and max_residual.
 
+        The reference energies and forces of the training images are the
+        arrays cached by cache_references, and the residuals, their maxima
+        and the weights of the force residuals in the gradient are found
+        with array operations over all images, or over those in the batch
+        if one is set.
+
         Parameters
         ----------
         parametervector : list
@@ -644,32 +739,52 @@ class LossFunction:
         """
         self._model.vector = parametervector
         p = self.parameters
-        energyloss = 0.
-        forceloss = 0.
-        energy_maxresid = 0.
-        force_maxresid = 0.
-        dloss_dparameters = np.array([0.] * len(parametervector))
+        dloss_dparameters = np.zeros(len(parametervector))
         model = self._model
         images = self._model.trainingparameters.images
         descriptor = self._model.trainingparameters.descriptor
         fingerprints = descriptor.fingerprints
-        for hash in images.keys():
-            image = images[hash]
-            no_of_atoms = len(image)
-            amp_energy = model.calculate_energy(fingerprints[hash])
-            actual_energy = image.get_potential_energy(apply_constraint=False)
-            residual_per_atom = abs(amp_energy - actual_energy) / \
-                len(image)
-            if residual_per_atom > energy_maxresid:
-                energy_maxresid = residual_per_atom
-            energyloss += residual_per_atom**2
-
-            # Calculates derivative of the loss function with respect to
-            # parameters if lossprime is true
-            if lossprime:
-                if model.parameters.mode == 'image-centered':
-                    raise NotImplementedError('This needs to be coded.')
-                elif model.parameters.mode == 'atom-centered':
+        if lossprime and model.parameters.mode == 'image-centered':
+            raise NotImplementedError('This needs to be coded.')
+        # Fingerprints scaled once by the model, if it has done so, are used
+        # in their place, with their derivatives, for analytic gradients.
+        prescaled = self._model.trainingparameters.get(
+            'prescaledfingerprints')
+        if self.d is not None:
+            prescaled = None
+        elif prescaled is not None:
+            fingerprints = prescaled
+        # Models that can backpropagate many images at once get the energy
+        # residual weight of each image, and are called once.
+        batched = (lossprime and self.d is None and
+                   model.parameters.mode == 'atom-centered' and
+                   hasattr(model, 'calculate_dEnergies_dParameters'))
+        references = self.cache_references(
+            images, forces=p.force_coefficient is not None)
+        batch = self._batch_hashes()
+        if batch is not None:
+            references = select_references(references, batch)
+        hashes = references['hashes']
+        natoms = references['natoms']
+
+        amp_energies = np.array([model.calculate_energy(fingerprints[hash])
+                                 for hash in hashes])
+        energy_residuals = amp_energies - references['energies']
+        residuals_per_atom = np.abs(energy_residuals) / natoms
+        energyloss = np.sum(residuals_per_atom ** 2)
+        energy_maxresid = np.max(residuals_per_atom, initial=0.)
+
+        # Calculates derivative of the loss function with respect to
+        # parameters if lossprime is true
+        if lossprime:
+            energycoefficients = p.energy_coefficient * 2. * \
+                energy_residuals / natoms ** 2.
+            if batched:
+                dloss_dparameters += model.calculate_dEnergies_dParameters(
+                    [fingerprints[hash] for hash in hashes],
+                    energycoefficients)
+            else:
+                for hash, coefficient in zip(hashes, energycoefficients):
                     if self.d is None:
                         denergy_dparameters = \
                             model.calculate_dEnergy_dParameters(
@@ -678,76 +793,134 @@ class LossFunction:
                         denergy_dparameters = \
                             model.calculate_numerical_dEnergy_dParameters(
                                 fingerprints[hash], d=self.d)
-                    temp = p.energy_coefficient * 2. * \
-                        (amp_energy - actual_energy) * \
-                        denergy_dparameters / \
-                        (no_of_atoms ** 2.)
-                    dloss_dparameters += temp
-
-            if p.force_coefficient is not None:
-                fingerprintprimes = descriptor.fingerprintprimes
-                amp_forces = \
-                    model.calculate_forces(fingerprints[hash],
-                                           fingerprintprimes[hash])
-                actual_forces = image.get_forces(apply_constraint=False)
-                image_forceloss = 0.
-                for index in range(no_of_atoms):
-                    for i in range(3):
-                        force_resid = abs(amp_forces[index][i] -
-                                          actual_forces[index][i])
-                        if force_resid > force_maxresid:
-                            force_maxresid = force_resid
-                        image_forceloss += force_resid**2
-                image_forceloss /=  3. * no_of_atoms  # mean over image
-                forceloss += image_forceloss
-
-                # Calculates derivative of the loss function with respect to
-                # parameters if lossprime is true
-                if lossprime:
-                    if model.parameters.mode == 'image-centered':
-                        raise NotImplementedError('This needs to be coded.')
-                    elif model.parameters.mode == 'atom-centered':
-                        if self.d is None:
-                            dforces_dparameters = \
-                                model.calculate_dForces_dParameters(
-                                    fingerprints[hash],
-                                    fingerprintprimes[hash])
-                        else:
-                            dforces_dparameters = \
-                                model.calculate_numerical_dForces_dParameters(
-                                    fingerprints[hash],
-                                    fingerprintprimes[hash],
-                                    d=self.d)
-                        image_dldp = 0.
-                        for selfindex in range(no_of_atoms):
-                            for i in range(3):
-                                image_dldp += (
-                                    (amp_forces[selfindex][i] -
-                                     actual_forces[selfindex][i]) *
-                                    dforces_dparameters[(selfindex, i)])
-                        image_dldp *= p.force_coefficient * 2. / 3. / no_of_atoms
-                        dloss_dparameters += image_dldp
+                    dloss_dparameters += \
+                        coefficient * np.asarray(denergy_dparameters)
+
+        forceloss = 0.
+        force_maxresid = 0.
+        if p.force_coefficient is not None:
+            fingerprintprimes = {}
+            for hash in hashes:
+                if prescaled is not None:
+                    fingerprintprimes[hash] = None  # Kept in fingerprints.
+                else:
+                    fingerprintprimes[hash] = \
+                        descriptor.fingerprintprimes[hash]
+            amp_forces = np.concatenate(
+                [model.calculate_forces(fingerprints[hash],
+                                        fingerprintprimes[hash])
+                 for hash in hashes])
+            force_residuals = amp_forces - references['forces']
+            atomimages = references['atomimages']
+            # Mean square residual over each image, summed over images.
+            forceloss = np.sum(
+                np.bincount(atomimages, np.sum(force_residuals ** 2, axis=1),
+                            minlength=len(hashes)) / (3. * natoms))
+            force_maxresid = np.max(np.abs(force_residuals), initial=0.)
+
+            if lossprime:
+                forcecoefficients = np.split(
+                    p.force_coefficient * 2. / 3. * force_residuals /
+                    natoms[atomimages][:, None],
+                    references['offsets'][1:-1])
+                for hash, coefficients in zip(hashes, forcecoefficients):
+                    if batched and hasattr(
+                            model, 'calculate_weighted_dForces_dParameters'):
+                        dloss_dparameters += \
+                            model.calculate_weighted_dForces_dParameters(
+                                fingerprints[hash],
+                                fingerprintprimes[hash],
+                                coefficients)
+                        continue
+                    if self.d is None:
+                        dforces_dparameters = \
+                            model.calculate_dForces_dParameters(
+                                fingerprints[hash],
+                                fingerprintprimes[hash])
+                    else:
+                        dforces_dparameters = \
+                            model.calculate_numerical_dForces_dParameters(
+                                fingerprints[hash],
+                                fingerprintprimes[hash],
+                                d=self.d)
+                    dforces_dparameters = np.array(
+                        [dforces_dparameters[(selfindex, i)]
+                         for selfindex in range(len(coefficients))
+                         for i in range(3)])
+                    dloss_dparameters += np.dot(coefficients.ravel(),
+                                                dforces_dparameters)
 
         loss = p.energy_coefficient * energyloss
         if p.force_coefficient is not None:
             loss += p.force_coefficient * forceloss
-        dloss_dparameters = np.array(dloss_dparameters)
 
         # if overfit coefficient is more than zero, overfit contribution to
         # loss and dloss_dparameters is also added.
         if p.overfit > 0.:
-            overfitloss = 0.
-            for component in parametervector:
-                overfitloss += component ** 2.
-            overfitloss *= p.overfit
-            loss += overfitloss
-            doverfitloss_dparameters = \
-                2 * p.overfit * np.array(parametervector)
-            dloss_dparameters += doverfitloss_dparameters
+            vector = np.asarray(parametervector, dtype=float)
+            loss += p.overfit * np.dot(vector, vector)
+            dloss_dparameters += 2 * p.overfit * vector
 
         return loss, dloss_dparameters, energyloss, forceloss, \
             energy_maxresid, force_maxresid
 
+    def cache_references(self, images, forces=False):
+        """Returns the reference energies, and forces if requested, of the
+        training images as arrays, reading them from the images only on the
+        first call for the images (or the first call requesting forces).
+
+        Parameters
+        ----------
+        images : dict
+            Dictionary of hashed images to train on.
+        forces : bool
+            If True, the reference forces are also cached.
+
+        Returns
+        -------
+        dict
+            The hashes of the images, in the order of the arrays, and their
+            positions in it ('positions'), the number of atoms ('natoms')
+            and reference energy ('energies') of each image, the offset of
+            the first atom of each image in the atom arrays, followed by the
+            total number of atoms ('offsets'), and, if requested, the image
+            of each atom ('atomimages') and the reference forces of all
+            atoms, as one array of shape (number of atoms, 3) ('forces').
+        """
+        references = getattr(self, '_references', None)
+        if (references is None or references['images'] is not images or
+                (forces and references['forces'] is None)):
+            hashes = list(images.keys())
+            natoms = np.array([len(images[hash]) for hash in hashes])
+            references = {
+                'images': images,
+                'hashes': hashes,
+                'positions': {hash: position
+                              for position, hash in enumerate(hashes)},
+                'natoms': natoms,
+                'energies': np.array(
+                    [images[hash].get_potential_energy(apply_constraint=False)
+                     for hash in hashes]),
+                'offsets': np.concatenate(([0], np.cumsum(natoms))),
+                'atomimages': np.repeat(np.arange(len(hashes)), natoms),
+                'forces': None}
+            if forces:
+                references['forces'] = np.concatenate(
+                    [np.reshape(images[hash].get_forces(
+                        apply_constraint=False), (-1, 3))
+                     for hash in hashes])
+            self._references = references
+        return references
+
+    def _batch_hashes(self):
+        """Returns the hashes of the training images in the batch, in the
+        order of the training images, or None if no batch is set."""
+        if self.batch is None:
+            return None
+        batch = set(self.batch)
+        return [hash for hash in self._model.trainingparameters.images
+                if hash in batch]
+
     # All incoming requests will be dictionaries with three keys.
     # d['id']: process id number, assigned when process created above.
     # d['subject']: what the message is asking for / telling you.
@@ -776,8 +949,11 @@ class LossFunction:
 
         publisher = self._sessions['publisher']
 
-        # Broadcast parameters for this call.
-        publisher.send_pyobj(vector)
+        # Broadcast parameters for this call, with the batch if one is set.
+        if self.batch is None:
+            publisher.send_pyobj(vector)
+        else:
+            publisher.send_pyobj((vector, list(self.batch)))
 
         # Receive the result.
         finished = np.array([False] * self._sessions['n_pids'])
@@ -866,6 +1042,36 @@ class LossFunction:
             return energy_rmse_converged and energy_maxresid_converged
 
 
+def calculate_fingerprints_statistics(fp, images):
+    """Calculates statistics of the fingerprints corresponding to images,
+    stored in fp. fp is a fingerprints object with the fingerprints data
+    stored in a dictionary-like object at fp.fingerprints. images is a
+    hashed dictionary of atoms for which to consider the statistics.
+
+    When fp.fingerprints is a .utilities.Data structure made with
+    summarize_fingerprints, as those of the descriptors are, the statistics
+    are combined from the per-image summaries kept in the database as the
+    fingerprints were calculated, without reading the fingerprints again.
+
+    In atom-centered mode, returns a dictionary with one entry per element,
+    each a dictionary of the number of atoms ('count') and of arrays of the
+    minimum ('min'), maximum ('max'), mean ('mean') and standard deviation
+    ('std') of each fingerprint component.
+    """
+    if fp.parameters.mode == 'image-centered':
+        raise NotImplementedError()
+    if getattr(fp.fingerprints, 'summarize', None) is summarize_fingerprints:
+        summaries = fp.fingerprints.get_summaries(list(images.keys()))
+        summaries = [summaries[hash] for hash in images.keys()]
+    else:
+        summaries = [summarize_fingerprints(fp.fingerprints[hash])
+                     for hash in images.keys()]
+    statistics = combine_fingerprint_summaries(summaries)
+    for s in statistics.values():
+        s['std'] = np.sqrt(s.pop('M2') / s['count'])
+    return statistics
+
+
 def calculate_fingerprints_range(fp, images):
     """Calculates the range for the fingerprints corresponding to images,
     stored in fp. fp is a fingerprints object with the fingerprints data
@@ -875,36 +1081,64 @@ def calculate_fingerprints_range(fp, images):
 
     In image-centered mode, returns an array of (min, max) values for each
     fingerprint. In atom-centered mode, returns a dictionary of such
-    arrays, one per element.
+    arrays, one per element. See calculate_fingerprints_statistics.
     """
-    if fp.parameters.mode == 'image-centered':
-        raise NotImplementedError()
-    elif fp.parameters.mode == 'atom-centered':
-        fprange = {}
-        for hash in images.keys():
-            imagefingerprints = fp.fingerprints[hash]
-            for element, fingerprint in imagefingerprints:
-                if element not in fprange:
-                    fprange[element] = [[_, _] for _ in fingerprint]
-                else:
-                    assert len(fprange[element]) == len(fingerprint)
-                    for i, ridge in enumerate(fingerprint):
-                        if ridge < fprange[element][i][0]:
-                            fprange[element][i][0] = ridge
-                        elif ridge > fprange[element][i][1]:
-                            fprange[element][i][1] = ridge
-    for key, value in fprange.items():
-        fprange[key] = value
-    return fprange
+    statistics = calculate_fingerprints_statistics(fp, images)
+    return {element: [[float(low), float(high)]
+                      for low, high in zip(s['min'], s['max'])]
+            for element, s in statistics.items()}
+
+
+def select_references(references, hashes):
+    """Returns the reference arrays made by LossFunction.cache_references for
+    some of the images, in the form of the full ones.
+
+    Parameters
+    ----------
+    references : dict
+        Reference arrays of all images, as made by cache_references.
+    hashes : list
+        Hashes of the images to select, in the order of the references.
+
+    Returns
+    -------
+    dict
+        Reference arrays of the selected images.
+    """
+    positions = np.array([references['positions'][hash] for hash in hashes],
+                         dtype=int)
+    natoms = references['natoms'][positions]
+    selected = {
+        'images': None,
+        'hashes': list(hashes),
+        'positions': {hash: position for position, hash in enumerate(hashes)},
+        'natoms': natoms,
+        'energies': references['energies'][positions],
+        'offsets': np.concatenate(([0], np.cumsum(natoms))),
+        'atomimages': np.repeat(np.arange(len(hashes)), natoms),
+        'forces': None}
+    if references['forces'] is not None:
+        offsets = references['offsets']
+        selected['forces'] = references['forces'][np.concatenate(
+            [np.arange(offsets[position], offsets[position + 1])
+             for position in positions] + [np.zeros(0, dtype=int)])]
+    return selected
 
 
 def ravel_data(train_forces,
                mode,
                images,
                fingerprints,
-               fingerprintprimes,):
+               fingerprintprimes,
+               filename=None,):
     """
-    Reshapes data of images into lists.
+    Reshapes data of images into arrays.
+
+    Each image's fingerprints and fingerprint derivatives are read once,
+    grouped by element, and copied into arrays allocated once their sizes
+    are known; the fingerprints are padded with zeros to the longest
+    fingerprint, and the neighbors of each atom are found from one pass over
+    the keys of its image's fingerprint derivatives.
 
     Parameters
     ---------
@@ -924,113 +1158,246 @@ def ravel_data(train_forces,
     fingerprintprimes : dict
         Dictionary with images hashs as keys and the corresponding fingerprint
         derivatives as values.
+    filename : str
+        Name of a numpy .npz file in which the raveled data are kept. If it
+        holds those of the same images (in the same order), they are loaded
+        from it instead of being raveled again; otherwise they are saved to
+        it.
     """
-    from ase.data import atomic_numbers
-
-    actual_energies = [image.get_potential_energy(apply_constraint=False)
-                       for image in images.values()]
+    hashes = list(images.keys())
+    if filename is not None:
+        value = load_raveled_data(filename, train_forces, mode, hashes)
+        if value is not None:
+            return value
+
+    actual_energies = np.array(
+        [images[hash].get_potential_energy(apply_constraint=False)
+         for hash in hashes])
+    num_images_atoms = np.array([len(images[hash]) for hash in hashes],
+                                dtype=int)
+    offsets = np.concatenate(([0], np.cumsum(num_images_atoms)))
+    total_atoms = offsets[-1]
+    data = {'actual_energies': actual_energies}
 
     if mode == 'atom-centered':
-        num_images_atoms = [len(image) for image in images.values()]
-        atomic_numbers = [atomic_numbers[atom.symbol]
-                          for image in images.values() for atom in image]
-
-        def ravel_fingerprints(images,
-                               fingerprints):
-            """
-            Reshape fingerprints of images into a list.
-            """
-            raveled_fingerprints = []
-            elements = []
-            for hash, image in images.items():
-                for index in range(len(image)):
-                    elements += [fingerprints[hash][index][0]]
-                    raveled_fingerprints += [fingerprints[hash][index][1]]
-            elements = sorted(set(elements))
-            # Could also work without images:
-#            raveled_fingerprints = [afp
-#                    for hash, value in fingerprints.items()
-#                    for (element, afp) in value]
-            return elements, raveled_fingerprints
-
-        elements, raveled_fingerprints = ravel_fingerprints(images,
-                                                            fingerprints)
+        atomic_numbers = np.concatenate(
+            [images[hash].numbers for hash in hashes]).astype(int)
+        # The fingerprints of the atoms of each element of an image are
+        # stacked as they are read, and copied once their length is known.
+        imagesrows = []
+        length = 0
+        for hash, offset in zip(hashes, offsets):
+            rows = OrderedDict()
+            for index, (element, afp) in enumerate(fingerprints[hash]):
+                rows.setdefault(element, ([], []))
+                rows[element][0].append(offset + index)
+                rows[element][1].append(afp)
+            for element, (indices, afps) in rows.items():
+                rows[element] = (indices, np.array(afps, dtype=float,
+                                                   ndmin=2))
+                length = max(length, rows[element][1].shape[1])
+            imagesrows.append(rows)
+        raveled_fingerprints = np.zeros((total_atoms, length))
+        elements = set()
+        for rows in imagesrows:
+            for element, (indices, afps) in rows.items():
+                raveled_fingerprints[indices, :afps.shape[1]] = afps
+                elements.add(element)
+        del imagesrows
+        elements = sorted(elements)
+        data.update({'elements': np.array(elements),
+                     'num_images_atoms': num_images_atoms,
+                     'atomic_numbers': atomic_numbers,
+                     'raveled_fingerprints': raveled_fingerprints})
     else:
-        atomic_positions = [image.positions.ravel()
-                            for image in images.values()]
+        data['atomic_positions'] = np.array(
+            [images[hash].positions.ravel() for hash in hashes])
 
     if train_forces is True:
-
-        actual_forces = \
-            [image.get_forces(apply_constraint=False)[index]
-             for image in images.values() for index in range(len(image))]
+        actual_forces = np.zeros((total_atoms, 3))
+        for hash, offset, natoms in zip(hashes, offsets, num_images_atoms):
+            actual_forces[offset:offset + natoms] = \
+                images[hash].get_forces(apply_constraint=False)
+        data['actual_forces'] = actual_forces
 
         if mode == 'atom-centered':
+            # Only neighboring atoms of type II (within the main cell)
+            # need to be sent to fortran for force training.
+            # All keys in fingerprintprimes are for type II neighborhoods.
+            # Also note that each atom is considered as neighbor of
+            # itself in fingerprintprimes.
+            # The neighbors of each atom are in the order of the keys with
+            # direction 0, each taking a row for each of the three
+            # directions; the rows of all images are numbered before the
+            # derivatives are copied.
+            num_neighbors = np.zeros(total_atoms, dtype=int)
+            raveled_neighborlists = []
+            imagesrows = []
+            row = 0
+            for hash, offset, natoms in zip(hashes, offsets,
+                                            num_images_atoms):
+                primes = fingerprintprimes[hash]
+                neighbors = [[] for _ in range(natoms)]
+                for key in primes.keys():
+                    # key = (selfindex, selfsymbol, nindex, nsymbol, i)
+                    if key[4] == 0:
+                        neighbors[key[0]].append(key)
+                keys = {}
+                for selfindex in range(natoms):
+                    num_neighbors[offset + selfindex] = \
+                        len(neighbors[selfindex])
+                    for key in neighbors[selfindex]:
+                        raveled_neighborlists.append(key[2])
+                        for i in range(3):
+                            keys.setdefault(key[3], ([], []))
+                            keys[key[3]][0].append(row)
+                            keys[key[3]][1].append(key[:4] + (i,))
+                            row += 1
+                imagesrows.append((primes, keys))
+            raveled_fingerprintprimes = \
+                np.zeros((row, data['raveled_fingerprints'].shape[1]))
+            for primes, keys in imagesrows:
+                for nsymbol, (rows, _keys) in keys.items():
+                    derafps = np.array([primes[key] for key in _keys],
+                                       dtype=float, ndmin=2)
+                    raveled_fingerprintprimes[rows, :derafps.shape[1]] = \
+                        derafps
+            del imagesrows
+            data.update({'num_neighbors': num_neighbors,
+                         'raveled_neighborlists':
+                         np.array(raveled_neighborlists, dtype=int),
+                         'raveled_fingerprintprimes':
+                         raveled_fingerprintprimes})
+
+    if filename is not None:
+        save_raveled_data(filename, train_forces, mode, hashes, data)
+    return _raveled_tuple(train_forces, mode, data)
+
+
+def select_raveled_data(train_forces, hashes, value, selected):
+    """Returns the atom-centered data raveled by ravel_data for some of the
+    images, in the form of those of all images.
 
-            def ravel_neighborlists_and_fingerprintprimes(images,
-                                                          fingerprintprimes):
-                """
-                Reshape neighborlists and fingerprintprimes of images into a
-                list and a matrix, respectively.
-                """
-                # Only neighboring atoms of type II (within the main cell)
-                # need to be sent to fortran for force training.
-                # All keys in fingerprintprimes are for type II neighborhoods.
-                # Also note that each atom is considered as neighbor of
-                # itself in fingerprintprimes.
-                num_neighbors = []
-                raveled_neighborlists = []
-                raveled_fingerprintprimes = []
-                for hash, image in images.items():
-                    for atom in image:
-                        selfindex = atom.index
-                        selfsymbol = atom.symbol
-                        selfneighborindices = []
-                        selfneighborsymbols = []
-                        for key, derafp in fingerprintprimes[hash].items():
-                            # key = (selfindex, selfsymbol, nindex, nsymbol, i)
-                            # i runs from 0 to 2. neighbor indices and symbols
-                            # should be added just once.
-                            if key[0] == selfindex and key[4] == 0:
-                                selfneighborindices += [key[2]]
-                                selfneighborsymbols += [key[3]]
-
-                        neighborcount = 0
-                        for nindex, nsymbol in zip(selfneighborindices,
-                                                   selfneighborsymbols):
-                            raveled_neighborlists += [nindex]
-                            neighborcount += 1
-                            for i in range(3):
-                                fpprime = fingerprintprimes[hash][(selfindex,
-                                                                   selfsymbol,
-                                                                   nindex,
-                                                                   nsymbol,
-                                                                   i)]
-                                raveled_fingerprintprimes += [fpprime]
-                        num_neighbors += [neighborcount]
-
-                return (num_neighbors,
-                        raveled_neighborlists,
-                        raveled_fingerprintprimes)
-
-            (num_neighbors,
-             raveled_neighborlists,
-             raveled_fingerprintprimes) = \
-                ravel_neighborlists_and_fingerprintprimes(images,
-                                                          fingerprintprimes)
+    Parameters
+    ----------
+    train_forces : bool
+        Whether the data include those for force training.
+    hashes : list
+        Hashes of the images, in the order of the raveled data.
+    value : tuple
+        Raveled data of all images, as returned by ravel_data.
+    selected : list
+        Hashes of the images to select, in the order of the raveled data.
+
+    Returns
+    -------
+    tuple
+        Raveled data of the selected images.
+    """
+    positions = {hash: position for position, hash in enumerate(hashes)}
+    positions = np.array([positions[hash] for hash in selected], dtype=int)
+    if not train_forces:
+        (actual_energies, elements, num_images_atoms,
+         atomic_numbers, raveled_fingerprints) = value
+    else:
+        (actual_energies, actual_forces, elements, num_images_atoms,
+         atomic_numbers, raveled_fingerprints, num_neighbors,
+         raveled_neighborlists, raveled_fingerprintprimes) = value
+
+    def ranges(offsets):
+        """Indices from offsets[position] to offsets[position + 1] for each
+        selected image."""
+        return np.concatenate(
+            [np.arange(offsets[position], offsets[position + 1])
+             for position in positions] + [np.zeros(0, dtype=int)])
+
+    atomoffsets = np.concatenate(([0], np.cumsum(num_images_atoms)))
+    atoms = ranges(atomoffsets)
+    energies = actual_energies[positions]
+    if not train_forces:
+        return (energies, elements, num_images_atoms[positions],
+                atomic_numbers[atoms], raveled_fingerprints[atoms])
+    neighboroffsets = np.concatenate(([0], np.cumsum(num_neighbors)))
+    neighbors = ranges(neighboroffsets[atomoffsets])
+    rows = (3 * neighbors[:, None] + np.arange(3)).ravel()
+    return (energies, actual_forces[atoms], elements,
+            num_images_atoms[positions], atomic_numbers[atoms],
+            raveled_fingerprints[atoms], num_neighbors[atoms],
+            raveled_neighborlists[neighbors],
+            raveled_fingerprintprimes[rows])
+
+
+def _raveled_tuple(train_forces, mode, data):
+    """Returns the raveled data of the dictionary data as the tuple returned
+    by ravel_data."""
     if mode == 'image-centered':
-        if not train_forces:
-            return (actual_energies, atomic_positions)
-        else:
-            return (actual_energies, actual_forces, atomic_positions)
+        keys = ['actual_energies', 'actual_forces', 'atomic_positions']
     else:
-        if not train_forces:
-            return (actual_energies, elements, num_images_atoms,
-                    atomic_numbers, raveled_fingerprints)
-        else:
-            return (actual_energies, actual_forces, elements, num_images_atoms,
-                    atomic_numbers, raveled_fingerprints, num_neighbors,
-                    raveled_neighborlists, raveled_fingerprintprimes)
+        keys = ['actual_energies', 'actual_forces', 'elements',
+                'num_images_atoms', 'atomic_numbers', 'raveled_fingerprints',
+                'num_neighbors', 'raveled_neighborlists',
+                'raveled_fingerprintprimes']
+    if not train_forces:
+        keys = [key for key in keys if key not in
+                ['actual_forces', 'num_neighbors', 'raveled_neighborlists',
+                 'raveled_fingerprintprimes']]
+    value = [data[key] for key in keys]
+    if 'elements' in keys:
+        value[keys.index('elements')] = \
+            [str(_) for _ in data['elements']]
+    return tuple(value)
+
+
+def save_raveled_data(filename, train_forces, mode, hashes, data):
+    """Saves raveled data, a dictionary of the arrays made by ravel_data for
+    the images of hashes, to the numpy .npz file filename.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.
+    train_forces : bool
+        Whether the data include those for force training.
+    mode : str
+        Can be either 'atom-centered' or 'image-centered'.
+    hashes : list
+        Hashes of the images, in the order of the data.
+    data : dict
+        Arrays of the raveled data, keyed by name.
+    """
+    # Written to another file first, so that an interrupted write leaves
+    # no partial file behind.
+    temporary = filename + '.part.npz'
+    np.savez(temporary, hashes=np.array(hashes), mode=np.array(mode),
+             train_forces=np.array(bool(train_forces)), **data)
+    os.rename(temporary, filename)
+
+
+def load_raveled_data(filename, train_forces, mode, hashes):
+    """Returns the raveled data kept in the numpy .npz file filename, as
+    ravel_data does, if the file exists and holds those of the images of
+    hashes, in the same order, for mode and (if train_forces) for force
+    training, else None.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.
+    train_forces : bool
+        Whether the data for force training are needed.
+    mode : str
+        Can be either 'atom-centered' or 'image-centered'.
+    hashes : list
+        Hashes of the images, in the order of the data.
+    """
+    if not os.path.exists(filename):
+        return None
+    with np.load(filename) as f:
+        if (str(f['mode']) != mode or list(f['hashes']) != list(hashes) or
+                (train_forces and not bool(f['train_forces']))):
+            return None
+        data = {key: f[key] for key in f.files}
+    return _raveled_tuple(train_forces, mode, data)
 
 
 def send_data_to_fortran(_fmodules,
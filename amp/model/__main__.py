@@ -87,6 +87,10 @@ if purpose == 'calculate_loss_function':
                               images=images)
     log('Images, fingerprints, and fingerprintprimes '
         'attached to the loss function.')
+    if not model.fortran and hasattr(model, 'prescale_fingerprints') and \
+            model.parameters.mode == 'atom-centered':
+        model.prescale_fingerprints()
+        log('Fingerprints prescaled.')
     socket.send_pyobj(msg('request', 'args'))
     args = socket.recv_pyobj()
 
@@ -121,10 +125,16 @@ if purpose == 'calculate_loss_function':
 
     while True:
         parameters = subscriber.recv_pyobj()
-        if parameters == '<stop>':
+        if isinstance(parameters, str) and parameters == '<stop>':
             # FIXME/ap: I removed an fmodules.deallocate_variables() call
             # here. Do we need to add this to LossFunction?
             break
+        # Parameters come with the hashes of a batch of images for
+        # mini-batch optimizers.
+        if isinstance(parameters, tuple):
+            parameters, lossfunction.batch = parameters
+        else:
+            lossfunction.batch = None
         output = lossfunction.get_loss(parameters,
                                        lossprime=args['lossprime'])
 
@@ -260,6 +260,10 @@ class NeuralNetwork(Model):
         else:
             log('Initial scalings already present.')
 
+        if p.mode == 'atom-centered' and not self.fortran and \
+                parallel['cores'] == 1:
+            self.prescale_fingerprints()
+
         if only_setup:
             return
 
@@ -351,6 +355,31 @@ class NeuralNetwork(Model):
                 p.scalings = get_initial_scalings(trainingimages, p.activation,
                                                   p.fprange.keys())
 
+    def prescale_fingerprints(self):
+        """Scales the fingerprints of the training images, and their
+        derivatives if forces are trained, to the [-1, 1] range once, as the
+        fingerprint range is fixed during the regression.
+
+        They are kept as PrescaledFingerprints, by image hash, in
+        self.trainingparameters.prescaledfingerprints, where the loss
+        function uses them in place of the fingerprints. The fingerprint
+        derivatives are scaled on their first use.
+        """
+        tp = self.trainingparameters
+        descriptor = tp.descriptor
+        convergence = self.lossfunction.parameters['convergence']
+        # As decided by the loss function on its first call.
+        forcetraining = self.forcetraining and \
+            (convergence['force_rmse'] is not None or
+             convergence['force_maxresid'] is not None)
+        prescaled = {}
+        for hash in tp.images.keys():
+            prescaled[hash] = PrescaledFingerprints(
+                self.parameters,
+                descriptor.fingerprints[hash],
+                descriptor.fingerprintprimes[hash] if forcetraining else None)
+        tp.prescaledfingerprints = prescaled
+
     @property
     def forcetraining(self):
         """Returns true if forcetraining is turned on (as determined by
@@ -381,16 +410,72 @@ class NeuralNetwork(Model):
         p = self.parameters
         if not hasattr(self, 'ravel'):
             self.ravel = Raveler(p.weights, p.scalings)
+        if self._parameters_are_views():
+            return self._vector.copy()
         return self.ravel.to_vector(weights=p.weights, scalings=p.scalings)
 
     @vector.setter
     def vector(self, vector):
+        # The weights and scalings are views into self._vector, so after
+        # the first call setting the vector is a copy into that buffer.
         p = self.parameters
         if not hasattr(self, 'ravel'):
             self.ravel = Raveler(p.weights, p.scalings)
-        weights, scalings = self.ravel.to_dicts(vector)
-        p['weights'] = weights
-        p['scalings'] = scalings
+        if self._parameters_are_views():
+            self._vector[:] = vector
+        else:
+            self._vector = np.array(vector, dtype=float)
+            p['weights'], p['scalings'] = self.ravel.to_views(self._vector)
+            self._views = (p.weights, p.scalings)
+        self._plan = None
+
+    def _parameters_are_views(self):
+        """Returns True if the weights and scalings in the parameters are
+        still the views into self._vector made when the vector was set."""
+        views = getattr(self, '_views', None)
+        p = self.parameters
+        return (views is not None and views[0] is p.weights and
+                views[1] is p.scalings)
+
+    def tostring(self):
+        """Returns an evaluatable representation of the calculator that can
+        be used to re-establish the calculator.
+
+        Weights and scalings that are views into the parameter vector are
+        written as nested lists and floats."""
+        if not self._parameters_are_views():
+            return Model.tostring(self)
+        parameters = Parameters(self.parameters)
+        parameters['weights'] = OrderedDict(
+            (element, OrderedDict((layer, weight.tolist())
+                                  for layer, weight in weights.items()))
+            for element, weights in self.parameters.weights.items())
+        parameters['scalings'] = OrderedDict(
+            (element, OrderedDict((key, float(value))
+                                  for key, value in scalings.items()))
+            for element, scalings in self.parameters.scalings.items())
+        # Make sure numpy prints out enough data.
+        np.set_printoptions(precision=30, threshold=999999999)
+        return parameters.tostring()
+
+    @property
+    def plan(self):
+        """Inference plan (an InferencePlan) used for predictions, built from
+        the current parameters on first use.
+
+        The plan is dropped when the vector is set, and rebuilt when any of
+        the parameters, weights, scalings or fprange objects is replaced.
+        After modifying the weights, scalings or fprange in place, set the
+        vector (or reassign them) so that the plan is rebuilt.
+        """
+        p = self.parameters
+        sources = (p, p.weights, p.scalings, p.fprange)
+        plan = getattr(self, '_plan', None)
+        if plan is None or any(a is not b for a, b in
+                               zip(self._plan_sources, sources)):
+            plan = self._plan = InferencePlan(p)
+            self._plan_sources = sources
+        return plan
 
     def get_loss(self, vector, lossprime):
         """Method to be called by the regression master.
@@ -475,6 +560,70 @@ class NeuralNetwork(Model):
             lossfunction.attach_model(self)  # Allows access to methods.
         self._lossfunction = lossfunction
 
+    def calculate_energy(self, fingerprints):
+        """Calculates the model-predicted energy for an image, based on its
+        fingerprint.
+
+        In atom-centered mode, the fingerprints of all atoms of an element
+        are stacked and passed through the element's network at once, using
+        the inference plan (see the plan attribute); the atomic energies are
+        kept in atom order in self.atomic_energies.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        """
+        if self.parameters.mode != 'atom-centered':
+            return Model.calculate_energy(self, fingerprints)
+        atomic_energies = self.plan.calculate_atomic_energies(fingerprints)
+        self.atomic_energies = [float(_) for _ in atomic_energies]
+        return sum(self.atomic_energies, 0.0)
+
+    def calculate_forces(self, fingerprints, fingerprintprimes):
+        """Calculates the model-predicted forces for an image, based on
+        derivatives of fingerprints.
+
+        In atom-centered mode, the derivatives of the atomic energies with
+        respect to the fingerprints are found for all atoms of each element
+        with one backward pass through the element's network (see
+        calculate_dAtomicEnergies_dFingerprints), and the forces are their
+        contraction with the fingerprint derivatives.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        fingerprintprimes : dict
+            Dictionary of fingerprint derivatives, where the key is
+            a tuple with (index, symbol, neighbor_index, neighbor_symbol,
+            direction).
+        """
+        if self.parameters.mode != 'atom-centered':
+            return Model.calculate_forces(self, fingerprints,
+                                          fingerprintprimes)
+        return self.plan.calculate_forces(fingerprints, fingerprintprimes)
+
+    def calculate_dAtomicEnergies_dFingerprints(self, fingerprints):
+        """Calculates the derivatives of the atomic energies of an image with
+        respect to the (unscaled) fingerprints of their atoms, with one
+        forward and one backward pass through the network of each element.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+
+        Returns
+        -------
+        dict
+            For each element, a tuple of an array mapping the index of each
+            atom of that element to its row, and an array of shape (number
+            of atoms of the element, length of fingerprint) of the
+            derivatives.
+        """
+        return self.plan.calculate_dAtomicEnergies_dFingerprints(fingerprints)
+
     def calculate_atomic_energy(
             self,
             afp,
@@ -596,18 +745,17 @@ class NeuralNetwork(Model):
         """
         p = self.parameters
         scaling = p.scalings[symbol]
-        # W dictionary initiated.
+        # W dictionary initiated, with the bias rows left out.
         W = {}
-        for elm in p.weights:
-            W[elm] = {}
-            weight = p.weights[elm]
-            for _ in range(len(weight)):
-                W[elm][_ + 1] = np.delete(weight[_ + 1], -1, 0)
-        W = W[symbol]
+        weight = p.weights[symbol]
+        for _ in range(len(weight)):
+            W[_ + 1] = np.asarray(weight[_ + 1])[:-1]
 
+        # The derivatives are written in place through views into the
+        # vector that is returned.
         dAtomicEnergy_dParameters = np.zeros(self.ravel.count)
         dAtomicEnergy_dWeights, dAtomicEnergy_dScalings = \
-            self.ravel.to_dicts(dAtomicEnergy_dParameters)
+            self.ravel.to_views(dAtomicEnergy_dParameters)
 
         outputs = calculate_nodal_outputs(
             self.parameters,
@@ -616,20 +764,97 @@ class NeuralNetwork(Model):
         )
         ohat, D, delta = calculate_ohat_D_delta(self.parameters, outputs, W)
 
-        dAtomicEnergy_dScalings[symbol]['intercept'] = 1.
-        dAtomicEnergy_dScalings[symbol]['slope'] = float(
+        dAtomicEnergy_dScalings[symbol]['intercept'][...] = 1.
+        dAtomicEnergy_dScalings[symbol]['slope'][...] = float(
             outputs[len(outputs) - 1])
         for k in range(1, len(outputs)):
-            dAtomicEnergy_dWeights[symbol][k] = float(scaling['slope']) * \
+            dAtomicEnergy_dWeights[symbol][k][...] = \
+                float(scaling['slope']) * \
                 np.dot(np.array(ohat[k - 1]).T, np.array(delta[k]).T)
 
-        dAtomicEnergy_dParameters = \
-            self.ravel.to_vector(
-                dAtomicEnergy_dWeights, dAtomicEnergy_dScalings)
-
         return dAtomicEnergy_dParameters
 
-    @jit
+    def calculate_dEnergy_dParameters(self, fingerprints):
+        """Calculates a list of floats corresponding to the derivative of
+        model-predicted energy of an image with respect to model parameters.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        """
+        if self.parameters.mode != 'atom-centered':
+            return Model.calculate_dEnergy_dParameters(self, fingerprints)
+        return self.calculate_dEnergies_dParameters([fingerprints], [1.])
+
+    def calculate_dEnergies_dParameters(self, imagesfingerprints,
+                                        coefficients):
+        """Returns the sum over images of the derivatives of the energies
+        with respect to the parameters, each multiplied by the coefficient of
+        its image, as a vector ordered as self.vector.
+
+        The atoms of each element from all of the images are passed forward
+        and backward through the element's network together, as
+        matrix-matrix products; the coefficient of an image, such as its
+        energy residual weight in the loss function, multiplies the error
+        signal of each of its atoms.
+
+        Parameters
+        ----------
+        imagesfingerprints : list
+            List of the fingerprints of each image, which are lists of
+            fingerprints, one per atom.
+        coefficients : list of float
+            Coefficient of each image.
+
+        Returns
+        -------
+        numpy.ndarray
+            Weighted sum of the derivatives of the energies with respect to
+            the parameters.
+        """
+        p = self.parameters
+        if not hasattr(self, 'ravel'):
+            self.ravel = Raveler(p.weights, p.scalings)
+        afps = OrderedDict()
+        atomcoefficients = OrderedDict()
+        for fingerprints, coefficient in zip(imagesfingerprints,
+                                             coefficients):
+            for symbol, (indices, _afps) in \
+                    self._scale_fingerprints(fingerprints).items():
+                afps.setdefault(symbol, []).append(_afps)
+                atomcoefficients.setdefault(symbol, []).append(
+                    np.full(len(indices), coefficient, dtype=float))
+
+        offsets = {}
+        for k in self.ravel.weightskeys + self.ravel.scalingskeys:
+            offsets[(k['key1'], k['key2'])] = k['offset']
+        dEnergies_dParameters = np.zeros(self.ravel.count)
+        for symbol, _afps in afps.items():
+            outputs = calculate_nodal_outputs(p, np.concatenate(_afps),
+                                              symbol, prescaled=True)
+            c = np.concatenate(atomcoefficients[symbol])[:, None]
+            N = len(outputs) - 1  # output layer
+            dEnergies_dParameters[offsets[(symbol, 'intercept')]] = c.sum()
+            dEnergies_dParameters[offsets[(symbol, 'slope')]] = \
+                np.sum(c * outputs[N])
+            weight = p.weights[symbol]
+            # Error signal of each node, backpropagated from the output node.
+            delta = p.scalings[symbol]['slope'] * c
+            ones = np.ones((len(c), 1))
+            for layer in range(N, 0, -1):
+                if p.activation == 'tanh':
+                    delta = delta * (1. - outputs[layer] ** 2)
+                elif p.activation == 'sigmoid':
+                    delta = delta * outputs[layer] * (1. - outputs[layer])
+                ohat = np.concatenate((outputs[layer - 1], ones), axis=1)
+                dWeight = np.dot(ohat.T, delta)
+                offset = offsets[(symbol, layer)]
+                dEnergies_dParameters[offset:offset + dWeight.size] = \
+                    dWeight.ravel()
+                delta = np.dot(delta, np.asarray(weight[layer])[:-1].T)
+        return dEnergies_dParameters
+
     def calculate_dForce_dParameters(
             self,
             afp,
@@ -652,7 +877,7 @@ class NeuralNetwork(Model):
         direction : int
             Direction of force.
         nindex : int
-            Index of the atom at which force is acting.  (only used in            
+            Index of the atom at which force is acting.  (only used in
             the atom-centered mode)
         nsymbol : str
             Symbol of the atom at which force is acting.  (only used
@@ -665,191 +890,241 @@ class NeuralNetwork(Model):
             variables.
         """
         p = self.parameters
-        scaling = p.scalings[nsymbol]
-        activation = p.activation
-        # W dictionary initiated.
-        W = {}
-        for elm in p.weights.keys():
-            W[elm] = {}
-            weight = p.weights[elm]
-            for _ in range(len(weight)):
-                W[elm][_ + 1] = np.delete(weight[_ + 1], -1, 0)
-        W = W[nsymbol]
-
+        if not hasattr(self, 'ravel'):
+            self.ravel = Raveler(p.weights, p.scalings)
+        outputs = calculate_nodal_outputs(p, afp, nsymbol)
+        dInputs = scale_fingerprintprimes(p, [derafp], nsymbol)
+        dOutput_dInputs, dOutput_dInputs_dWeights = \
+            calculate_dOutput_dInputs_dWeights(p, outputs, dInputs, nsymbol)
         dForce_dParameters = np.zeros(self.ravel.count)
+        self._add_dForce_dParameters(dForce_dParameters, nsymbol,
+                                     dOutput_dInputs.sum(),
+                                     dOutput_dInputs_dWeights)
+        return dForce_dParameters
 
-        dForce_dWeights, dForce_dScalings = \
-            self.ravel.to_dicts(dForce_dParameters)
+    def calculate_dForces_dParameters(self, fingerprints, fingerprintprimes):
+        """Calculates an array of floats corresponding to the derivative of
+        model-predicted atomic forces of an image with respect to model
+        parameters.
 
-        outputs = calculate_nodal_outputs(
-            self.parameters,
-            afp,
-            nsymbol,
-        )
-        ohat, D, delta = calculate_ohat_D_delta(self.parameters, outputs, W)
-        dOutputs_dInputs = calculate_dOutputs_dInputs(
-            self.parameters,
-            derafp,
-            outputs,
-            nsymbol,
-        )
+        In atom-centered mode, all fingerprint derivatives of the image whose
+        neighbor is of the same element are handled together, as array
+        operations (see calculate_dOutput_dInputs_dWeights).
 
-        N = len(outputs) - 2
-        dD_dInputs = {}
-        for k in range(1, N + 2):
-            # Calculating coordinate derivative of D matrix
-            dD_dInputs[k] = np.zeros(
-                shape=(np.size(outputs[k]), np.size(outputs[k])))
-            for j in range(np.size(outputs[k])):
-                if activation == 'linear':  # linear
-                    dD_dInputs[k][j, j] = 0.
-                elif activation == 'tanh':  # tanh
-                    dD_dInputs[k][j, j] = \
-                        - 2. * outputs[k][0, j] * dOutputs_dInputs[k][j]
-                elif activation == 'sigmoid':  # sigmoid
-                    dD_dInputs[k][j, j] = dOutputs_dInputs[k][j] - \
-                        2. * outputs[k][0, j] * dOutputs_dInputs[k][j]
-        # Calculating coordinate derivative of delta
-        dDelta_dInputs = {}
-        # output layer
-        dDelta_dInputs[N + 1] = dD_dInputs[N + 1]
-        # hidden layers
-        temp1 = {}
-        temp2 = {}
-        for k in range(N, 0, -1):
-            temp1[k] = np.dot(W[k + 1], delta[k + 1])
-            temp2[k] = np.dot(W[k + 1], dDelta_dInputs[k + 1])
-            dDelta_dInputs[k] = \
-                np.dot(dD_dInputs[k], temp1[k]) + np.dot(D[k], temp2[k])
-        # Calculating coordinate derivative of ohat and
-        # coordinates weights derivative of atomic_output
-        dOhat_dInputs = {}
-        dOutput_dInputsdWeights = {}
-        for k in range(1, N + 2):
-            dOhat_dInputs[k - 1] = [None] * (1 + len(dOutputs_dInputs[k - 1]))
-            bound = len(dOutputs_dInputs[k - 1])
-            for count in range(bound):
-                dOhat_dInputs[k - 1][count] = dOutputs_dInputs[k - 1][count]
-            dOhat_dInputs[k - 1][count + 1] = 0.
-            dOutput_dInputsdWeights[k] = \
-                np.dot(np.array(dOhat_dInputs[k - 1]).T,
-                       np.array(delta[k]).T) + \
-                np.dot(np.array(ohat[k - 1]).T,
-                       np.array(dDelta_dInputs[k]).T)
-
-        for k in range(1, N + 2):
-            dForce_dWeights[nsymbol][k] = float(scaling['slope']) * \
-                dOutput_dInputsdWeights[k]
-        dForce_dScalings[nsymbol]['slope'] = dOutputs_dInputs[N + 1][0]
-        dForce_dParameters = self.ravel.to_vector(dForce_dWeights,
-                                                  dForce_dScalings)
-        # force is multiplied by -1, because it is -dE/dx and not dE/dx.
-        dForce_dParameters *= -1.
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        fingerprintprimes : dict
+            Dictionary of fingerprint derivatives, where the key is
+            a tuple with (index, symbol, neighbor_index, neighbor_symbol,
+            direction).
+        """
+        if self.parameters.mode != 'atom-centered':
+            return Model.calculate_dForces_dParameters(self, fingerprints,
+                                                       fingerprintprimes)
+        p = self.parameters
+        if not hasattr(self, 'ravel'):
+            self.ravel = Raveler(p.weights, p.scalings)
+        dForces_dParameters = np.zeros((len(fingerprints), 3,
+                                        self.ravel.count))
+        forceindices = set()
+        for (nsymbol, outputs, selfindices, nindices, directions,
+             dInputs) in self._stack_fingerprintprimes(fingerprints,
+                                                       fingerprintprimes):
+            keyoutputs = {layer: o[nindices] for layer, o in outputs.items()}
+            dOutput_dInputs, dOutput_dInputs_dWeights = \
+                calculate_dOutput_dInputs_dWeights(p, keyoutputs, dInputs,
+                                                   nsymbol, rowwise=True)
+            self._add_dForce_dParameters(
+                dForces_dParameters, nsymbol, dOutput_dInputs[:, 0],
+                dOutput_dInputs_dWeights, (selfindices, directions))
+            forceindices.update(selfindices.tolist())
+        return {(selfindex, i): dForces_dParameters[selfindex, i]
+                for selfindex in forceindices for i in range(3)}
+
+    def calculate_weighted_dForces_dParameters(self, fingerprints,
+                                               fingerprintprimes,
+                                               coefficients):
+        """Returns the sum of the derivatives of the forces of an image with
+        respect to the parameters, each multiplied by a coefficient, such as
+        its force residual weight in the loss function, as a vector ordered
+        as self.vector.
+
+        As the derivative of the network output along a fingerprint
+        derivative is linear in the fingerprint derivative, the weighted
+        fingerprint derivatives about each atom are summed first, so the
+        network of each element is passed forward and backward once for
+        its atoms, whatever the number of fingerprint derivatives.
 
-        return dForce_dParameters
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        fingerprintprimes : dict
+            Dictionary of fingerprint derivatives, where the key is
+            a tuple with (index, symbol, neighbor_index, neighbor_symbol,
+            direction).
+        coefficients : array
+            Coefficient of each force component, of shape (number of atoms,
+            3).
+
+        Returns
+        -------
+        numpy.ndarray
+            Weighted sum of the derivatives of the forces with respect to the
+            parameters.
+        """
+        p = self.parameters
+        if not hasattr(self, 'ravel'):
+            self.ravel = Raveler(p.weights, p.scalings)
+        coefficients = np.asarray(coefficients, dtype=float)
+        dForces_dParameters = np.zeros(self.ravel.count)
+        for (nsymbol, outputs, selfindices, nindices, directions,
+             dInputs) in self._stack_fingerprintprimes(fingerprints,
+                                                       fingerprintprimes):
+            weighted = np.zeros((len(outputs[0]), dInputs.shape[1]))
+            np.add.at(weighted, nindices,
+                      coefficients[selfindices, directions][:, None] *
+                      dInputs)
+            dOutput_dInputs, dOutput_dInputs_dWeights = \
+                calculate_dOutput_dInputs_dWeights(p, outputs, weighted,
+                                                   nsymbol)
+            self._add_dForce_dParameters(dForces_dParameters, nsymbol,
+                                         dOutput_dInputs.sum(),
+                                         dOutput_dInputs_dWeights)
+        return dForces_dParameters
+
+    def _scale_fingerprints(self, fingerprints):
+        """Returns an ordered dictionary with, for each element of an image,
+        the indices of its atoms and their fingerprints scaled to the
+        [-1, 1] range, stacked as an array. PrescaledFingerprints are
+        checked against the fingerprint range and used as they are."""
+        p = self.parameters
+        if isinstance(fingerprints, PrescaledFingerprints):
+            fingerprints.check(p.fprange)
+            return OrderedDict((symbol, (indices, fingerprints.afps[symbol]))
+                               for symbol, indices
+                               in fingerprints.indices.items())
+        return OrderedDict(
+            (symbol, (indices, scale_fingerprints(
+                p, [fingerprints[index][1] for index in indices], symbol)))
+            for symbol, indices in group_by_symbol(fingerprints).items())
+
+    def _stack_fingerprintprimes(self, fingerprints, fingerprintprimes):
+        """Groups the fingerprint derivatives of an image by the element of
+        the neighbor, yielding for each element its symbol, the nodal
+        outputs of its atoms, and for each fingerprint derivative the index
+        of the atom the force acts on, the row of the neighbor among the
+        atoms of the element, the direction and the scaled derivative."""
+        p = self.parameters
+        scaled = self._scale_fingerprints(fingerprints)
+        if isinstance(fingerprints, PrescaledFingerprints):
+            stacked = fingerprints.fingerprintprimes
+        else:
+            stacked = stack_fingerprintprimes(
+                p, OrderedDict((symbol, indices) for symbol, (indices, _)
+                               in scaled.items()), fingerprintprimes)
+        for nsymbol, selfindices, nrows, directions, dInputs in stacked:
+            outputs = calculate_nodal_outputs(p, scaled[nsymbol][1], nsymbol,
+                                              prescaled=True)
+            yield (nsymbol, outputs, selfindices, nrows, directions, dInputs)
+
+    def _add_dForce_dParameters(self, dForces_dParameters, nsymbol,
+                                dOutput_dInputs, dOutput_dInputs_dWeights,
+                                index=()):
+        """Adds the derivatives of the (minus) network output along the
+        fingerprint derivatives with respect to the weights and the slope
+        of element nsymbol at the offsets of the last axis of
+        dForces_dParameters; index selects the leading axes to add to."""
+        slope = self.parameters.scalings[nsymbol]['slope']
+        for k in self.ravel.weightskeys:
+            if k['key1'] != nsymbol:
+                continue
+            dWeight = dOutput_dInputs_dWeights[k['key2']]
+            dWeight = dWeight.reshape(dWeight.shape[:-2] + (k['size'],))
+            # Force is multiplied by -1, because it is -dE/dx and not dE/dx.
+            np.add.at(dForces_dParameters[...,
+                                          k['offset']:k['offset'] + k['size']],
+                      index, -slope * dWeight)
+        for k in self.ravel.scalingskeys:
+            if k['key1'] == nsymbol and k['key2'] == 'slope':
+                np.add.at(dForces_dParameters[..., k['offset']], index,
+                          -dOutput_dInputs)
 
 
 # Auxiliary functions #########################################################
 
 
+def group_by_symbol(fingerprints):
+    """Returns an ordered dictionary of the indices of the atoms of each
+    element, in order of first appearance, from the fingerprints of an
+    image."""
+    indices = OrderedDict()
+    for index, (symbol, afp) in enumerate(fingerprints):
+        indices.setdefault(symbol, []).append(index)
+    return indices
+
+
 def calculate_nodal_outputs(
         parameters,
         afp,
         symbol,
+        prescaled=False,
 ):
     """
     Given input to the neural network, output (which corresponds to energy)
     is calculated about the specified atom. The sum of these for all
     atoms is the total energy (in atom-centered mode).
 
+    Several atoms of the same element can be passed through the network at
+    once by giving their fingerprints as the rows of a two-dimensional afp;
+    the nodal outputs then have one row per atom.
+
     Parameters
     ----------
     parameters : dict
         ASE dictionary object.
     afp : list
         Atomic fingerprints in the form of a list to be used as input to the
-        neural network.
+        neural network, or a list of such lists, one per atom.
     symbol : str
         Symbol of the atom for which atomic energy is calculated (only used in
         the atom-centered mode)
+    prescaled : bool
+        If True, afp is already scaled to the [-1, 1] range (e.g., by
+        scale_fingerprints) and is used as is.
 
     Returns
     -------
     dict
-        Outputs of neural network nodes
+        Outputs of neural network nodes, as arrays of shape (number of atoms,
+        number of nodes).
     """
 
-    _afp = np.array(afp).copy()
+    if prescaled:
+        _afp = np.asarray(afp)
+    else:
+        _afp = scale_fingerprints(parameters, afp, symbol)
     hiddenlayers = parameters.hiddenlayers[symbol]
     weight = parameters.weights[symbol]
     activation = parameters.activation
 
-    fprange = parameters.fprange[symbol]
-    # Scale the fingerprints to be in [-1, 1] range.
-    for _ in range(np.shape(_afp)[0]):
-        if (fprange[_][1] - fprange[_][0]) > (10.**(-8.)):
-            _afp[_] = -1.0 + 2.0 * (
-                (_afp[_] - fprange[_][0]) / (fprange[_][1] - fprange[_][0]))
-
     # Calculate node values.
     o = {}  # node values
-    layer = 1  # input layer
-    net = {}  # excitation
-    ohat = {}  # ohat is the nodal output matrix o concatenated by 1 for biases
-
-    len_of_afp = len(_afp)
-    # a temp variable is defined to construct the output matix o
-    temp = np.zeros((1, len_of_afp + 1))
-    for _ in range(len_of_afp):
-        temp[0, _] = _afp[_]
-    temp[0, len(_afp)] = 1.0
-    ohat[0] = temp
-    net[1] = np.dot(ohat[0], weight[1])
-    if activation == 'linear':
-        o[1] = net[1]  # linear activation
-    elif activation == 'tanh':
-        o[1] = np.tanh(net[1])  # tanh activation
-    elif activation == 'sigmoid':  # sigmoid activation
-        o[1] = 1. / (1. + np.exp(-net[1]))
-    temp = np.zeros((1, np.shape(o[1])[1] + 1))
-    bound = np.shape(o[1])[1]
-    for _ in range(bound):
-        temp[0, _] = o[1][0, _]
-    temp[0, np.shape(o[1])[1]] = 1.0
-    ohat[1] = temp
-    for hiddenlayer in hiddenlayers[1:]:
-        layer += 1
-        net[layer] = np.dot(ohat[layer - 1], weight[layer])
+    o[0] = _afp
+    # ohat is the nodal output matrix o concatenated by 1 for biases
+    ones = np.ones((len(_afp), 1))
+    for layer in range(1, len(hiddenlayers) + 2):
+        ohat = np.concatenate((o[layer - 1], ones), axis=1)
+        net = np.dot(ohat, np.asarray(weight[layer]))  # excitation
         if activation == 'linear':
-            o[layer] = net[layer]  # linear activation
+            o[layer] = net  # linear activation
         elif activation == 'tanh':
-            o[layer] = np.tanh(net[layer])  # tanh activation
+            o[layer] = np.tanh(net)  # tanh activation
         elif activation == 'sigmoid':
             # sigmoid activation
-            o[layer] = 1. / (1. + np.exp(-net[layer]))
-        temp = np.zeros((1, np.size(o[layer]) + 1))
-        bound = np.size(o[layer])
-        for _ in range(bound):
-            temp[0, _] = o[layer][0, _]
-        temp[0, np.size(o[layer])] = 1.0
-        ohat[layer] = temp
-    layer += 1  # output layer
-    net[layer] = np.dot(ohat[layer - 1], weight[layer])
-    if activation == 'linear':
-        o[layer] = net[layer]  # linear activation
-    elif activation == 'tanh':
-        o[layer] = np.tanh(net[layer])  # tanh activation
-    elif activation == 'sigmoid':
-        # sigmoid activation
-        o[layer] = 1. / (1. + np.exp(-net[layer]))
-
-    del hiddenlayers, weight, ohat, net
-
-    len_of_afp = len(_afp)
-    temp = np.zeros((1, len_of_afp))
-    for _ in range(len_of_afp):
-        temp[0, _] = _afp[_]
-    o[0] = temp
+            o[layer] = 1. / (1. + np.exp(-net))
 
     return o
 
@@ -884,25 +1159,20 @@ def calculate_dOutputs_dInputs(
         Derivatives of outputs of neural network nodes w.r.t.  inputs.
     """
 
-    _derafp = np.array(derafp).copy()
+    # Scaling derivative of fingerprints.
+    _derafp = scale_fingerprintprimes(parameters, [derafp], nsymbol)[0]
     hiddenlayers = parameters.hiddenlayers[nsymbol]
     weight = parameters.weights[nsymbol]
     activation = parameters.activation
 
-    fprange = parameters.fprange[nsymbol]
-    # Scaling derivative of fingerprints.
-    for _ in range(len(_derafp)):
-        if (fprange[_][1] - fprange[_][0]) > (10.**(-8.)):
-            _derafp[_] = 2.0 * (_derafp[_] / (fprange[_][1] - fprange[_][0]))
-
     dOutputs_dInputs = {}  # node values
     dOutputs_dInputs[0] = _derafp
     layer = 0  # input layer
     for hiddenlayer in hiddenlayers[0:]:
         layer += 1
-        temp = np.dot(
+        temp = np.atleast_2d(np.dot(
             np.array(dOutputs_dInputs[layer - 1]),
-            np.delete(weight[layer], -1, 0))
+            np.delete(weight[layer], -1, 0)))
         dOutputs_dInputs[layer] = [None] * np.size(outputs[layer])
         bound = np.size(outputs[layer])
         for j in range(bound):
@@ -983,6 +1253,188 @@ def calculate_ohat_D_delta(parameters, outputs, W):
     return ohat, D, delta
 
 
+def scale_fingerprints(parameters, afps, symbol):
+    """
+    Scales fingerprints to the [-1, 1] range with the fingerprint range of
+    their element, leaving components whose range has no width unscaled.
+
+    Parameters
+    ----------
+    parameters : dict
+        ASE dictionary object.
+    afps : list
+        Atomic fingerprints, a list or a list of lists, one per atom.
+    symbol : str
+        Symbol of the atoms.
+
+    Returns
+    -------
+    array
+        Scaled fingerprints, one row per atom.
+    """
+    _afps = np.array(afps, dtype=float, ndmin=2)
+    fprange = np.array(parameters.fprange[symbol], dtype=float)
+    if len(fprange) > 0:
+        width = fprange[:, 1] - fprange[:, 0]
+        scaled = width > (10.**(-8.))
+        _afps[:, scaled] = -1.0 + 2.0 * (
+            (_afps[:, scaled] - fprange[scaled, 0]) / width[scaled])
+    return _afps
+
+
+def scale_fingerprintprimes(parameters, derafps, symbol):
+    """
+    Scales derivatives of fingerprints as the fingerprints are scaled to the
+    [-1, 1] range before entering the neural network.
+
+    Parameters
+    ----------
+    parameters : dict
+        ASE dictionary object.
+    derafps : list
+        Derivatives of atomic fingerprints, one list per row.
+    symbol : str
+        Symbol of the atoms whose fingerprints are differentiated.
+
+    Returns
+    -------
+    array
+        Scaled derivatives, one row per derivative.
+    """
+    _derafps = np.array(derafps, dtype=float, ndmin=2)
+    fprange = np.array(parameters.fprange[symbol], dtype=float)
+    if len(fprange) > 0:
+        width = fprange[:, 1] - fprange[:, 0]
+        scaled = width > (10.**(-8.))
+        _derafps[:, scaled] *= 2.0 / width[scaled]
+    return _derafps
+
+
+def stack_fingerprintprimes(parameters, indices, fingerprintprimes):
+    """
+    Groups the fingerprint derivatives of an image by the element of the
+    neighbor and stacks them, scaled, as arrays.
+
+    Parameters
+    ----------
+    parameters : dict
+        ASE dictionary object.
+    indices : dict
+        Indices of the atoms of each element of the image, as returned by
+        group_by_symbol.
+    fingerprintprimes : dict
+        Dictionary of fingerprint derivatives, where the key is
+        a tuple with (index, symbol, neighbor_index, neighbor_symbol,
+        direction).
+
+    Returns
+    -------
+    list
+        For each element of the neighbors, a tuple of its symbol and, for
+        each fingerprint derivative, arrays of the index of the atom the
+        force acts on, the row of the neighbor among the atoms of the
+        element, the direction, and the scaled derivative.
+    """
+    natoms = sum(len(_) for _ in indices.values())
+    keys = OrderedDict()
+    for key in fingerprintprimes.keys():
+        keys.setdefault(key[3], []).append(key)
+    stacked = []
+    for nsymbol, _keys in keys.items():
+        rows = np.zeros(natoms, dtype=int)
+        rows[indices[nsymbol]] = np.arange(len(indices[nsymbol]))
+        selfindices, nindices, directions = \
+            np.array([(key[0], key[2], key[4]) for key in _keys]).T
+        dInputs = scale_fingerprintprimes(
+            parameters, [fingerprintprimes[key] for key in _keys], nsymbol)
+        stacked.append((nsymbol, selfindices, rows[nindices], directions,
+                        dInputs))
+    return stacked
+
+
+def calculate_dOutput_dInputs_dWeights(parameters, outputs, dInputs, symbol,
+                                       rowwise=False):
+    """
+    Calculates the derivative of the output node along given directions in
+    the (scaled) input space, for several atoms of the same element at once,
+    together with the derivative of that quantity with respect to the weights
+    of the network.
+
+    The directional derivatives are propagated forward through the network
+    along with the nodal outputs, and then backpropagated, together with the
+    nodal outputs, to the weights.
+
+    Parameters
+    ----------
+    parameters : dict
+        ASE dictionary object.
+    outputs : dict
+        Outputs of neural network nodes, as arrays of shape (number of rows,
+        number of nodes), as returned by calculate_nodal_outputs.
+    dInputs : array
+        Directions in the scaled input space, one row per row of outputs.
+    symbol : str
+        Symbol of the atoms.
+    rowwise : bool
+        If True, the derivatives with respect to the weights are returned for
+        each row separately, else summed over the rows.
+
+    Returns
+    -------
+    dOutput_dInputs : array
+        Derivative of the output node along each direction, of shape (number
+        of rows, 1).
+    dOutput_dInputs_dWeights : dict
+        Derivatives with respect to the weights of each layer, with the shape
+        of the weights, preceded by the number of rows if rowwise.
+    """
+    weight = parameters.weights[symbol]
+    activation = parameters.activation
+    N = len(outputs) - 1  # output layer
+
+    def derivatives(o):
+        """Derivative of the activation, and its derivative with respect
+        to the nodal output, in terms of the nodal output."""
+        if activation == 'tanh':
+            return 1. - o ** 2, -2. * o
+        elif activation == 'sigmoid':
+            return o * (1. - o), 1. - 2. * o
+        return np.ones_like(o), np.zeros_like(o)
+
+    # Forward-mode through the network: t are the directional derivatives
+    # of the nodal outputs, s those of the excitations.
+    W, t, s = {}, {}, {}
+    t[0] = np.array(dInputs, dtype=float, ndmin=2)
+    for layer in range(1, N + 1):
+        W[layer] = np.asarray(weight[layer])
+        s[layer] = np.dot(t[layer - 1], W[layer][:-1])
+        t[layer] = derivatives(outputs[layer])[0] * s[layer]
+
+    # Reverse-mode back to the weights, for t[N] as a function of both the
+    # nodal outputs and their directional derivatives.
+    ones = np.ones((len(t[0]), 1))
+    tbar = ones
+    obar = np.zeros_like(outputs[N])
+    dOutput_dInputs_dWeights = {}
+    for layer in range(N, 0, -1):
+        fprime, dfprime = derivatives(outputs[layer])
+        sbar = tbar * fprime
+        obar = obar + tbar * s[layer] * dfprime
+        netbar = obar * fprime
+        ohat = np.concatenate((outputs[layer - 1], ones), axis=1)
+        that = np.concatenate((t[layer - 1], 0. * ones), axis=1)
+        if rowwise:
+            dOutput_dInputs_dWeights[layer] = \
+                np.einsum('ri,rj->rij', ohat, netbar) + \
+                np.einsum('ri,rj->rij', that, sbar)
+        else:
+            dOutput_dInputs_dWeights[layer] = \
+                np.dot(ohat.T, netbar) + np.dot(that.T, sbar)
+        obar = np.dot(netbar, W[layer][:-1].T)
+        tbar = np.dot(sbar, W[layer][:-1].T)
+    return t[N], dOutput_dInputs_dWeights
+
+
 def get_random_weights(hiddenlayers,
                        activation,
                        len_of_fps=None,
@@ -1239,12 +1691,14 @@ class Raveler:
                     'key1': key1,
                     'key2': key2,
                     'shape': np.array(value).shape,
-                    'size': np.array(value).size
+                    'size': np.array(value).size,
+                    'offset': self.count,
                 })
                 self.count += np.array(weights[key1][key2]).size
         for key1 in sorted(scalings.keys()):  # element
             for key2 in sorted(scalings[key1].keys()):  # slope / intercept
-                self.scalingskeys.append({'key1': key1, 'key2': key2})
+                self.scalingskeys.append({'key1': key1, 'key2': key2,
+                                          'offset': self.count})
                 self.count += 1
         self.vector = np.zeros(self.count)
 
@@ -1291,6 +1745,289 @@ class Raveler:
             count += 1
         return weights, scalings
 
+    def to_views(self, vector):
+        """Returns weights and scalings dictionaries of the form initialized,
+        whose values are views into vector rather than copies: the weights
+        as two-dimensional arrays and the scalings as zero-dimensional
+        arrays. Writing to vector changes them, and writing to them in place
+        (e.g., weights[element][layer][...] = value) changes vector. vector
+        must be a float array of the same length as the output of
+        to_vector."""
+
+        assert len(vector) == self.count
+        weights = OrderedDict()
+        scalings = OrderedDict()
+
+        for k in self.weightskeys:
+            if k['key1'] not in weights.keys():
+                weights[k['key1']] = OrderedDict()
+            weights[k['key1']][k['key2']] = \
+                vector[k['offset']:k['offset'] + k['size']].reshape(
+                    k['shape'])
+        for k in self.scalingskeys:
+            if k['key1'] not in scalings.keys():
+                scalings[k['key1']] = OrderedDict()
+            scalings[k['key1']][k['key2']] = \
+                vector[k['offset']:k['offset'] + 1].reshape(())
+        return weights, scalings
+
+
+class InferencePlan:
+    """Frozen form of the parameters of a neural network, for predictions.
+
+    The weights of each element are held as contiguous arrays, with the
+    biases split off, the fingerprint scaling to the [-1, 1] range as a slope
+    and offset per fingerprint component, and the activation function and
+    its derivative chosen once. No data is shared with the parameters it is
+    built from, so the plan must be rebuilt when they change; NeuralNetwork
+    does so through its plan attribute.
+
+    Parameters
+    ----------
+    parameters : dict
+        ASE dictionary object of the NeuralNetwork.
+    """
+
+    def __init__(self, parameters):
+        activation = parameters.activation
+        if activation == 'tanh':
+            self.activate = np.tanh
+            self.derivative = lambda o: 1. - o * o
+        elif activation == 'sigmoid':
+            self.activate = lambda net: 1. / (1. + np.exp(-net))
+            self.derivative = lambda o: o * (1. - o)
+        else:
+            self.activate = None  # linear
+            self.derivative = None
+        self.fprange = parameters.fprange
+        self.networks = {}
+        for symbol, weight in parameters.weights.items():
+            layers = []
+            for layer in sorted(weight.keys()):
+                matrix = np.array(weight[layer], dtype=float, ndmin=2)
+                layers.append((np.ascontiguousarray(matrix[:-1]),
+                               np.ascontiguousarray(matrix[-1])))
+            scale = np.ones(len(layers[0][0]))
+            offset = np.zeros(len(layers[0][0]))
+            fprange = np.array(parameters.fprange[symbol], dtype=float)
+            if len(fprange) > 0:
+                width = fprange[:, 1] - fprange[:, 0]
+                scaled = width > (10.**(-8.))
+                scale[scaled] = 2.0 / width[scaled]
+                offset[scaled] = -1.0 - fprange[scaled, 0] * scale[scaled]
+            scaling = parameters.scalings[symbol]
+            self.networks[symbol] = {'layers': layers,
+                                     'scale': scale,
+                                     'offset': offset,
+                                     'slope': float(scaling['slope']),
+                                     'intercept': float(scaling['intercept'])}
+
+    def calculate_nodal_outputs(self, afps, symbol, prescaled=False):
+        """Returns the outputs of the nodes of each layer of the network of
+        symbol, the first being the scaled fingerprints, as arrays with one
+        row per atom.
+
+        Parameters
+        ----------
+        afps : list
+            Fingerprints of the atoms, all of element symbol.
+        symbol : str
+            Symbol of the atoms.
+        prescaled : bool
+            If True, afps are already scaled to the [-1, 1] range.
+        """
+        network = self.networks[symbol]
+        if prescaled:
+            o = np.asarray(afps)
+        else:
+            o = np.array(afps, dtype=float, ndmin=2)
+            o = o * network['scale'] + network['offset']
+        outputs = [o]
+        for matrix, bias in network['layers']:
+            o = np.dot(o, matrix) + bias
+            if self.activate is not None:
+                o = self.activate(o)
+            outputs.append(o)
+        return outputs
+
+    def calculate_atomic_energies(self, fingerprints):
+        """Returns the atomic energies of an image, in atom order.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        """
+        atomic_energies = np.zeros(len(fingerprints))
+        for symbol, indices, outputs in self._forward(fingerprints):
+            network = self.networks[symbol]
+            atomic_energies[indices] = \
+                network['slope'] * outputs[-1][:, 0] + network['intercept']
+        return atomic_energies
+
+    def _forward(self, fingerprints):
+        """Yields the symbol, the indices of the atoms and the nodal outputs
+        of each element of an image, from its fingerprints or its
+        PrescaledFingerprints."""
+        if isinstance(fingerprints, PrescaledFingerprints):
+            fingerprints.check(self.fprange)
+            for symbol, indices in fingerprints.indices.items():
+                yield symbol, indices, self.calculate_nodal_outputs(
+                    fingerprints.afps[symbol], symbol, prescaled=True)
+        else:
+            for symbol, indices in group_by_symbol(fingerprints).items():
+                yield symbol, indices, self.calculate_nodal_outputs(
+                    [fingerprints[index][1] for index in indices], symbol)
+
+    def _backward(self, symbol, outputs):
+        """Returns the derivatives of the atomic energies with respect to
+        the scaled fingerprints, from the nodal outputs."""
+        network = self.networks[symbol]
+        # Backpropagate from the output node to the inputs.
+        delta = np.full((len(outputs[0]), 1), network['slope'])
+        for layer in range(len(outputs) - 1, 0, -1):
+            if self.derivative is not None:
+                delta = delta * self.derivative(outputs[layer])
+            delta = np.dot(delta, network['layers'][layer - 1][0].T)
+        return delta
+
+    def calculate_dAtomicEnergies_dFingerprints(self, fingerprints):
+        """Calculates the derivatives of the atomic energies of an image with
+        respect to the (unscaled) fingerprints of their atoms, with one
+        forward and one backward pass through the network of each element.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+
+        Returns
+        -------
+        dict
+            For each element, a tuple of an array mapping the index of each
+            atom of that element to its row, and an array of shape (number
+            of atoms of the element, length of fingerprint) of the
+            derivatives.
+        """
+        gradients = {}
+        for symbol, indices, outputs in self._forward(fingerprints):
+            delta = self._backward(symbol, outputs)
+            delta *= self.networks[symbol]['scale']
+            rows = np.zeros(len(fingerprints), dtype=int)
+            rows[indices] = np.arange(len(indices))
+            gradients[symbol] = (rows, delta)
+        return gradients
+
+    def calculate_forces(self, fingerprints, fingerprintprimes):
+        """Returns the forces of an image, contracting the derivatives of the
+        atomic energies with respect to the fingerprints with the
+        fingerprint derivatives.
+
+        Parameters
+        ----------
+        fingerprints : list
+            List of fingerprints of an image, one per atom.
+        fingerprintprimes : dict
+            Dictionary of fingerprint derivatives, where the key is
+            a tuple with (index, symbol, neighbor_index, neighbor_symbol,
+            direction).
+        """
+        if isinstance(fingerprints, PrescaledFingerprints):
+            forces = np.zeros((len(fingerprints), 3))
+            deltas = {symbol: self._backward(symbol, outputs)
+                      for symbol, indices, outputs
+                      in self._forward(fingerprints)}
+            for (nsymbol, selfindices, nrows, directions,
+                 dInputs) in fingerprints.fingerprintprimes:
+                # The derivatives are scaled as the fingerprints are.
+                dforces = -np.einsum('ij,ij->i', deltas[nsymbol][nrows],
+                                     dInputs)
+                np.add.at(forces, (selfindices, directions), dforces)
+            return forces
+        gradients = self.calculate_dAtomicEnergies_dFingerprints(fingerprints)
+        keys = OrderedDict()
+        for key in fingerprintprimes.keys():
+            keys.setdefault(key[3], []).append(key)
+        forces = np.zeros((len(fingerprints), 3))
+        for nsymbol, _keys in keys.items():
+            rows, dEnergies_dFingerprints = gradients[nsymbol]
+            selfindices, nindices, directions = \
+                np.array([(key[0], key[2], key[4]) for key in _keys]).T
+            derafps = np.array([fingerprintprimes[key] for key in _keys],
+                               dtype=float)
+            # Force is multiplied by -1, because it is -dE/dx and not dE/dx.
+            dforces = -np.einsum('ij,ij->i',
+                                 dEnergies_dFingerprints[rows[nindices]],
+                                 derafps)
+            np.add.at(forces, (selfindices, directions), dforces)
+        return forces
+
+
+class PrescaledFingerprints:
+    """Fingerprints of an image scaled once to the [-1, 1] range, for use as
+    training inputs.
+
+    The fingerprint range is fixed during a regression, so the fingerprints
+    of each element are stacked and scaled once into an array, and the
+    fingerprint derivatives, which are grouped by the element of the
+    neighbor and scaled on first use, are kept likewise. The methods of
+    NeuralNetwork that take the fingerprints of an image also take an
+    instance of this class in their place, and then ignore their
+    fingerprintprimes argument.
+
+    Parameters
+    ----------
+    parameters : dict
+        ASE dictionary object of the NeuralNetwork, whose fingerprint range
+        is used.
+    fingerprints : list
+        List of fingerprints of an image, one per atom.
+    fingerprintprimes : dict
+        Dictionary of fingerprint derivatives, where the key is
+        a tuple with (index, symbol, neighbor_index, neighbor_symbol,
+        direction).
+    """
+
+    def __init__(self, parameters, fingerprints, fingerprintprimes=None):
+        self.parameters = parameters
+        self.fprange = parameters.fprange
+        self.indices = group_by_symbol(fingerprints)
+        self.afps = OrderedDict()
+        for symbol, indices in self.indices.items():
+            self.afps[symbol] = scale_fingerprints(
+                parameters, [fingerprints[index][1] for index in indices],
+                symbol)
+        self._fingerprintprimes = fingerprintprimes
+        self._stacked = None
+
+    def __len__(self):
+        return sum(len(_) for _ in self.indices.values())
+
+    @property
+    def fingerprintprimes(self):
+        """Scaled fingerprint derivatives grouped by the element of the
+        neighbor, as returned by stack_fingerprintprimes."""
+        if self._stacked is None:
+            if self._fingerprintprimes is None:
+                raise RuntimeError('Fingerprints were prescaled without '
+                                   'their derivatives.')
+            self._stacked = stack_fingerprintprimes(self.parameters,
+                                                    self.indices,
+                                                    self._fingerprintprimes)
+            self._fingerprintprimes = None
+        return self._stacked
+
+    def check(self, fprange):
+        """Raises a RuntimeError if fprange is not the fingerprint range the
+        fingerprints were scaled with."""
+        if fprange is self.fprange:
+            return
+        if (sorted(fprange) != sorted(self.fprange) or not
+                all(np.array_equal(fprange[symbol], self.fprange[symbol])
+                    for symbol in fprange)):
+            raise RuntimeError('Fingerprints were prescaled with another '
+                               'fingerprint range.')
+
 
 # Analysis tools ##############################################################
 
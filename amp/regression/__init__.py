@@ -1,3 +1,5 @@
+import numpy as np
+
 from ..utilities import ConvergenceOccurred
 
 
@@ -15,6 +17,8 @@ class Regressor:
         The optimizer to use. Several defaults are available including
         'L-BFGS-B', 'BFGS', 'TNC', 'Basinhopping' or 'NCG'. 
         Alternatively, any function can be supplied which behaves like scipy.optimize.fmin_bfgs.
+        The mini-batch optimizers 'Adam' and 'SGD' (see adam and sgd) take
+        steps on the loss of shuffled batches of the training images.
     optimizer_kwargs : dict
         Optional keywords for the corresponding optimizer.
     lossprime : boolean
@@ -95,6 +99,10 @@ class Regressor:
                 }
             }
             self.lossprime = False
+        elif optimizer == 'Adam':
+            optimizer = adam
+        elif optimizer == 'SGD':
+            optimizer = sgd
         if user_kwargs:
             optimizer_kwargs.update(user_kwargs)
         self.optimizer = optimizer
@@ -122,8 +130,12 @@ class Regressor:
         log(' Optimizer: %s' % self.optimizer)
         log(' Optimizer kwargs: %s' % self.optimizer_kwargs)
         x0 = model.vector.copy()
+        kwargs = self.optimizer_kwargs
+        if getattr(self.optimizer, 'minibatch', False):
+            kwargs = dict(kwargs, lossfunction=model.lossfunction,
+                          images=model.trainingparameters.images)
         try:
-            self.optimizer(model.get_loss, x0, **self.optimizer_kwargs)
+            self.optimizer(model.get_loss, x0, **kwargs)
 
         except ConvergenceOccurred:
             log('...optimization successful.', toc='opt')
@@ -137,3 +149,236 @@ class Regressor:
                 log('...maximum absolute value of loss prime: %.3e' %
                     max_lossprime)
             return False
+
+
+def adam(fun, x0, args=(), jac=True, lossfunction=None, images=None,
+         learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-8,
+         batchsize=32, epochs=10000, seed=None):
+    """Adam mini-batch optimizer (Kingma and Ba, arXiv:1412.6980).
+
+    Each epoch, the training images are shuffled and split into batches,
+    and a step is taken on the loss of each batch. The loss over all
+    images is then found, so that the loss function raises
+    ConvergenceOccurred as it does for the other optimizers. Regressor
+    supplies lossfunction and images.
+
+    Parameters
+    ----------
+    fun : function
+        Loss function of the parameters, as model.get_loss.
+    x0 : array
+        Initial parameters.
+    args : tuple
+        Extra arguments of fun, unused; fun is called with lossprime True
+        for batches and False for all images.
+    jac : bool
+        Whether fun returns the gradient of the loss; needs to be True.
+    lossfunction : object
+        Loss function of the model, whose batch is set.
+    images : dict
+        Hashed training images.
+    learning_rate : float or function
+        Step size, or a function of the epoch that returns it, such as
+        ExponentialDecay, StepDecay or CosineDecay.
+    beta1 : float
+        Decay rate of the running mean of the gradient.
+    beta2 : float
+        Decay rate of the running mean of the squared gradient.
+    epsilon : float
+        Added to the root of the mean squared gradient in the step.
+    batchsize : int
+        Number of images in each batch.
+    epochs : int
+        Maximum number of passes over the training images.
+    seed : int
+        Seed of the shuffling of the images.
+
+    Returns
+    -------
+    array
+        Parameters after the last epoch.
+    """
+    moments = {'m': 0., 'v': 0., 't': 0}
+
+    def step(x, gradient, rate):
+        moments['t'] += 1
+        moments['m'] = beta1 * moments['m'] + (1. - beta1) * gradient
+        moments['v'] = beta2 * moments['v'] + (1. - beta2) * gradient ** 2
+        m = moments['m'] / (1. - beta1 ** moments['t'])
+        v = moments['v'] / (1. - beta2 ** moments['t'])
+        return x - rate * m / (np.sqrt(v) + epsilon)
+
+    return _minimize_minibatch(fun, x0, jac, step, lossfunction, images,
+                               learning_rate, batchsize, epochs, seed)
+
+
+adam.minibatch = True
+
+
+def sgd(fun, x0, args=(), jac=True, lossfunction=None, images=None,
+        learning_rate=0.01, momentum=0.9, batchsize=32, epochs=10000,
+        seed=None):
+    """Stochastic gradient descent mini-batch optimizer, with momentum.
+
+    Each epoch, the training images are shuffled and split into batches,
+    and a step is taken on the loss of each batch. The loss over all
+    images is then found, so that the loss function raises
+    ConvergenceOccurred as it does for the other optimizers. Regressor
+    supplies lossfunction and images.
+
+    Parameters
+    ----------
+    fun : function
+        Loss function of the parameters, as model.get_loss.
+    x0 : array
+        Initial parameters.
+    args : tuple
+        Extra arguments of fun, unused; fun is called with lossprime True
+        for batches and False for all images.
+    jac : bool
+        Whether fun returns the gradient of the loss; needs to be True.
+    lossfunction : object
+        Loss function of the model, whose batch is set.
+    images : dict
+        Hashed training images.
+    learning_rate : float or function
+        Step size, or a function of the epoch that returns it, such as
+        ExponentialDecay, StepDecay or CosineDecay.
+    momentum : float
+        Fraction of the previous step added to each step.
+    batchsize : int
+        Number of images in each batch.
+    epochs : int
+        Maximum number of passes over the training images.
+    seed : int
+        Seed of the shuffling of the images.
+
+    Returns
+    -------
+    array
+        Parameters after the last epoch.
+    """
+    velocity = {'v': 0.}
+
+    def step(x, gradient, rate):
+        velocity['v'] = momentum * velocity['v'] - rate * gradient
+        return x + velocity['v']
+
+    return _minimize_minibatch(fun, x0, jac, step, lossfunction, images,
+                               learning_rate, batchsize, epochs, seed)
+
+
+sgd.minibatch = True
+
+
+def _minimize_minibatch(fun, x0, jac, step, lossfunction, images,
+                        learning_rate, batchsize, epochs, seed):
+    """Loop over epochs and shuffled batches shared by the mini-batch
+    optimizers; step(x, gradient, rate) returns the new parameters."""
+    if not jac:
+        raise RuntimeError('Mini-batch optimizers need the gradient of the '
+                           'loss function; use lossprime=True.')
+    if lossfunction is None or images is None:
+        raise RuntimeError('Mini-batch optimizers need the loss function '
+                           'and the training images.')
+    hashes = list(images.keys())
+    random = np.random.RandomState(seed)
+    x = np.array(x0, dtype=float)
+    for epoch in range(epochs):
+        rate = (learning_rate(epoch) if callable(learning_rate)
+                else learning_rate)
+        order = random.permutation(len(hashes))
+        try:
+            for start in range(0, len(hashes), batchsize):
+                lossfunction.batch = [hashes[_] for _ in
+                                      order[start:start + batchsize]]
+                loss, gradient = fun(x, True)
+                x = step(x, np.asarray(gradient, dtype=float), rate)
+        finally:
+            lossfunction.batch = None
+        # Loss over all images; raises ConvergenceOccurred if converged.
+        fun(x, False)
+    return x
+
+
+class ExponentialDecay:
+    """Learning rate schedule decaying exponentially with the epoch,
+    initial * rate ** (epoch / steps).
+
+    Parameters
+    ----------
+    initial : float
+        Learning rate of the first epoch.
+    rate : float
+        Factor the learning rate decays by every steps epochs.
+    steps : int
+        Number of epochs over which the learning rate decays by rate.
+    """
+
+    def __init__(self, initial, rate, steps=1):
+        self.initial = initial
+        self.rate = rate
+        self.steps = steps
+
+    def __call__(self, epoch):
+        return self.initial * self.rate ** (float(epoch) / self.steps)
+
+    def __repr__(self):
+        return 'ExponentialDecay(initial=%r, rate=%r, steps=%r)' % (
+            self.initial, self.rate, self.steps)
+
+
+class StepDecay:
+    """Learning rate schedule dropping by a factor every few epochs,
+    initial * factor ** (epoch // steps).
+
+    Parameters
+    ----------
+    initial : float
+        Learning rate of the first epoch.
+    factor : float
+        Factor the learning rate drops by.
+    steps : int
+        Number of epochs between drops.
+    """
+
+    def __init__(self, initial, factor=0.5, steps=100):
+        self.initial = initial
+        self.factor = factor
+        self.steps = steps
+
+    def __call__(self, epoch):
+        return self.initial * self.factor ** (epoch // self.steps)
+
+    def __repr__(self):
+        return 'StepDecay(initial=%r, factor=%r, steps=%r)' % (
+            self.initial, self.factor, self.steps)
+
+
+class CosineDecay:
+    """Learning rate schedule following half a cosine from initial to final
+    over epochs, and final after.
+
+    Parameters
+    ----------
+    initial : float
+        Learning rate of the first epoch.
+    epochs : int
+        Number of epochs over which the learning rate decays.
+    final : float
+        Learning rate after the decay.
+    """
+
+    def __init__(self, initial, epochs, final=0.):
+        self.initial = initial
+        self.epochs = epochs
+        self.final = final
+
+    def __call__(self, epoch):
+        fraction = min(epoch, self.epochs) / float(self.epochs)
+        return self.final + 0.5 * (self.initial - self.final) * \
+            (1. + np.cos(np.pi * fraction))
+
+    def __repr__(self):
+        return 'CosineDecay(initial=%r, epochs=%r, final=%r)' % (
+            self.initial, self.epochs, self.final)
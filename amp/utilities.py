@@ -292,6 +292,7 @@ class FileDatabase:
         self.path = filename
         self.loosepath = os.path.join(self.path, 'loose')
         self.tarpath = os.path.join(self.path, 'archive.tar.gz')
+        self.metapath = os.path.join(self.path, 'metadata')
         if not os.path.exists(self.path):
             try:
                 os.mkdir(self.path)
@@ -382,6 +383,30 @@ class FileDatabase:
         for key, value in newitems.items():
             self.__setitem__(key, value)
 
+    def get_metadata(self, key, default=None):
+        """Returns the metadata of the entry key, such as a summary of its
+        value, or default if none is stored. Metadata are kept apart from
+        the entries, one file per entry in <path>/metadata, so that they can
+        be read without the (larger) values."""
+        path = os.path.join(self.metapath, str(key))
+        if not os.path.exists(path):
+            return default
+        with open(path, 'rb') as f:
+            return self._repeat_read(f)
+
+    def set_metadata(self, key, value):
+        """Stores value as the metadata of the entry key; see
+        get_metadata."""
+        if not os.path.exists(self.metapath):
+            try:
+                os.mkdir(self.metapath)
+            except OSError:
+                pass
+        path = os.path.join(self.metapath, str(key))
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(value, f)
+        os.rename(path + '.tmp', path)
+
     def archive(self):
         """Cleans up to save disk space and reduce huge number of files.
 
@@ -422,6 +447,12 @@ class Data:
     Designed to hold things like neighborlists, which have a hash, value
     format.
 
+    The calculator must have a calculate(image, key) method that returns the
+    value of one image. If it also has a calculate_batch(images) method,
+    taking a dictionary of images and returning a dictionary of values with
+    the same keys, that is used instead so the calculator can work on many
+    images at once; parallel workers are expected to do the same.
+
     This will work like a dictionary in that items can be accessed with
     data[key], but other advanced dictionary functions should be accessed with
     through the .d attribute:
@@ -430,12 +461,21 @@ class Data:
     >>> data.open()
     >>> keys = data.d.keys()
     >>> values = data.d.values()
+
+    If a summarize function is given, it is applied to each value as it is
+    calculated, and the result is kept as the metadata of its entry (when
+    the database supports get_metadata and set_metadata, as FileDatabase
+    does), so that quantities over many images, such as the fingerprint
+    ranges, can be had from get_summaries without reading all the values
+    again.
     """
 
-    def __init__(self, filename, db=FileDatabase, calculator=None):
+    def __init__(self, filename, db=FileDatabase, calculator=None,
+                 summarize=None):
         self.calc = calculator
         self.db = db
         self.filename = filename
+        self.summarize = summarize
         self.d = None
 
     def calculate_items(self, images, parallel, log=None):
@@ -462,8 +502,18 @@ class Data:
             return
         if parallel['cores'] == 1:
             d = self.db.open(self.filename, 'c')
-            for key in calcs_needed:
-                d[key] = self.calc.calculate(images[key], key)
+            if hasattr(self.calc, 'calculate_batch'):
+                results = self.calc.calculate_batch({key: images[key] for key
+                                                     in calcs_needed})
+                d.update(results)
+            else:
+                results = {}
+                for key in calcs_needed:
+                    d[key] = results[key] = self.calc.calculate(images[key],
+                                                                key)
+            if self.summarize is not None:
+                self._add_summaries(d, {key: self.summarize(value)
+                                        for key, value in results.items()})
             d.close()  # Necessary to get out of write mode and unlock?
             log(' Calculated %i new images.' % len(calcs_needed))
         else:
@@ -518,10 +568,42 @@ class Data:
             log(' Adding new results to database.')
             d = self.db.open(self.filename, 'c')
             d.update(results)
+            if self.summarize is not None:
+                self._add_summaries(d, {key: self.summarize(value)
+                                        for key, value in results.items()})
             d.close()  # Necessary to get out of write mode and unlock?
 
         self.d = None
 
+    def _add_summaries(self, d, summaries):
+        """Stores summaries, a dictionary keyed like the entries, as the
+        metadata of their entries in the database d, if it supports it."""
+        if hasattr(d, 'set_metadata'):
+            for key, summary in summaries.items():
+                d.set_metadata(key, summary)
+
+    def get_summaries(self, keys):
+        """Returns a dictionary of the summaries of the values of keys, made
+        by the summarize function. Summaries not yet kept in the database
+        (e.g., of values calculated by an earlier version) are made from the
+        stored values and added to it.
+        """
+        self.open()
+        summaries = {}
+        if hasattr(self.d, 'get_metadata'):
+            for key in keys:
+                summary = self.d.get_metadata(key)
+                if summary is not None:
+                    summaries[key] = summary
+        missing = {key: self.summarize(self.d[key]) for key in keys
+                   if key not in summaries}
+        if len(missing) > 0:
+            d = self.db.open(self.filename, 'c')
+            self._add_summaries(d, missing)
+            d.close()
+            summaries.update(missing)
+        return summaries
+
     def __getitem__(self, key):
         self.open()
         return self.d[key]
@@ -543,6 +625,59 @@ class Data:
         self.close()
 
 
+def summarize_fingerprints(fingerprints):
+    """Summary of the atom-centered fingerprints of an image, as kept by
+    Data for fingerprint databases: for each element, a dictionary of the
+    number of atoms ('count') and of the minimum ('min'), maximum ('max'),
+    mean ('mean') and sum of squared deviations from the mean ('M2') of
+    each fingerprint component. Summaries of several images are combined
+    by combine_fingerprint_summaries.
+    """
+    byelement = {}
+    for element, fingerprint in fingerprints:
+        byelement.setdefault(element, []).append(fingerprint)
+    summary = {}
+    for element, values in byelement.items():
+        values = np.array(values, dtype=float)
+        mean = values.mean(axis=0)
+        summary[element] = {'count': len(values),
+                            'min': values.min(axis=0),
+                            'max': values.max(axis=0),
+                            'mean': mean,
+                            'M2': ((values - mean) ** 2).sum(axis=0)}
+    return summary
+
+
+def combine_fingerprint_summaries(summaries):
+    """Combines fingerprint summaries of several images, as made by
+    summarize_fingerprints, into one of the same form; the means and squared
+    deviations are merged pairwise as in Chan et al., Updating formulae and
+    a pairwise algorithm for computing sample variances (1979).
+    """
+    combined = {}
+    for summary in summaries:
+        for element, s in summary.items():
+            if element not in combined:
+                combined[element] = {key: np.array(value, dtype=float)
+                                     for key, value in s.items()
+                                     if key != 'count'}
+                combined[element]['count'] = s['count']
+                continue
+            c = combined[element]
+            if len(c['mean']) != len(s['mean']):
+                raise RuntimeError('Fingerprints of %s have different '
+                                   'lengths.' % element)
+            count = c['count'] + s['count']
+            delta = s['mean'] - c['mean']
+            c['M2'] = (c['M2'] + s['M2'] +
+                       delta ** 2 * c['count'] * s['count'] / count)
+            c['mean'] = c['mean'] + delta * s['count'] / count
+            c['min'] = np.minimum(c['min'], s['min'])
+            c['max'] = np.maximum(c['max'], s['max'])
+            c['count'] = count
+    return combined
+
+
 class Logger:
 
     """Logger that can also deliver timing information.
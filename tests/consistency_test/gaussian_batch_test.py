@@ -0,0 +1,90 @@
+"""
+This script makes a short trajectory of a periodic slab with an adsorbate. It
+then calculates Gaussian fingerprints and fingerprint primes of the images one
+at a time and as stacked batches, and checks consistency between them.
+
+"""
+
+import numpy as np
+from ase import Atoms
+from ase.build import fcc111, add_adsorbate
+from amp.descriptor.gaussian import Gaussian
+from amp.descriptor.cutoffs import Cosine, Polynomial
+from amp.utilities import hash_images
+
+
+def make_images():
+    """Makes test images."""
+    atoms = fcc111('Pd', size=(2, 2, 2), vacuum=6.)
+    add_adsorbate(atoms, Atoms('O'), height=1.2, position='fcc')
+    rng = np.random.RandomState(3)
+    images = []
+    for step in range(5):
+        image = atoms.copy()
+        image.positions += rng.uniform(-0.15, 0.15, (len(atoms), 3))
+        images.append(image)
+    # An image with different atoms is fingerprinted in a separate stack.
+    image = images[-1].copy()
+    image[-1].symbol = 'Pd'
+    images.append(image)
+    return images
+
+
+def make_symmetry_functions():
+    """Makes symmetry functions of each type."""
+    Gs = []
+    for eta in [0.05, 1., 4.]:
+        Gs += [{'type': 'G2', 'element': 'O', 'eta': eta},
+               {'type': 'G2', 'element': 'Pd', 'eta': eta}]
+    for zeta, gamma in [(1., 1.), (4., -1.)]:
+        for elements in [['O', 'Pd'], ['Pd', 'Pd']]:
+            Gs += [{'type': 'G4', 'elements': elements, 'eta': 0.005,
+                    'zeta': zeta, 'gamma': gamma},
+                   {'type': 'G5', 'elements': elements, 'eta': 0.005,
+                    'zeta': zeta, 'gamma': gamma}]
+    return Gs
+
+
+def test():
+    """Gaussian batched fingerprints consistency.
+
+    Tests that fingerprints and fingerprint primes calculated image by image
+    and as stacked batches give the same results.
+    """
+
+    images = hash_images(make_images(), ordered=True)
+    Gs = make_symmetry_functions()
+
+    for cutoff in [Cosine(4.), Polynomial(4., gamma=4)]:
+        fingerprints = []
+        fingerprintprimes = []
+        for batchsize in [None, 2]:
+            descriptor = Gaussian(cutoff=cutoff, Gs=Gs, batchsize=batchsize,
+                                  dblabel='Gaussian-batch-%s-%s' %
+                                  (cutoff.todict()['name'], batchsize))
+            descriptor.calculate_fingerprints(images,
+                                              parallel={'cores': 1},
+                                              log=None,
+                                              calculate_derivatives=True)
+            fingerprints.append(descriptor.fingerprints)
+            fingerprintprimes.append(descriptor.fingerprintprimes)
+
+        for hash in images.keys():
+            for (element1, afp1), (element2, afp2) in \
+                    zip(fingerprints[0][hash], fingerprints[1][hash]):
+                assert element1 == element2, \
+                    'Consistency of batched Gaussian fingerprints broken!'
+                assert np.allclose(afp1, afp2, rtol=1e-10, atol=1e-14), \
+                    'Consistency of batched Gaussian fingerprints broken!'
+            primes1 = fingerprintprimes[0][hash]
+            primes2 = fingerprintprimes[1][hash]
+            assert set(primes1.keys()) == set(primes2.keys()), \
+                'Consistency of batched Gaussian fingerprint primes broken!'
+            for key, value in primes1.items():
+                assert np.allclose(value, primes2[key], rtol=1e-10,
+                                   atol=1e-14), \
+                    'Consistency of batched Gaussian fingerprint primes ' \
+                    'broken!'
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,125 @@
+"""
+This script checks the array evaluation of the bispectrum, as used by the
+Bispectrum fingerprint calculator, against the scalar functions U and
+calculate_B, and the analytic fingerprint primes against finite
+differences.
+
+"""
+
+import numpy as np
+from ase import Atoms
+from ase.build import bulk, molecule
+from amp.descriptor.bispectrum import (U, m_values, calculate_B,
+                                       calculate_hyperspherical_harmonics,
+                                       generate_coefficients,
+                                       FingerprintCalculator,
+                                       FingerprintPrimeCalculator)
+from amp.descriptor.neighborlist import NeighborlistCalculator
+from amp.descriptor.cutoffs import Cosine, Polynomial
+
+
+def harmonics_test():
+    """Hyperspherical harmonics versus U."""
+    factorial = [1]
+    for _ in range(1, 10):
+        factorial.append(_ * factorial[-1])
+    Rc = 4.
+    vectors = np.random.RandomState(4).uniform(-2., 2., (4, 3))
+    Us = calculate_hyperspherical_harmonics(vectors, Rc, 2)
+    for vector, index in zip(vectors, range(len(vectors))):
+        r = np.linalg.norm(vector)
+        psi = np.arcsin(r / Rc)
+        theta = np.arccos(vector[2] / r)
+        phi = np.arctan2(vector[1], vector[0]) % (2. * np.pi)
+        for _2j in range(5):
+            j = 0.5 * _2j
+            reference = [[U(j, m, mp, psi, theta, phi, factorial)
+                          for mp in m_values(j)] for m in m_values(j)]
+            assert np.allclose(Us[_2j][index], reference, rtol=1e-10,
+                               atol=1e-12)
+
+
+def fingerprint_test():
+    """Fingerprints of one atom versus calculate_B."""
+    jmax = 1
+    Rc = 4.
+    Gs = {'O': {'O': 8., 'Pd': 46.}}
+    Rs = np.random.RandomState(5).uniform(-2., 2., (3, 3))
+    n_symbols = ['O', 'Pd', 'Pd']
+    calc = FingerprintCalculator(neighborlist=None, Gs=Gs, jmax=jmax,
+                                 cutoff=Cosine(Rc).todict())
+    calc.atoms = Atoms('O')
+    symbol, fingerprint = calc.get_fingerprint(0, 'O', n_symbols, Rs)
+
+    rs = [np.linalg.norm(R) for R in Rs]
+    psis = [np.arcsin(r / Rc) for r in rs]
+    thetas = [np.arccos(R[2] / r) for R, r in zip(Rs, rs)]
+    phis = [np.arctan2(R[1], R[0]) % (2. * np.pi) for R in Rs]
+    reference = []
+    for _2j1 in range(int(2 * jmax) + 1):
+        j1 = 0.5 * _2j1
+        for j in range(int(min(_2j1, jmax)) + 1):
+            reference.append(calculate_B(j1, j1, 1.0 * j, Gs['O'], Rc,
+                                         'Cosine', calc.factorial, n_symbols,
+                                         rs, psis, thetas, phis).real)
+    assert symbol == 'O'
+    assert np.allclose(fingerprint, reference, rtol=1e-10, atol=1e-10)
+
+
+def fingerprintprime_test():
+    """Fingerprint primes of a periodic cell versus finite differences."""
+    atoms = bulk('Cu', 'fcc', a=3.6) * (1, 1, 2)
+    atoms[0].symbol = 'Pd'
+    atoms.rattle(0.05, seed=1)
+    key = 'image'
+    Gs = generate_coefficients(['Cu', 'Pd'])
+    for cutoff in [Cosine(4.5), Polynomial(4.5, gamma=4)]:
+        neighborlist = {key: NeighborlistCalculator(4.5).calculate(atoms,
+                                                                   key)}
+        primes = FingerprintPrimeCalculator(
+            neighborlist, Gs, 1.5, cutoff.todict()).calculate(atoms, key)
+        calc = FingerprintCalculator(neighborlist, Gs, 1.5, cutoff.todict())
+        d = 1e-5
+        for (selfindex, selfsymbol, nindex, nsymbol, i), prime in \
+                primes.items():
+            forward = atoms.copy()
+            forward.positions[selfindex, i] += d
+            backward = atoms.copy()
+            backward.positions[selfindex, i] -= d
+            numeric = (np.array(calc.calculate(forward, key)[nindex][1]) -
+                       calc.calculate(backward, key)[nindex][1]) / (2. * d)
+            assert np.allclose(prime, numeric, rtol=1e-6,
+                               atol=1e-6 * np.abs(numeric).max()), \
+                'Bispectrum fingerprint primes disagree with finite ' \
+                'differences.'
+
+
+def batch_test():
+    """Fingerprints of several images at once versus one atom at a time."""
+    images = {}
+    for step in range(3):
+        atoms = bulk('Cu', 'fcc', a=3.6) * (1, 1, 3)
+        atoms[step].symbol = 'Pd'
+        atoms.rattle(0.05, seed=step)
+        images['image%i' % step] = atoms
+    images['molecule'] = molecule('CH3OH', vacuum=3.)
+    neighborlist = {key: NeighborlistCalculator(4.5).calculate(atoms, key)
+                    for key, atoms in images.items()}
+    Gs = generate_coefficients(['C', 'Cu', 'H', 'O', 'Pd'])
+    cutoff = Cosine(4.5)
+    for batchsize in [None, 3]:
+        calc = FingerprintCalculator(neighborlist, Gs, 1.5, cutoff.todict(),
+                                     batchsize=batchsize)
+        fingerprints = calc.calculate_batch(images)
+        for key, atoms in images.items():
+            for (symbol1, afp1), (symbol2, afp2) in \
+                    zip(fingerprints[key], calc.calculate(atoms, key)):
+                assert symbol1 == symbol2
+                assert np.allclose(afp1, afp2, rtol=1e-10, atol=1e-12), \
+                    'Bispectrum fingerprints of batches are inconsistent.'
+
+if __name__ == '__main__':
+    harmonics_test()
+    fingerprint_test()
+    fingerprintprime_test()
+    batch_test()
@@ -0,0 +1,130 @@
+"""
+This script checks the Chebyshev fingerprints against direct sums over
+neighbors and pairs of neighbors, the fingerprint primes against finite
+differences, and the descriptor on one and two cores and with a batch size.
+
+"""
+
+import numpy as np
+from ase.build import bulk, fcc111, add_adsorbate
+from amp.descriptor.chebyshev import (Chebyshev, FingerprintCalculator,
+                                      FingerprintPrimeCalculator,
+                                      generate_weights)
+from amp.descriptor.neighborlist import NeighborlistCalculator
+from amp.descriptor.cutoffs import Cosine, Polynomial
+from amp.utilities import hash_images
+
+
+def make_image():
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True)
+    atoms[1].symbol = 'Pd'
+    atoms[3].symbol = 'O'
+    atoms.rattle(0.1, seed=2)
+    return atoms
+
+
+def fingerprint_test():
+    """Fingerprints versus direct sums."""
+    atoms = make_image()
+    key = 'image'
+    neighborlist = {key: NeighborlistCalculator(5.).calculate(atoms, key)}
+    weights = generate_weights(['Cu', 'O', 'Pd'])
+    assert weights == {'Cu': -1., 'O': 0., 'Pd': 1.}
+    assert generate_weights(['Cu', 'Pd']) == {'Cu': -1., 'Pd': 1.}
+    assert generate_weights(['Cu']) is None
+    cutoff, angularcutoff = Cosine(5.), Polynomial(4.)
+    calc = FingerprintCalculator(neighborlist, weights, 5, 4,
+                                 cutoff.todict(), angularcutoff.todict())
+    fingerprints = calc.calculate(atoms, key)
+
+    for index, (indices, offsets) in enumerate(neighborlist[key]):
+        vectors = (atoms.positions[indices] + np.dot(offsets, atoms.cell) -
+                   atoms.positions[index])
+        R = np.linalg.norm(vectors, axis=1)
+        reference = []
+        for s in [np.ones(len(indices)),
+                  np.array([weights[atoms[_].symbol] for _ in indices])]:
+            theta = np.arccos(2. * R / 5. - 1.)
+            reference += [np.sum(s * np.cos(order * theta) * cutoff(R))
+                          for order in range(6)]
+            for order in range(5):
+                value = 0.
+                for j in range(len(indices)):
+                    for k in range(j + 1, len(indices)):
+                        cos = np.dot(vectors[j], vectors[k]) / R[j] / R[k]
+                        value += (s[j] * s[k] *
+                                  np.cos(order * np.arccos(cos)) *
+                                  angularcutoff(R[j]) * angularcutoff(R[k]))
+                reference.append(value)
+        assert fingerprints[index][0] == atoms[index].symbol
+        assert np.allclose(fingerprints[index][1], reference, rtol=1e-9,
+                           atol=1e-9), \
+            'Chebyshev fingerprints differ from direct sums.'
+
+
+def fingerprintprime_test():
+    """Fingerprint primes versus finite differences."""
+    atoms = make_image()
+    key = 'image'
+    neighborlist = {key: NeighborlistCalculator(5.).calculate(atoms, key)}
+    weights = generate_weights(['Cu', 'O', 'Pd'])
+    args = (neighborlist, weights, 5, 4, Cosine(5.).todict(),
+            Polynomial(4.).todict())
+    calc = FingerprintCalculator(*args)
+    primes = FingerprintPrimeCalculator(*args).calculate(atoms, key)
+    d = 1e-5
+    for (selfindex, selfsymbol, nindex, nsymbol, i), prime in primes.items():
+        forward = atoms.copy()
+        forward.positions[selfindex, i] += d
+        backward = atoms.copy()
+        backward.positions[selfindex, i] -= d
+        numeric = (np.array(calc.calculate(forward, key)[nindex][1]) -
+                   calc.calculate(backward, key)[nindex][1]) / (2. * d)
+        assert np.allclose(prime, numeric, rtol=1e-5, atol=1e-6), \
+            'Chebyshev fingerprint primes disagree with finite differences.'
+
+
+def consistency_test():
+    """Same fingerprints on one and two cores, with a batch size and after
+    restarting from the parameters."""
+    images = []
+    for step in range(3):
+        atoms = fcc111('Cu', size=(2, 2, 2), vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.05, seed=step)
+        images.append(atoms)
+    images = hash_images(images)
+
+    descriptors = [Chebyshev(cutoff=5., angularcutoff=4., dblabel='cheb-1'),
+                   Chebyshev(cutoff=5., angularcutoff=4., dblabel='cheb-2',
+                             batchsize=2)]
+    descriptors.append(
+        Chebyshev(dblabel='cheb-3',
+                  **{key: value
+                     for key, value in descriptors[0].parameters.items()
+                     if key not in ['importname']}))
+    cores = [1, {'localhost': 2}, 1]
+    for descriptor, _ in zip(descriptors, cores):
+        descriptor.calculate_fingerprints(images,
+                                          parallel={'cores': _,
+                                                    'envcommand': None},
+                                          log=None,
+                                          calculate_derivatives=True)
+    for hash in images:
+        for descriptor in descriptors[1:]:
+            for (symbol1, afp1), (symbol2, afp2) in \
+                    zip(descriptors[0].fingerprints[hash],
+                        descriptor.fingerprints[hash]):
+                assert symbol1 == symbol2
+                assert np.allclose(afp1, afp2, rtol=1e-10, atol=1e-12)
+            primes1 = descriptors[0].fingerprintprimes[hash]
+            primes2 = descriptor.fingerprintprimes[hash]
+            assert set(primes1) == set(primes2)
+            for _ in primes1:
+                assert np.allclose(primes1[_], primes2[_], rtol=1e-10,
+                                   atol=1e-12)
+
+if __name__ == '__main__':
+    fingerprint_test()
+    fingerprintprime_test()
+    consistency_test()
@@ -0,0 +1,88 @@
+"""
+This script checks that the cutoff functions give the same values for
+arrays of distances as for single distances, that tabulated cutoff
+functions stay within their error bounds, and that pure-python Gaussian
+fingerprints agree with the fortran and stacked-array ones for each cutoff
+function, including tabulated ones.
+
+"""
+
+import numpy as np
+from ase.build import molecule
+from amp.descriptor.gaussian import Gaussian
+from amp.descriptor.cutoffs import Cosine, Polynomial, dict2cutoff
+from amp.utilities import hash_images
+
+
+def array_test():
+    """Array evaluation of cutoff functions."""
+    distances = np.linspace(0., 7., 71)
+    for cutoff in [Cosine(6.5), Polynomial(6.5, gamma=4)]:
+        values = cutoff(distances)
+        primes = cutoff.prime(distances)
+        assert values.shape == distances.shape
+        for distance, value, prime in zip(distances, values, primes):
+            assert abs(cutoff(distance) - value) < 1e-14
+            assert abs(cutoff.prime(distance) - prime) < 1e-14
+        assert np.all(values[distances > 6.5] == 0.)
+        assert np.all(primes[distances > 6.5] == 0.)
+
+
+def tabulated_test():
+    """Tabulated cutoff functions versus the analytic forms."""
+    distances = np.random.RandomState(0).uniform(0., 7., 5000)
+    for cutoff in [Cosine(6.5, tabulate=200),
+                   Polynomial(6.5, gamma=4, tabulate=200),
+                   Polynomial(4., gamma=2, tabulate=20)]:
+        errors = cutoff.table.errors
+        assert errors['value'] < 1e-6
+        valueerror = np.abs(cutoff(distances) -
+                            cutoff.analytic(distances)).max()
+        primeerror = np.abs(cutoff.prime(distances) -
+                            cutoff.analytic_prime(distances)).max()
+        assert valueerror <= errors['value'] + 1e-14, \
+            'Tabulated cutoff function exceeds its error bound.'
+        assert primeerror <= errors['prime'] + 1e-14, \
+            'Tabulated cutoff function derivative exceeds its error bound.'
+        copy = dict2cutoff(cutoff.todict())
+        assert copy.tabulate == cutoff.tabulate
+        assert np.allclose(copy(distances), cutoff(distances))
+
+
+def python_fortran_test():
+    """Pure-python versus fortran and stacked Gaussian fingerprints."""
+    atoms = molecule('CH3CH2OH')
+    atoms.rattle(0.05, seed=1)
+    images = hash_images([atoms])
+    for cutoff in [Cosine(4.), Polynomial(4., gamma=4),
+                   Cosine(4., tabulate=8)]:
+        fingerprints = []
+        fingerprintprimes = []
+        for fortran, batchsize in [(False, None), (True, None), (True, 4)]:
+            descriptor = Gaussian(cutoff=cutoff, fortran=fortran,
+                                  batchsize=batchsize,
+                                  dblabel='cutoffs-%s-%s-%s' %
+                                  (repr(cutoff.todict()['kwargs']), fortran,
+                                   batchsize))
+            descriptor.calculate_fingerprints(images,
+                                              parallel={'cores': 1},
+                                              log=None,
+                                              calculate_derivatives=True)
+            fingerprints.append(descriptor.fingerprints)
+            fingerprintprimes.append(descriptor.fingerprintprimes)
+        for hash in images.keys():
+            for count in range(1, len(fingerprints)):
+                for (element1, afp1), (element2, afp2) in \
+                        zip(fingerprints[0][hash], fingerprints[count][hash]):
+                    assert element1 == element2
+                    assert np.allclose(afp1, afp2, rtol=1e-10, atol=1e-12), \
+                        'Fingerprints depend on fortran or batchsize.'
+                primes = fingerprintprimes[count][hash]
+                for key, value in fingerprintprimes[0][hash].items():
+                    assert np.allclose(value, primes[key], rtol=1e-10,
+                                       atol=1e-12)
+
+if __name__ == '__main__':
+    array_test()
+    tabulated_test()
+    python_fortran_test()
@@ -0,0 +1,84 @@
+"""
+This script checks that the fingerprint statistics combined from the
+summaries kept in the fingerprint database, on one and two cores, agree with
+those of the fingerprints themselves, for all or some of the images, and
+that summaries missing from a database are made from its fingerprints.
+
+"""
+
+import os
+import shutil
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from amp.descriptor.gaussian import Gaussian
+from amp.model import (calculate_fingerprints_range,
+                       calculate_fingerprints_statistics)
+from amp.utilities import hash_images
+
+
+def make_images():
+    images = []
+    for step in range(5):
+        atoms = fcc111('Cu', size=(2, 2, 2), vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.1, seed=step)
+        images.append(atoms)
+    return hash_images(images)
+
+
+def check(descriptor, images):
+    """Statistics and range versus those of the stacked fingerprints."""
+    data = {}
+    for hash in images:
+        for element, fingerprint in descriptor.fingerprints[hash]:
+            data.setdefault(element, []).append(fingerprint)
+    statistics = calculate_fingerprints_statistics(descriptor, images)
+    fprange = calculate_fingerprints_range(descriptor, images)
+    assert sorted(statistics) == sorted(data) == sorted(fprange)
+    for element, values in data.items():
+        values = np.array(values)
+        s = statistics[element]
+        assert s['count'] == len(values)
+        for key, reference in [('min', values.min(axis=0)),
+                               ('max', values.max(axis=0)),
+                               ('mean', values.mean(axis=0)),
+                               ('std', values.std(axis=0))]:
+            assert np.allclose(s[key], reference, rtol=1e-10, atol=1e-12), \
+                'Fingerprint %s of %s differs.' % (key, element)
+        assert np.allclose(fprange[element],
+                           np.array([values.min(axis=0),
+                                     values.max(axis=0)]).T,
+                           rtol=1e-12, atol=1e-14)
+
+
+def test():
+    """Fingerprint statistics from the database summaries."""
+    images = make_images()
+    subset = {hash: images[hash] for hash in list(images.keys())[1:4]}
+    for label, cores in [('serial', 1), ('parallel', {'localhost': 2})]:
+        descriptor = Gaussian(cutoff=5., dblabel='amp-statistics-%s' % label)
+        descriptor.calculate_fingerprints(images,
+                                          parallel={'cores': cores,
+                                                    'envcommand': None},
+                                          log=None,
+                                          calculate_derivatives=False)
+        descriptor.fingerprints.open()
+        for hash in images:
+            assert descriptor.fingerprints.d.get_metadata(hash) is not None, \
+                'Summaries were not kept as the fingerprints were calculated.'
+        check(descriptor, images)
+        check(descriptor, subset)
+
+    # A database without summaries, as made by earlier versions.
+    path = 'amp-statistics-serial-fingerprints.ampdb'
+    shutil.rmtree(os.path.join(path, 'metadata'))
+    descriptor = Gaussian(cutoff=5., dblabel='amp-statistics-serial')
+    descriptor.calculate_fingerprints(images, log=None,
+                                      calculate_derivatives=False)
+    check(descriptor, subset)
+    descriptor.fingerprints.open()
+    assert all((descriptor.fingerprints.d.get_metadata(hash) is None) ==
+               (hash not in subset) for hash in images)
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,75 @@
+"""
+An adsorbate on a slab is moved a few times, and the fingerprints and
+fingerprint derivatives calculated incrementally (from the previous
+configuration) are compared with those calculated from scratch. They should
+be identical, while only the atoms near the adsorbate are re-calculated.
+
+"""
+
+###############################################################################
+
+import numpy as np
+from ase import Atoms
+from ase.build import fcc111, add_adsorbate
+from amp.descriptor.gaussian import (FingerprintCalculator,
+                                     FingerprintPrimeCalculator,
+                                     make_default_symmetry_functions,
+                                     get_affected_atoms)
+from amp.descriptor.neighborlist import NeighborlistCalculator
+from amp.descriptor.cutoffs import Cosine
+
+###############################################################################
+
+
+def test():
+    """Incremental fingerprint test."""
+
+    atoms = fcc111('Pt', size=(3, 3, 3), vacuum=6.)
+    add_adsorbate(atoms, Atoms('CO', positions=[[0., 0., 0.],
+                                                [0., 0., 1.2]]),
+                  height=1.9, position='ontop')
+    atoms.center(axis=2, vacuum=6.)
+    Gs = make_default_symmetry_functions(['C', 'O', 'Pt'])
+    cutoff = Cosine(3.).todict()
+
+    nlcalc = NeighborlistCalculator(cutoff=3.)
+    neighborlist = {}
+    calcs = {}
+    for incremental in [False, True]:
+        calcs[incremental] = (
+            FingerprintCalculator(neighborlist, Gs, cutoff, fortran=True,
+                                  incremental=incremental),
+            FingerprintPrimeCalculator(neighborlist, Gs, cutoff,
+                                       fortran=True,
+                                       incremental=incremental))
+
+    previous = None
+    for step in range(3):
+        atoms[-1].position += [0.1, -0.05, 0.02]
+        atoms[-2].position += [0.05, 0.05, -0.02]
+        key = 'step%i' % step
+        neighborlist[key] = nlcalc.calculate(atoms, key)
+        if previous is not None:
+            affected = get_affected_atoms(previous[0], atoms, previous[1],
+                                          neighborlist[key])
+            assert 2 < affected.sum() < len(atoms), \
+                'Unexpected number of affected atoms: %i.' % affected.sum()
+        previous = (atoms.copy(), neighborlist[key])
+
+        fingerprints = [calcs[_][0].calculate(atoms, key) for _ in calcs]
+        for (symbol, fp), (_symbol, _fp) in zip(*fingerprints):
+            assert symbol == _symbol
+            assert np.allclose(fp, _fp, rtol=0., atol=1e-12), \
+                'Incremental fingerprints differ.'
+
+        primes = [calcs[_][1].calculate(atoms, key) for _ in calcs]
+        assert set(primes[0].keys()) == set(primes[1].keys())
+        for _ in primes[0]:
+            assert np.allclose(primes[0][_], primes[1][_], rtol=0.,
+                               atol=1e-12), \
+                'Incremental fingerprint primes differ.'
+
+###############################################################################
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,111 @@
+"""
+This script checks that the pure-python loss function, with the reference
+energies and forces cached as arrays, gives the loss, residuals and maxima
+summed image by image, and gradients that agree with finite differences of
+the loss, with analytic and numeric model gradients, and that the references
+are read from the images only once.
+
+"""
+
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
+from amp.descriptor.gaussian import Gaussian
+from amp.model import LossFunction, calculate_fingerprints_range
+from amp.model.neuralnetwork import NeuralNetwork
+from amp.utilities import hash_images
+
+
+def make_images():
+    images = []
+    for step, size in enumerate([(2, 2, 2), (2, 2, 3), (2, 2, 2)]):
+        atoms = fcc111('Cu', size=size, vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.05, seed=step)
+        atoms.set_calculator(EMT())
+        atoms.set_calculator(SinglePointCalculator(
+            atoms, energy=atoms.get_potential_energy(),
+            forces=atoms.get_forces()))
+        images.append(atoms)
+    return hash_images(images)
+
+
+def reference_loss(model, images, fingerprints, fingerprintprimes,
+                   energy_coefficient, force_coefficient):
+    """Loss, losses and maximum residuals summed image by image."""
+    energyloss = forceloss = energy_maxresid = force_maxresid = 0.
+    for hash, image in images.items():
+        residual = abs(model.calculate_energy(fingerprints[hash]) -
+                       image.get_potential_energy()) / len(image)
+        energy_maxresid = max(energy_maxresid, residual)
+        energyloss += residual ** 2
+        residuals = np.abs(model.calculate_forces(fingerprints[hash],
+                                                  fingerprintprimes[hash]) -
+                           image.get_forces())
+        force_maxresid = max(force_maxresid, residuals.max())
+        forceloss += np.sum(residuals ** 2) / (3. * len(image))
+    loss = energy_coefficient * energyloss + force_coefficient * forceloss
+    return loss, energyloss, forceloss, energy_maxresid, force_maxresid
+
+
+def test():
+    """Vectorized loss function versus image-by-image sums."""
+    images = make_images()
+    descriptor = Gaussian(cutoff=5., dblabel='amp-loss')
+    descriptor.calculate_fingerprints(images, log=None,
+                                      calculate_derivatives=True)
+    fingerprints = {hash: descriptor.fingerprints[hash] for hash in images}
+    fingerprintprimes = {hash: descriptor.fingerprintprimes[hash]
+                         for hash in images}
+    model = NeuralNetwork(hiddenlayers=(3, 2), activation='tanh',
+                          mode='atom-centered', fortran=False)
+    p = model.parameters
+    p.fprange = calculate_fingerprints_range(descriptor, images)
+    p.hiddenlayers = {element: (3, 2) for element in p.fprange}
+    model.randomize(scalings=False, seed=1)
+    p.scalings = {element: {'slope': 1.2, 'intercept': -3.5}
+                  for element in p.fprange}
+    vector = model.vector
+
+    for d in [None, 1e-5]:
+        lossfunction = LossFunction(
+            energy_coefficient=1.5, force_coefficient=0.1,
+            convergence={'energy_rmse': 0.001, 'force_rmse': 0.01},
+            parallel={'cores': 1}, overfit=1e-4,
+            raise_ConvergenceOccurred=False, log_losses=False, d=d)
+        model.lossfunction = lossfunction
+        lossfunction.attach_model(model, images=images,
+                                  fingerprints=fingerprints,
+                                  fingerprintprimes=fingerprintprimes)
+        results = lossfunction.calculate_loss(vector, lossprime=True)
+        model.vector = vector
+        reference = list(reference_loss(model, images, fingerprints,
+                                        fingerprintprimes, 1.5, 0.1))
+        reference[0] += 1e-4 * np.dot(vector, vector)
+        loss, dloss_dparameters = results[:2]
+        for result, expected in zip((loss,) + tuple(results[2:]),
+                                    reference):
+            assert abs(result - expected) < 1e-10 * max(1., abs(expected)), \
+                'Loss differs from the image-by-image sums.'
+
+        # The references are not read from the images again.
+        calculators = {hash: image.get_calculator()
+                       for hash, image in images.items()}
+        for image in images.values():
+            image.set_calculator(None)
+        numeric = np.zeros(len(vector))
+        for index in range(len(vector)):
+            for sign in [1., -1.]:
+                displaced = vector.copy()
+                displaced[index] += sign * 1e-6
+                numeric[index] += sign * lossfunction.calculate_loss(
+                    displaced, lossprime=False)[0] / 2e-6
+        assert np.allclose(dloss_dparameters, numeric, rtol=1e-4,
+                           atol=1e-6), \
+            'Loss gradient differs from finite differences with d=%s.' % d
+        for hash, image in images.items():
+            image.set_calculator(calculators[hash])
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,133 @@
+"""
+This script checks that the loss function of a batch of images, in pure
+python and fortran, is that of those images alone, that the mini-batch
+optimizers train a neural network until the loss over all images converges,
+on one core and two, and the learning rate schedules.
+
+"""
+
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
+from amp import Amp
+from amp.descriptor.gaussian import Gaussian
+from amp.model import LossFunction, calculate_fingerprints_range
+from amp.model.neuralnetwork import NeuralNetwork
+from amp.regression import (Regressor, ExponentialDecay, StepDecay,
+                            CosineDecay)
+from amp.utilities import hash_images
+
+
+def make_images():
+    images = []
+    for step, size in enumerate([(2, 2, 2), (2, 2, 3), (2, 2, 2),
+                                 (2, 2, 2), (2, 2, 3)]):
+        atoms = fcc111('Cu', size=size, vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.05, seed=step)
+        atoms.set_calculator(EMT())
+        atoms.set_calculator(SinglePointCalculator(
+            atoms, energy=atoms.get_potential_energy(),
+            forces=atoms.get_forces()))
+        images.append(atoms)
+    return images
+
+
+def batch_test():
+    """Loss of a batch versus the loss of its images alone."""
+    images = hash_images(make_images())
+    descriptor = Gaussian(cutoff=5., dblabel='amp-minibatch')
+    descriptor.calculate_fingerprints(images, log=None,
+                                      calculate_derivatives=True)
+    hashes = list(images.keys())
+    batch = [hashes[3], hashes[1]]
+    subset = {hash: images[hash] for hash in hashes if hash in batch}
+    for fortran in [False, True]:
+        model = NeuralNetwork(hiddenlayers=(3, 2), activation='tanh',
+                              mode='atom-centered', fortran=fortran)
+        p = model.parameters
+        p.fprange = calculate_fingerprints_range(descriptor, images)
+        p.hiddenlayers = {element: (3, 2) for element in p.fprange}
+        model.randomize(scalings=False, seed=1)
+        p.scalings = {element: {'slope': 1.2, 'intercept': -3.5}
+                      for element in p.fprange}
+        vector = model.vector.copy()
+
+        results = []
+        for trainingimages, selected in [(subset, None), (images, batch),
+                                         (images, None)]:
+            lossfunction = LossFunction(
+                force_coefficient=0.1, overfit=1e-4,
+                convergence={'energy_rmse': 0.001, 'force_rmse': 0.01},
+                parallel={'cores': 1}, raise_ConvergenceOccurred=False,
+                log_losses=False)
+            model.lossfunction = lossfunction
+            lossfunction.attach_model(
+                model, images=trainingimages,
+                fingerprints=descriptor.fingerprints,
+                fingerprintprimes=descriptor.fingerprintprimes)
+            lossfunction.batch = selected
+            results.append(lossfunction.get_loss(vector, lossprime=True))
+            if selected is not None:
+                # Back to all images on the same loss function.
+                lossfunction.batch = None
+                results.append(lossfunction.get_loss(vector,
+                                                     lossprime=True))
+        for key in results[0]:
+            assert np.allclose(results[0][key], results[1][key],
+                               rtol=1e-10, atol=1e-12), \
+                'Batch %s differs from its images alone, fortran=%s.' % (
+                    key, fortran)
+            assert np.allclose(results[2][key], results[3][key],
+                               rtol=1e-10, atol=1e-12), \
+                'All images %s differs after a batch, fortran=%s.' % (
+                    key, fortran)
+
+
+def train_test():
+    """Mini-batch optimizers train until the loss converges."""
+    images = make_images()
+    convergence = {'energy_rmse': 0.02, 'force_rmse': None}
+    for optimizer, kwargs, fortran, cores in [
+            ('Adam', {'learning_rate': 0.01}, False, 1),
+            ('Adam', {'learning_rate': 0.01}, True, 1),
+            ('SGD', {'learning_rate': ExponentialDecay(0.1, 0.999)},
+             False, 1),
+            ('Adam', {'learning_rate': 0.01}, False, 2)]:
+        kwargs = dict(kwargs, batchsize=2, seed=0, epochs=2000)
+        regressor = Regressor(optimizer=optimizer, optimizer_kwargs=kwargs)
+        label = 'minibatch/%s-%s-%i' % (optimizer, fortran, cores)
+        calc = Amp(descriptor=Gaussian(cutoff=5.),
+                   model=NeuralNetwork(hiddenlayers=(3, 2),
+                                       regressor=regressor,
+                                       fortran=fortran),
+                   label=label, dblabel='amp-minibatch-train', cores=cores)
+        calc.model.lossfunction = LossFunction(convergence=convergence,
+                                               force_coefficient=None)
+        assert calc.train(images=images)['complete'] is True, \
+            '%s did not converge, fortran=%s, cores=%i.' % (
+                optimizer, fortran, cores)
+        assert calc.model.lossfunction.batch is None
+        energies = [calc.get_potential_energy(atoms) for atoms in images]
+        rmse = np.sqrt(np.mean(
+            [((energy - atoms.get_potential_energy()) / len(atoms)) ** 2
+             for energy, atoms in zip(energies, images)]))
+        assert rmse <= convergence['energy_rmse'] * (1. + 1e-6)
+
+
+def schedule_test():
+    """Learning rate schedules."""
+    assert np.isclose(ExponentialDecay(0.1, 0.5, steps=2)(4), 0.025)
+    schedule = StepDecay(0.1, factor=0.5, steps=10)
+    assert [schedule(_) for _ in [0, 9, 10, 25]] == [0.1, 0.1, 0.05, 0.025]
+    schedule = CosineDecay(0.1, 10, final=0.01)
+    assert np.isclose(schedule(0), 0.1)
+    assert np.isclose(schedule(5), 0.055)
+    assert np.isclose(schedule(10), 0.01)
+    assert np.isclose(schedule(20), 0.01)
+
+if __name__ == '__main__':
+    batch_test()
+    train_test()
+    schedule_test()
@@ -0,0 +1,45 @@
+"""
+Atoms are moved slightly over a series of steps, and neighborlists made with a
+skin (re-used between steps) are compared with those made from scratch at
+each step. The neighbors should be identical, while the skinned list should
+only be rebuilt occasionally.
+
+"""
+
+###############################################################################
+
+import numpy as np
+from ase.build import fcc111
+from amp.descriptor.neighborlist import NeighborlistCalculator
+
+###############################################################################
+
+
+def test():
+    """Verlet-skin neighborlist test."""
+
+    atoms = fcc111('Cu', size=(2, 2, 2), vacuum=5.)
+    atoms[0].symbol = 'Pt'
+    rng = np.random.RandomState(1)
+
+    plain = NeighborlistCalculator(cutoff=4.)
+    skinned = NeighborlistCalculator(cutoff=4., skin=1.)
+
+    steps = 20
+    for step in range(steps):
+        atoms.positions += rng.uniform(-0.1, 0.1, (len(atoms), 3))
+        reference = plain.calculate(atoms, None)
+        neighbors = skinned.calculate(atoms, None)
+        for (indices, offsets), (_indices, _offsets) in zip(reference,
+                                                            neighbors):
+            assert (sorted(zip(indices, map(tuple, offsets))) ==
+                    sorted(zip(_indices, map(tuple, _offsets)))), \
+                'Skinned neighborlist differs at step %i.' % step
+
+    assert 1 < skinned.verletlist.nupdates < steps, \
+        'Skinned neighborlist was rebuilt at every step or never.'
+
+###############################################################################
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,350 @@
+"""
+This script checks that the neural-network energy, with the atoms of each
+element passed through their network together, equals the sum of the atomic
+energies calculated one atom at a time, and that the forces contracted from
+the gradients of the atomic energies agree with finite differences of the
+energy, and that the weighted energy gradients backpropagated through many
+images at once equal those summed one atom at a time, and that the force
+gradients from all fingerprint derivatives of an image at once agree with
+finite differences and with those weighted by force residuals, for each
+activation function. It also checks that the inference plan used for
+predictions is kept until the parameters change, that the weights and
+scalings are views into the parameter vector that survive a save and load,
+and that fingerprints prescaled once give the same predictions, gradients
+and loss as the fingerprints themselves.
+
+"""
+
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from ase.calculators.emt import EMT
+from amp import Amp
+from amp.descriptor.gaussian import Gaussian
+from amp.model import LossFunction
+from amp.model.neuralnetwork import (NeuralNetwork, PrescaledFingerprints,
+                                     get_random_weights)
+from amp.utilities import hash_images, string2dict
+
+
+def test():
+    """Batched versus per-atom forward pass."""
+    atoms = fcc111('Cu', size=(3, 3, 3), vacuum=5.)
+    atoms[3].symbol = 'Pd'
+    add_adsorbate(atoms, 'O', 1.5, 'fcc')
+    random = np.random.RandomState(0)
+    lengths = {'Cu': 5, 'Pd': 5, 'O': 4}
+    fingerprints = [(atom.symbol,
+                     list(random.uniform(0., 3., lengths[atom.symbol])))
+                    for atom in atoms]
+    hiddenlayers = {'Cu': (4, 3), 'Pd': (4, 3), 'O': (2,)}
+    # The last Cu fingerprint has no range and is left unscaled.
+    fprange = {'Cu': [[0.5, 2.5]] * 4 + [[1., 1.]],
+               'Pd': [[0., 3.]] * 5,
+               'O': [[0.2, 2.]] * 4}
+    scalings = {'Cu': {'slope': 1.3, 'intercept': -0.2},
+                'Pd': {'slope': 0.7, 'intercept': 0.4},
+                'O': {'slope': 2.1, 'intercept': -1.1}}
+
+    for activation in ['tanh', 'sigmoid', 'linear']:
+        weights = get_random_weights(hiddenlayers, activation, lengths,
+                                     seed=1)
+        model = NeuralNetwork(hiddenlayers=hiddenlayers, weights=weights,
+                              scalings=scalings, fprange=fprange,
+                              activation=activation, mode='atom-centered')
+        energy = model.calculate_energy(fingerprints)
+        atomic_energies = [model.calculate_atomic_energy(afp, index, symbol)
+                           for index, (symbol, afp)
+                           in enumerate(fingerprints)]
+        assert np.allclose(model.atomic_energies, atomic_energies,
+                           rtol=1e-12, atol=1e-12), \
+            'Batched atomic energies differ with %s.' % activation
+        assert abs(energy - sum(atomic_energies)) < 1e-10, \
+            'Batched energy differs with %s.' % activation
+
+
+def make_fingerprints():
+    atoms = fcc111('Cu', size=(2, 2, 2), vacuum=5.)
+    atoms[1].symbol = 'Pd'
+    add_adsorbate(atoms, 'O', 1.5, 'fcc')
+    atoms.rattle(0.05, seed=3)
+    hash, = hash_images([atoms]).keys()
+    descriptor = Gaussian(cutoff=5., dblabel='amp-nn-forces')
+    descriptor.calculate_fingerprints({hash: atoms}, log=None,
+                                      calculate_derivatives=True)
+    fingerprints = descriptor.fingerprints[hash]
+    fingerprintprimes = descriptor.fingerprintprimes[hash]
+    return atoms, fingerprints, fingerprintprimes
+
+
+def make_model(fingerprints, activation, seed):
+    lengths = {symbol: len(afp) for symbol, afp in fingerprints}
+    hiddenlayers = {symbol: (3, 2) for symbol in lengths}
+    fprange = {}
+    for symbol, afp in fingerprints:
+        fprange.setdefault(symbol, [[_, _] for _ in afp])
+        for ridge, _ in zip(afp, fprange[symbol]):
+            _[0], _[1] = min(_[0], ridge), max(_[1], ridge)
+    scalings = {symbol: {'slope': 1.5, 'intercept': 0.1}
+                for symbol in lengths}
+    weights = get_random_weights(hiddenlayers, activation, lengths,
+                                 seed=seed)
+    model = NeuralNetwork(hiddenlayers=hiddenlayers, weights=weights,
+                          scalings=scalings, fprange=fprange,
+                          activation=activation, mode='atom-centered')
+    model.vector = model.vector
+    return model
+
+
+def test_forces():
+    """Forces from the energy gradients versus finite differences."""
+    atoms, fingerprints, fingerprintprimes = make_fingerprints()
+    for activation in ['tanh', 'sigmoid', 'linear']:
+        model = make_model(fingerprints, activation, seed=2)
+        forces = model.calculate_forces(fingerprints, fingerprintprimes)
+        assert np.abs(forces).max() > 1e-3
+
+        calc = Amp(descriptor=Gaussian(cutoff=5.), model=model,
+                   dblabel='amp-nn-forces', logging=False)
+        d = 1e-5
+        for index in range(len(atoms)):
+            for i in range(3):
+                displaced = atoms.copy()
+                displaced.positions[index, i] += d
+                eplus = calc.get_potential_energy(displaced)
+                displaced.positions[index, i] -= 2. * d
+                eminus = calc.get_potential_energy(displaced)
+                assert abs(forces[index, i] + (eplus - eminus) / (2. * d)) \
+                    < 1e-6, 'Forces disagree with finite differences.'
+
+
+def test_energy_gradients():
+    """Batched energy gradients versus per-atom and numeric gradients."""
+    random = np.random.RandomState(4)
+    lengths = {'Cu': 5, 'O': 4}
+    imagesfingerprints = []
+    for natoms in [3, 5, 2]:
+        symbols = ['Cu'] * natoms + ['O']
+        imagesfingerprints.append(
+            [(symbol, list(random.uniform(0., 3., lengths[symbol])))
+             for symbol in symbols])
+    coefficients = [0.3, -1.2, 2.]
+    hiddenlayers = {'Cu': (4, 3), 'O': (2,)}
+    fprange = {'Cu': [[0.5, 2.5]] * 4 + [[1., 1.]],
+               'O': [[0.2, 2.]] * 4}
+    scalings = {'Cu': {'slope': 1.3, 'intercept': -0.2},
+                'O': {'slope': 2.1, 'intercept': -1.1}}
+
+    for activation in ['tanh', 'sigmoid', 'linear']:
+        weights = get_random_weights(hiddenlayers, activation, lengths,
+                                     seed=5)
+        model = NeuralNetwork(hiddenlayers=hiddenlayers, weights=weights,
+                              scalings=scalings, fprange=fprange,
+                              activation=activation, mode='atom-centered')
+        model.vector = model.vector
+        gradient = model.calculate_dEnergies_dParameters(imagesfingerprints,
+                                                         coefficients)
+        reference = np.zeros(len(model.vector))
+        numeric = np.zeros(len(model.vector))
+        for fingerprints, coefficient in zip(imagesfingerprints,
+                                             coefficients):
+            for index, (symbol, afp) in enumerate(fingerprints):
+                reference += coefficient * \
+                    model.calculate_dAtomicEnergy_dParameters(afp, index,
+                                                              symbol)
+            numeric += coefficient * np.array(
+                model.calculate_numerical_dEnergy_dParameters(fingerprints))
+        assert np.allclose(gradient, reference, rtol=1e-10, atol=1e-12), \
+            'Batched gradients differ from per-atom ones with %s.' % \
+            activation
+        assert np.allclose(gradient, numeric, rtol=1e-5, atol=1e-7), \
+            'Batched gradients differ from numeric ones with %s.' % \
+            activation
+
+
+def test_force_gradients():
+    """Batched force gradients versus numeric and weighted gradients."""
+    atoms, fingerprints, fingerprintprimes = make_fingerprints()
+    random = np.random.RandomState(6)
+    coefficients = random.uniform(-1., 1., (len(atoms), 3))
+    for activation in ['tanh', 'sigmoid', 'linear']:
+        model = make_model(fingerprints, activation, seed=7)
+        gradients = model.calculate_dForces_dParameters(fingerprints,
+                                                        fingerprintprimes)
+        numeric = model.calculate_numerical_dForces_dParameters(
+            fingerprints, fingerprintprimes)
+        assert sorted(gradients) == sorted(numeric)
+        for key in gradients:
+            assert np.allclose(gradients[key], numeric[key], rtol=1e-5,
+                               atol=1e-7), \
+                'Force gradients differ from numeric ones with %s.' % \
+                activation
+        weighted = model.calculate_weighted_dForces_dParameters(
+            fingerprints, fingerprintprimes, coefficients)
+        reference = sum(coefficients[key] * gradients[key]
+                        for key in gradients)
+        assert np.allclose(weighted, reference, rtol=1e-10, atol=1e-12), \
+            'Weighted force gradients differ with %s.' % activation
+        key = sorted(fingerprintprimes)[5]
+        gradient = model.calculate_dForce_dParameters(
+            afp=fingerprints[key[2]][1], derafp=fingerprintprimes[key],
+            direction=key[4], nindex=key[2], nsymbol=key[3])
+        assert np.allclose(gradient, model.calculate_dForces_dParameters(
+            fingerprints, {key: fingerprintprimes[key]})[(key[0], key[4])],
+            rtol=1e-12, atol=1e-14)
+
+
+def test_inference_plan():
+    """Inference plan reuse and invalidation."""
+    atoms, fingerprints, fingerprintprimes = make_fingerprints()
+    model = make_model(fingerprints, 'sigmoid', seed=8)
+    calc = Amp(descriptor=Gaussian(cutoff=5.), model=model,
+               dblabel='amp-nn-forces', logging=False)
+    energy = calc.get_potential_energy(atoms)
+    plan = model.plan
+    forces = calc.get_forces(atoms)
+    assert model.plan is plan, 'Inference plan was rebuilt.'
+    assert np.allclose(forces, model.calculate_forces(fingerprints,
+                                                      fingerprintprimes))
+
+    def reference():
+        return sum(model.calculate_atomic_energy(afp, index, symbol)
+                   for index, (symbol, afp) in enumerate(fingerprints))
+
+    assert abs(energy - reference()) < 1e-10
+    vector = model.vector
+    vector[0] += 0.5
+    model.vector = vector
+    assert model.plan is not plan, 'Setting the vector kept the plan.'
+    energy = model.calculate_energy(fingerprints)
+    assert abs(energy - reference()) < 1e-10
+    plan = model.plan
+    model.parameters.scalings = {
+        symbol: {'slope': scaling['slope'],
+                 'intercept': scaling['intercept'] + 1.}
+        for symbol, scaling in model.parameters.scalings.items()}
+    assert abs(model.calculate_energy(fingerprints) -
+               (energy + len(atoms))) < 1e-10
+    assert model.plan is not plan, 'Replacing the scalings kept the plan.'
+
+
+def test_parameter_views():
+    """Weights and scalings as views into one parameter vector."""
+    atoms, fingerprints, fingerprintprimes = make_fingerprints()
+    model = make_model(fingerprints, 'tanh', seed=9)
+    p = model.parameters
+    weights, scalings = p.weights, p.scalings
+    weight = p.weights['Cu'][1]
+    vector = model.vector
+    vector += 0.01
+    model.vector = vector
+    assert p.weights is weights and p.scalings is scalings and \
+        p.weights['Cu'][1] is weight, 'Setting the vector copied.'
+    assert np.array_equal(model.vector, vector)
+    for symbol in p.weights:
+        for layer in p.weights[symbol]:
+            assert np.shares_memory(p.weights[symbol][layer], model._vector)
+        for key in p.scalings[symbol]:
+            assert np.shares_memory(p.scalings[symbol][key], model._vector)
+    assert not np.shares_memory(model.vector, model._vector)
+
+    energy = model.calculate_energy(fingerprints)
+    forces = model.calculate_forces(fingerprints, fingerprintprimes)
+    assert 'array' not in model.tostring()
+    parameters = string2dict(model.tostring())
+    parameters.pop('importname')
+    loaded = NeuralNetwork(**parameters)
+    assert np.array_equal(loaded.vector, model.vector)
+    assert loaded.calculate_energy(fingerprints) == energy
+    assert np.array_equal(loaded.calculate_forces(fingerprints,
+                                                  fingerprintprimes), forces)
+
+
+def test_prescaled_fingerprints():
+    """Prescaled versus raw fingerprints, in the model and loss function."""
+    atoms, fingerprints, fingerprintprimes = make_fingerprints()
+    random = np.random.RandomState(10)
+    coefficients = random.uniform(-1., 1., (len(atoms), 3))
+    for activation in ['tanh', 'sigmoid', 'linear']:
+        model = make_model(fingerprints, activation, seed=11)
+        prescaled = PrescaledFingerprints(model.parameters, fingerprints,
+                                          fingerprintprimes)
+        assert np.allclose(model.calculate_energy(prescaled),
+                           model.calculate_energy(fingerprints),
+                           rtol=1e-12, atol=1e-12)
+        assert np.allclose(model.calculate_forces(prescaled, None),
+                           model.calculate_forces(fingerprints,
+                                                  fingerprintprimes),
+                           rtol=1e-10, atol=1e-12)
+        assert np.allclose(
+            model.calculate_dEnergies_dParameters([prescaled, fingerprints],
+                                                  [0.5, -2.]),
+            -1.5 * model.calculate_dEnergy_dParameters(fingerprints),
+            rtol=1e-10, atol=1e-12)
+        assert np.allclose(
+            model.calculate_weighted_dForces_dParameters(prescaled, None,
+                                                         coefficients),
+            model.calculate_weighted_dForces_dParameters(
+                fingerprints, fingerprintprimes, coefficients),
+            rtol=1e-10, atol=1e-12)
+        gradients = model.calculate_dForces_dParameters(fingerprints,
+                                                        fingerprintprimes)
+        prescaledgradients = model.calculate_dForces_dParameters(prescaled,
+                                                                 None)
+        assert sorted(gradients) == sorted(prescaledgradients)
+        for key in gradients:
+            assert np.allclose(gradients[key], prescaledgradients[key],
+                               rtol=1e-10, atol=1e-12)
+
+    # Fingerprints scaled with another range are refused.
+    model.parameters.fprange = {
+        symbol: [[lo - 1., hi] for lo, hi in fprange]
+        for symbol, fprange in model.parameters.fprange.items()}
+    for function in [model.calculate_energy,
+                     model.calculate_dEnergy_dParameters]:
+        try:
+            function(prescaled)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('Prescaled fingerprints were used with '
+                                 'another fingerprint range.')
+    try:
+        model.calculate_forces(PrescaledFingerprints(model.parameters,
+                                                     fingerprints), None)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('Forces without fingerprint derivatives.')
+
+    # The loss function uses the fingerprints prescaled by the model.
+    atoms.set_calculator(EMT())
+    hash, = hash_images([atoms]).keys()
+    descriptor = Gaussian(cutoff=5., dblabel='amp-nn-forces')
+    descriptor.calculate_fingerprints({hash: atoms}, log=None,
+                                      calculate_derivatives=True)
+    model = make_model(fingerprints, 'tanh', seed=12)
+    model.fortran = False
+    model.lossfunction = LossFunction(
+        convergence={'energy_rmse': 0.001, 'force_rmse': 0.01},
+        parallel={'cores': 1}, raise_ConvergenceOccurred=False,
+        log_losses=False)
+    model.trainingparameters.images = {hash: atoms}
+    model.trainingparameters.descriptor = descriptor
+    vector = model.vector
+    reference = model.lossfunction.calculate_loss(vector, lossprime=True)
+    model.prescale_fingerprints()
+    assert isinstance(model.trainingparameters.prescaledfingerprints[hash],
+                      PrescaledFingerprints)
+    results = model.lossfunction.calculate_loss(vector, lossprime=True)
+    for result, expected in zip(results, reference):
+        assert np.allclose(result, expected, rtol=1e-10, atol=1e-12), \
+            'Loss differs with prescaled fingerprints.'
+
+if __name__ == '__main__':
+    test()
+    test_forces()
+    test_energy_gradients()
+    test_force_gradients()
+    test_inference_plan()
+    test_parameter_views()
+    test_prescaled_fingerprints()
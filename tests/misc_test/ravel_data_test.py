@@ -0,0 +1,102 @@
+"""
+This script checks that the training data raveled for the fortran loss
+function hold the fingerprints, neighbors and fingerprint derivatives of
+each atom in the order the fortran code reads them, for elements with
+fingerprints of different lengths, and that the raveled data kept in a file
+are loaded for the same images and made again for others.
+
+"""
+
+import os
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
+from amp.descriptor.gaussian import Gaussian, make_symmetry_functions
+from amp.model import ravel_data
+from amp.utilities import hash_images
+
+
+def make_images():
+    images = []
+    for step, size in enumerate([(2, 2, 2), (2, 2, 3)]):
+        atoms = fcc111('Cu', size=size, vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.05, seed=step)
+        atoms.set_calculator(EMT())
+        atoms.set_calculator(SinglePointCalculator(
+            atoms, energy=atoms.get_potential_energy(),
+            forces=atoms.get_forces()))
+        images.append(atoms)
+    return hash_images(images)
+
+
+def test():
+    """Raveled data versus the fingerprints, and their file."""
+    images = make_images()
+    # O has fewer symmetry functions than Cu.
+    Gs = {'Cu': make_symmetry_functions(['Cu', 'O'], 'G2',
+                                        etas=[0.05, 1., 4.]),
+          'O': make_symmetry_functions(['Cu', 'O'], 'G2', etas=[0.05])}
+    descriptor = Gaussian(Gs=Gs, cutoff=5., dblabel='amp-ravel')
+    descriptor.calculate_fingerprints(images, log=None,
+                                      calculate_derivatives=True)
+    fingerprints = descriptor.fingerprints
+    fingerprintprimes = descriptor.fingerprintprimes
+
+    (actual_energies, actual_forces, elements, num_images_atoms,
+     atomic_numbers, raveled_fingerprints, num_neighbors,
+     raveled_neighborlists, raveled_fingerprintprimes) = \
+        ravel_data(True, 'atom-centered', images, fingerprints,
+                   fingerprintprimes)
+    assert elements == ['Cu', 'O']
+    assert list(num_images_atoms) == [len(_) for _ in images.values()]
+    assert np.allclose(actual_energies, [image.get_potential_energy()
+                                         for image in images.values()])
+    assert np.allclose(actual_forces, np.concatenate(
+        [image.get_forces() for image in images.values()]))
+    assert list(atomic_numbers) == \
+        [atom.number for image in images.values() for atom in image]
+    atom = neighbor = 0
+    for hash, image in images.items():
+        for index, (symbol, afp) in enumerate(fingerprints[hash]):
+            assert np.array_equal(raveled_fingerprints[atom, :len(afp)], afp)
+            assert not raveled_fingerprints[atom, len(afp):].any()
+            keys = [key for key in fingerprintprimes[hash]
+                    if key[0] == index and key[4] == 0]
+            assert num_neighbors[atom] == len(keys)
+            for key in keys:
+                assert raveled_neighborlists[neighbor] == key[2]
+                for i in range(3):
+                    derafp = fingerprintprimes[hash][key[:4] + (i,)]
+                    assert np.array_equal(
+                        raveled_fingerprintprimes[3 * neighbor + i,
+                                                  :len(derafp)], derafp)
+                neighbor += 1
+            atom += 1
+    assert atom == len(raveled_fingerprints)
+    assert 3 * neighbor == len(raveled_fingerprintprimes)
+
+    # Raveled data kept in a file.
+    filename = 'amp-ravel-raveled.npz'
+    if os.path.exists(filename):
+        os.remove(filename)
+    value = ravel_data(True, 'atom-centered', images, fingerprints,
+                       fingerprintprimes, filename)
+    assert os.path.exists(filename)
+    # Not read from the fingerprints again.
+    loaded = ravel_data(True, 'atom-centered', images, None, None, filename)
+    for array, expected in zip(loaded, value):
+        assert np.array_equal(array, expected)
+    assert loaded[2] == ['Cu', 'O']
+    loaded = ravel_data(False, 'atom-centered', images, None, None, filename)
+    assert len(loaded) == 5
+    assert np.array_equal(loaded[4], value[5])
+    # Other images are raveled again.
+    subset = {hash: images[hash] for hash in list(images.keys())[:1]}
+    value = ravel_data(True, 'atom-centered', subset, fingerprints,
+                       fingerprintprimes, filename)
+    assert list(value[3]) == [len(_) for _ in subset.values()]
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,78 @@
+"""
+Two descriptors with different cutoff radii and fingerprint databases share
+one neighborlist database. The neighborlists of a smaller cutoff should be
+filtered from those of the larger one rather than recalculated, stored under
+their own cutoff, and contain the same neighbors, and the fingerprints should
+be the same as with separate databases.
+
+"""
+
+###############################################################################
+
+import os
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from amp.descriptor.gaussian import Gaussian
+from amp.descriptor.zernike import Zernike
+from amp.descriptor.neighborlist import (NeighborlistCalculator,
+                                        SharedNeighborlists, parse_key)
+from amp.utilities import hash_images
+
+###############################################################################
+
+
+def test():
+    """Neighborlists shared between cutoffs."""
+
+    images = []
+    for step in range(3):
+        atoms = fcc111('Cu', size=(2, 2, 2), vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.05, seed=step)
+        images.append(atoms)
+    images = hash_images(images)
+
+    shared = [Gaussian(cutoff=6.5, dblabel='shared-g', nldblabel='shared'),
+              Zernike(cutoff=4., nmax=4, dblabel='shared-z',
+                      nldblabel='shared')]
+    for descriptor in shared:
+        descriptor.calculate_fingerprints(images, parallel={'cores': 1},
+                                          log=None,
+                                          calculate_derivatives=False)
+
+    # Without a calculator, the neighborlists can only be filtered.
+    neighborlist = SharedNeighborlists(dblabel='shared', cutoff=3.5)
+    neighborlist.calc = None
+    neighborlist.calculate_items(images, parallel={'cores': 1})
+
+    keys = os.listdir(os.path.join('shared-neighborlists.ampdb', 'loose'))
+    assert sorted(parse_key(key) for key in keys) == \
+        sorted((hash, cutoff) for hash in images for cutoff in [3.5, 4., 6.5])
+
+    for cutoff, _neighborlist in [(4., shared[1].neighborlist),
+                                  (3.5, neighborlist)]:
+        calc = NeighborlistCalculator(cutoff=cutoff)
+        for hash, image in images.items():
+            for (indices, offsets), (refindices, refoffsets) in \
+                    zip(_neighborlist[hash], calc.calculate(image, hash)):
+                pairs = sorted(zip(indices, map(tuple, offsets)))
+                refpairs = sorted(zip(refindices, map(tuple, refoffsets)))
+                assert pairs == refpairs, \
+                    'Filtered neighborlist differs from the direct one.'
+
+    separate = [Gaussian(cutoff=6.5, dblabel='separate-g'),
+                Zernike(cutoff=4., nmax=4, dblabel='separate-z')]
+    for descriptor, reference in zip(shared, separate):
+        reference.calculate_fingerprints(images, parallel={'cores': 1},
+                                         log=None,
+                                         calculate_derivatives=False)
+        for hash in images:
+            for (element1, afp1), (element2, afp2) in \
+                    zip(descriptor.fingerprints[hash],
+                        reference.fingerprints[hash]):
+                assert element1 == element2
+                assert np.allclose(afp1, afp2, rtol=1e-10, atol=1e-12)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,78 @@
+"""
+This script checks that select_symmetry_functions drops constant and
+duplicate symmetry functions, respects the requested number with both
+selection methods, and that the fingerprints of the reduced Gs are the
+selected columns of the original fingerprints.
+
+"""
+
+import numpy as np
+from ase.build import fcc111, add_adsorbate
+from amp.descriptor.gaussian import Gaussian, make_symmetry_functions
+from amp.descriptor.analysis import select_symmetry_functions
+from amp.utilities import hash_images
+
+
+def make_images():
+    images = []
+    for step in range(4):
+        atoms = fcc111('Cu', size=(2, 2, 2), vacuum=5.)
+        add_adsorbate(atoms, 'O', 1.5, 'fcc')
+        atoms.rattle(0.1, seed=step)
+        images.append(atoms)
+    return hash_images(images)
+
+
+def test():
+    """Symmetry function selection."""
+    images = make_images()
+    elements = ['Cu', 'O']
+    G = make_symmetry_functions(elements, 'G2',
+                                etas=[0.05, 0.5, 2., 4., 8., 20., 40.])
+    G += make_symmetry_functions(elements, 'G4', etas=[0.005],
+                                 zetas=[1., 4.], gammas=[1., -1.])
+    # A duplicate, and a function that is zero for every atom since the
+    # O atom has no O neighbor within the cutoff.
+    G.append(dict(G[1]))
+    G.append({'type': 'G2', 'element': 'O', 'eta': 400.})
+    Gs = {element: G for element in elements}
+
+    descriptor = Gaussian(Gs=Gs, cutoff=5., dblabel='amp-selection-full')
+    descriptor.calculate_fingerprints(images, log=None,
+                                      calculate_derivatives=False)
+
+    reduced = select_symmetry_functions(descriptor.fingerprints, Gs)
+    for element in elements:
+        assert G[-1] not in reduced[element], \
+            'Constant symmetry function was not dropped.'
+        assert sum(_ == G[1] for _ in reduced[element]) <= 1, \
+            'Duplicate symmetry function was not dropped.'
+
+    for method in ['cur', 'farthest']:
+        selected = select_symmetry_functions(
+            'amp-selection-full-fingerprints.ampdb', Gs,
+            number={'Cu': 6, 'O': 4}, method=method)
+        assert len(selected['Cu']) == 6 and len(selected['O']) == 4, \
+            'Requested number of symmetry functions not respected.'
+        # Selected functions keep their original order.
+        for element in elements:
+            indices = [G.index(_) for _ in selected[element]]
+            assert indices == sorted(indices)
+
+        reduced = Gaussian(Gs=selected, cutoff=5.,
+                           dblabel='amp-selection-%s' % method)
+        reduced.calculate_fingerprints(images, log=None,
+                                       calculate_derivatives=False)
+        for hash in images:
+            for (symbol1, afp1), (symbol2, afp2) in \
+                    zip(descriptor.fingerprints[hash],
+                        reduced.fingerprints[hash]):
+                assert symbol1 == symbol2
+                indices = [G.index(_) for _ in selected[symbol1]]
+                assert np.allclose(np.array(afp1)[indices], afp2,
+                                   rtol=1e-10, atol=1e-12), \
+                    'Fingerprints of the reduced Gs are not the selected ' \
+                    'columns.'
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,133 @@
+"""
+Weighted Gaussian symmetry functions of a ternary periodic cell are checked
+against a direct evaluation of their sums over neighbors, and the per-atom
+(python and fortran) and stacked-array routines are compared with each other
+for the fingerprints and fingerprint derivatives; the latter are also
+checked against finite differences.
+
+"""
+
+###############################################################################
+
+import numpy as np
+from ase.build import bulk
+from amp.descriptor.gaussian import (FingerprintCalculator,
+                                     FingerprintPrimeCalculator,
+                                     make_symmetry_functions,
+                                     make_default_symmetry_functions,
+                                     fmodules)
+from amp.descriptor.neighborlist import NeighborlistCalculator
+from amp.descriptor.cutoffs import Cosine
+
+###############################################################################
+
+
+def make_image(seed=1):
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True)
+    atoms[1].symbol = 'Pd'
+    atoms[2].symbol = 'Pd'
+    atoms[3].symbol = 'O'
+    atoms.rattle(0.1, seed=seed)
+    return atoms
+
+
+def reference(atoms, neighborlist, G, Rc):
+    """Weighted symmetry function G of each atom, by direct sums."""
+    cutoff = Cosine(Rc)
+    values = []
+    for index in range(len(atoms)):
+        indices, offsets = neighborlist[index]
+        vectors = (atoms.positions[indices] + np.dot(offsets, atoms.cell) -
+                   atoms.positions[index])
+        weights = np.array([G['weights'][atoms[_].symbol] for _ in indices])
+        Rij = np.linalg.norm(vectors, axis=1)
+        fc = cutoff(Rij)
+        if G['type'] == 'G2':
+            values.append(np.sum(weights * np.exp(-G['eta'] * Rij ** 2. /
+                                                  Rc ** 2.) * fc))
+            continue
+        value = 0.
+        for j in range(len(indices)):
+            for k in range(j + 1, len(indices)):
+                cos = np.dot(vectors[j], vectors[k]) / Rij[j] / Rij[k]
+                Rjk = np.linalg.norm(vectors[k] - vectors[j])
+                R2 = Rij[j] ** 2. + Rij[k] ** 2. + Rjk ** 2.
+                value += (weights[j] * weights[k] *
+                          (1. + G['gamma'] * cos) ** G['zeta'] *
+                          np.exp(-G['eta'] * R2 / Rc ** 2.) *
+                          fc[j] * fc[k] * cutoff(Rjk))
+        values.append(value * 2. ** (1. - G['zeta']))
+    return values
+
+
+def test():
+    """Weighted symmetry functions."""
+    Rc = 4.
+    cutoff = Cosine(Rc).todict()
+    elements = ['Cu', 'O', 'Pd']
+    weights = {'Cu': 1., 'O': -0.5, 'Pd': 2.}
+    G = make_symmetry_functions(elements, 'G2', etas=[0.5, 5.],
+                                weights=weights)
+    G += make_symmetry_functions(elements, 'G4', etas=[0.005],
+                                 zetas=[1., 4.], gammas=[1., -1.],
+                                 weights=weights)
+    G += make_symmetry_functions(elements, 'G5', etas=[0.005], zetas=[2.],
+                                 gammas=[1.], weights=weights)
+    Gs = {element: G for element in elements}
+    assert len(G) == 2 + 4 + 1
+    assert len(make_default_symmetry_functions(elements, weighted=True)
+               ['Cu']) == 4 + 4
+
+    atoms = make_image()
+    key = 'image'
+    neighborlist = {key: NeighborlistCalculator(Rc).calculate(atoms, key)}
+    options = [(False, None), (True, None), (False, 10)]
+    if fmodules is None:
+        options.remove((True, None))
+
+    fingerprints = [FingerprintCalculator(neighborlist, Gs, cutoff, fortran,
+                                          batchsize=batchsize)
+                    .calculate_batch({key: atoms})[key]
+                    for fortran, batchsize in options]
+    for count, _G in enumerate(G):
+        if _G['type'] == 'G5':
+            continue
+        values = reference(atoms, neighborlist[key], _G, Rc)
+        for fps in fingerprints:
+            assert np.allclose([fp[count] for symbol, fp in fps], values,
+                               rtol=1e-10, atol=1e-10), \
+                'Weighted %s differs from its direct evaluation.' % _G['type']
+    for fps in fingerprints[1:]:
+        for (symbol1, fp1), (symbol2, fp2) in zip(fingerprints[0], fps):
+            assert symbol1 == symbol2
+            assert np.allclose(fp1, fp2, rtol=1e-10, atol=1e-10), \
+                'Weighted fingerprints of the routines differ.'
+
+    primes = [FingerprintPrimeCalculator(neighborlist, Gs, cutoff, fortran,
+                                         batchsize=batchsize)
+              .calculate_batch({key: atoms})[key]
+              for fortran, batchsize in options]
+    for _primes in primes[1:]:
+        assert set(_primes) == set(primes[0])
+        for _ in primes[0]:
+            assert np.allclose(primes[0][_], _primes[_], rtol=1e-8,
+                               atol=1e-10), \
+                'Weighted fingerprint primes of the routines differ.'
+
+    calc = FingerprintCalculator(neighborlist, Gs, cutoff, fortran=False)
+    d = 1e-5
+    for (selfindex, selfsymbol, nindex, nsymbol, i), prime in \
+            primes[-1].items():
+        forward = atoms.copy()
+        forward.positions[selfindex, i] += d
+        backward = atoms.copy()
+        backward.positions[selfindex, i] -= d
+        numeric = (np.array(calc.calculate(forward, key)[nindex][1]) -
+                   calc.calculate(backward, key)[nindex][1]) / (2. * d)
+        assert np.allclose(prime, numeric, rtol=1e-5, atol=1e-7), \
+            'Weighted fingerprint primes disagree with finite differences.'
+
+###############################################################################
+
+if __name__ == '__main__':
+    test()
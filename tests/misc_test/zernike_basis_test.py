@@ -0,0 +1,152 @@
+"""
+This script checks the array evaluation of the Zernike basis functions, as
+used by the Zernike fingerprint calculators, against the scalar functions
+calculate_R and scipy's sph_harm, the resulting fingerprints of one atom
+against a direct summation over (n, l, m) and neighbors, and the analytic
+gradients and fingerprint primes against finite differences.
+
+"""
+
+import numpy as np
+from scipy.special import sph_harm, factorial
+from ase import Atoms
+from ase.build import bulk, molecule
+from amp.descriptor.zernike import (calculate_R, calculate_solid_harmonics,
+                                    get_radial_coefficients,
+                                    generate_coefficients,
+                                    FingerprintCalculator,
+                                    FingerprintPrimeCalculator)
+from amp.descriptor.neighborlist import NeighborlistCalculator
+from amp.descriptor.cutoffs import Cosine, Polynomial
+
+
+def basis_test():
+    """Solid harmonics and radial polynomials."""
+    nmax = 7
+    fac = [factorial(0.5 * _) for _ in range(4 * nmax + 3)]
+    vectors = np.random.RandomState(1).uniform(-0.6, 0.6, (10, 3))
+    rho = np.linalg.norm(vectors, axis=1)
+    theta = np.arccos(vectors[:, 2] / rho)
+    phi = np.arctan2(vectors[:, 1], vectors[:, 0])
+    harmonics = calculate_solid_harmonics(vectors, nmax)
+    nls, coefficients = get_radial_coefficients(nmax, fac)
+    for l in range(nmax + 1):
+        for m in range(l + 1):
+            assert np.allclose(harmonics[l, m],
+                               rho ** l * sph_harm(m, l, phi, theta),
+                               rtol=1e-10, atol=1e-14)
+    for (n, l), row in zip(nls, coefficients):
+        Q = np.polyval(row[::-1], rho ** 2.)
+        R = [calculate_R(n, l, _, fac) for _ in rho]
+        assert np.allclose(Q * rho ** l, R, rtol=1e-10, atol=1e-14)
+
+
+def fingerprint_test():
+    """Fingerprints of one atom versus direct summation."""
+    nmax = 5
+    Rc = 4.
+    Gs = {'O': {'O': 8., 'Pd': 46.}}
+    rng = np.random.RandomState(2)
+    Rs = rng.uniform(-2., 2., (8, 3))
+    n_symbols = ['O', 'Pd'] * 4
+    calc = FingerprintCalculator(neighborlist=None, Gs=Gs, nmax=nmax,
+                                 cutoff=Cosine(Rc).todict(), fortran=False)
+    calc.atoms = Atoms('O')
+    symbol, fingerprint = calc.get_fingerprint(0, 'O', n_symbols, Rs)
+
+    fac = calc.factorial
+    reference = []
+    for n in range(nmax + 1):
+        for l in range(n + 1):
+            if (n - l) % 2 == 0:
+                norm = 0.
+                for m in range(l + 1):
+                    c_nlm = 0.
+                    for n_symbol, R in zip(n_symbols, Rs):
+                        rho = np.linalg.norm(R) / Rc
+                        theta = np.arccos(R[2] / np.linalg.norm(R))
+                        phi = np.arctan2(R[1], R[0])
+                        c_nlm += (Gs['O'][n_symbol] *
+                                  calculate_R(n, l, rho, fac) *
+                                  sph_harm(m, l, phi, theta) *
+                                  Cosine(Rc)(rho * Rc))
+                    norm += (1. if m == 0 else 2.) * abs(c_nlm) ** 2.
+                reference.append(norm)
+    assert symbol == 'O'
+    assert np.allclose(fingerprint, reference, rtol=1e-10, atol=1e-12)
+
+
+def gradient_test():
+    """Gradients of the solid harmonics."""
+    lmax = 6
+    vectors = np.random.RandomState(3).uniform(-0.6, 0.6, (5, 3))
+    harmonics, gradients = calculate_solid_harmonics(vectors, lmax,
+                                                     derivatives=True)
+    assert np.allclose(harmonics, calculate_solid_harmonics(vectors, lmax))
+    d = 1e-6
+    for i in range(3):
+        displacement = np.zeros(3)
+        displacement[i] = d
+        numeric = (calculate_solid_harmonics(vectors + displacement, lmax) -
+                   calculate_solid_harmonics(vectors - displacement, lmax)) \
+            / (2. * d)
+        assert np.allclose(gradients[..., i], numeric, rtol=1e-6, atol=1e-8)
+
+
+def fingerprintprime_test():
+    """Fingerprint primes of a periodic cell versus finite differences."""
+    atoms = bulk('Cu', 'fcc', a=3.6) * (1, 1, 2)
+    atoms[0].symbol = 'Pd'
+    atoms.rattle(0.05, seed=1)
+    key = 'image'
+    Gs = generate_coefficients(['Cu', 'Pd'])
+    for cutoff in [Cosine(4.5), Polynomial(4.5, gamma=4)]:
+        neighborlist = {key: NeighborlistCalculator(4.5).calculate(atoms,
+                                                                   key)}
+        primes = FingerprintPrimeCalculator(
+            neighborlist, Gs, 4, cutoff.todict(), False).calculate(atoms, key)
+        calc = FingerprintCalculator(neighborlist, Gs, 4, cutoff.todict(),
+                                     False)
+        d = 1e-5
+        for (selfindex, selfsymbol, nindex, nsymbol, i), prime in \
+                primes.items():
+            forward = atoms.copy()
+            forward.positions[selfindex, i] += d
+            backward = atoms.copy()
+            backward.positions[selfindex, i] -= d
+            numeric = (np.array(calc.calculate(forward, key)[nindex][1]) -
+                       calc.calculate(backward, key)[nindex][1]) / (2. * d)
+            assert np.allclose(prime, numeric, rtol=1e-5, atol=1e-4), \
+                'Zernike fingerprint primes disagree with finite differences.'
+
+
+def batch_test():
+    """Fingerprints of several images at once versus one atom at a time."""
+    images = {}
+    for step in range(3):
+        atoms = bulk('Cu', 'fcc', a=3.6) * (1, 1, 3)
+        atoms[step].symbol = 'Pd'
+        atoms.rattle(0.05, seed=step)
+        images['image%i' % step] = atoms
+    images['molecule'] = molecule('CH3OH', vacuum=3.)
+    neighborlist = {key: NeighborlistCalculator(4.5).calculate(atoms, key)
+                    for key, atoms in images.items()}
+    Gs = generate_coefficients(['C', 'Cu', 'H', 'O', 'Pd'])
+    cutoff = Cosine(4.5)
+    for batchsize in [None, 3]:
+        calc = FingerprintCalculator(neighborlist, Gs, 4, cutoff.todict(),
+                                     False, batchsize=batchsize)
+        fingerprints = calc.calculate_batch(images)
+        for key, atoms in images.items():
+            for (symbol1, afp1), (symbol2, afp2) in \
+                    zip(fingerprints[key], calc.calculate(atoms, key)):
+                assert symbol1 == symbol2
+                assert np.allclose(afp1, afp2, rtol=1e-10, atol=1e-12), \
+                    'Zernike fingerprints of batches are inconsistent.'
+
+if __name__ == '__main__':
+    basis_test()
+    fingerprint_test()
+    gradient_test()
+    fingerprintprime_test()
+    batch_test()